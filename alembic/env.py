@@ -6,9 +6,10 @@ import os
 from dotenv import load_dotenv
 
 from alembic import context
-from app.models import Notes, User, ChatSession, Message, Event
+from app.models import Notes, User, ChatSession, Message, Event, UsageDaily
 from app.core.database import Base
 
+
 load_dotenv()
 
 # this is the Alembic Config object, which provides
@@ -0,0 +1,81 @@
+import asyncio
+import time
+import logging
+
+
+logger = logging.getLogger(__name__)
+
+# Текущие вычисления по ключу в пределах воркера (single-flight)
+_inflight: dict[str, asyncio.Task] = {}
+
+
+def _index_key(namespace: str) -> str:
+    return f"{namespace}:__index"
+
+
+async def cache_get_many(redis, namespace: str, keys: list[str]) -> list[str | None]:
+    """
+    Достаёт значения одним запросом и отмечает найденные записи как недавно
+    использованные, чтобы вытеснение удаляло самые давно не нужные.
+    """
+    if redis is None or not keys:
+        return [None] * len(keys)
+    full_keys = [f"{namespace}:{key}" for key in keys]
+    values = await redis.mget(full_keys)
+
+    hits = {full_key: time.time() for full_key, v in zip(full_keys, values) if v}
+    if hits:
+        await redis.zadd(_index_key(namespace), hits, xx=True)
+    return values
+
+
+async def cache_get(redis, namespace: str, key: str) -> str | None:
+    return (await cache_get_many(redis, namespace, [key]))[0]
+
+
+async def cache_set_many(
+    redis, namespace: str, items: dict[str, str], ttl: int, max_entries: int
+):
+    """
+    Записывает значения с TTL и держит в пространстве имён не больше
+    max_entries записей, вытесняя самые давно использованные.
+    """
+    if redis is None or not items:
+        return
+    index_key = _index_key(namespace)
+    now = time.time()
+
+    async with redis.pipeline(transaction=False) as pipe:
+        for key, value in items.items():
+            pipe.set(f"{namespace}:{key}", value, ex=ttl)
+        pipe.zadd(index_key, {f"{namespace}:{key}": now for key in items})
+        pipe.zcard(index_key)
+        results = await pipe.execute()
+
+    size = results[-1]
+    if size > max_entries:
+        evicted = await redis.zpopmin(index_key, size - max_entries)
+        if evicted:
+            await redis.delete(*[member for member, _ in evicted])
+            logger.info(f"[Cache] {namespace}: evicted {len(evicted)} entries")
+
+
+async def cache_set(
+    redis, namespace: str, key: str, value: str, ttl: int, max_entries: int
+):
+    await cache_set_many(redis, namespace, {key: value}, ttl, max_entries)
+
+
+async def single_flight(key: str, compute):
+    """
+    Одновременные вызовы с одинаковым ключом в пределах воркера ждут один
+    и тот же результат вместо того, чтобы каждый делал свой запрос.
+    compute — функция без аргументов, возвращающая корутину.
+    """
+    task = _inflight.get(key)
+    if task is None:
+        task = asyncio.ensure_future(compute())
+        _inflight[key] = task
+        task.add_done_callback(lambda _: _inflight.pop(key, None))
+    # shield: отмена одного ожидающего не отменяет запрос для остальных
+    return await asyncio.shield(task)
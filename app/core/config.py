@@ -3,6 +3,7 @@ from dotenv import load_dotenv
 from fastapi.security import OAuth2PasswordBearer
 from typing import ClassVar
 
+
 load_dotenv()
 
 
@@ -30,12 +31,91 @@ class Settings(BaseSettings):
     eleven_labs_api_key: str
     eleven_labs_voice_id: str
 
+    tts_chunk_max_chars: int = 2500
+    tts_max_concurrency: int = 4
+    tts_default_codec: str = "mp3"
+    tts_cache_ttl: int = 86400
+    tts_cache_max_chars: int = 500
+    ffmpeg_path: str = "ffmpeg"
+
     serper_api_key: str
 
     ai_token_limit: int
     translate_symbols_limit: int
     voice_symbols_limit: int
     summarize_symbols_limit: int
+    # Резерв квоты, не закрытый за это время, возвращается автоматически
+    quota_reservation_ttl: int = 600
+    answer_tokens_estimate: int = 500
+    intent_tokens_estimate: int = 500
+    # Write-behind: приращения квот копятся в воркере и сбрасываются пачкой
+    quota_write_behind: bool = False
+    quota_flush_interval_ms: int = 200
+    quota_local_max_age_ms: int = 1000
+    # Лимиты частоты запросов, например {"summarize": "10/minute"};
+    # персональные — по id пользователя: {"42": {"voice": "100/minute"}}
+    rate_limits: dict[str, str] = {}
+    rate_limit_overrides: dict[str, dict[str, str]] = {}
+    quota_key_grace_seconds: int = 7200
+    usage_rollup_enabled: bool = True
+    usage_rollup_interval: int = 900
+    usage_rollup_batch_size: int = 1000
+    admin_emails: list[str] = []
+    tokenizer_thread_threshold_chars: int = 20000
+    bcrypt_rounds: int = 12
+    password_hash_workers: int = 4
+    user_cache_ttl: int = 300
+    user_cache_local_ttl: int = 30
+    user_cache_max_entries: int = 10000
+    invalidation_channel: str = "cache_invalidation"
+    email_backend: str = "smtp"
+    email_worker_enabled: bool = True
+    email_smtp_tls: bool = True
+    email_pool_size: int = 2
+    email_batch_size: int = 20
+    email_max_attempts: int = 5
+    email_retry_base_delay: float = 5
+    db_pool_size: int = 10
+    db_max_overflow: int = 20
+    db_pool_timeout: int = 10
+    db_pool_recycle: int = 1800
+    db_pool_pre_ping: bool = True
+    db_statement_cache_size: int = 100
+    db_pgbouncer: bool = False
+    db_slow_checkout_ms: int = 200
+    database_replica_urls: list[str] = []
+    replica_max_lag_seconds: float = 5
+    replica_lag_check_interval: int = 5
+    read_your_writes_seconds: int = 10
+
+    summarize_request_concurrency: int = 4
+    summarize_global_concurrency: int = 16
+    summarize_chunk_tokens: int = 1500
+    summarize_chunk_overlap_tokens: int = 100
+    summarize_reduce_max_tokens: int = 6000
+    summarize_max_depth: int = 3
+    summarize_max_calls: int = 40
+    summarize_max_input_chars: int = 200000
+    # Квота summarize списывается не больше чем за столько символов на запрос
+    # (как при прежней обрезке входа), даже если обработан весь текст
+    summarize_charge_max_chars: int = 10000
+    summary_cache_ttl: int = 86400
+    summary_url_cache_ttl: int = 3600
+    summary_cache_max_entries: int = 50000
+    extractive_enabled: bool = True
+    extractive_max_sentences: int = 1500
+    page_snapshot_max_bytes: int = 5000000
+    page_cache_ttl: int = 3600
+    page_cache_stale_ttl: int = 86400
+    page_cache_max_entries: int = 20000
+    # JSON в .env, например {"news.google.com": 300, "docs.python.org": 604800}
+    page_cache_domain_ttls: dict[str, int] = {}
+    search_cache_ttl_volatile: int = 600
+    search_cache_ttl_news: int = 1800
+    search_cache_ttl_default: int = 21600
+    search_cache_max_entries: int = 50000
+    speculative_web_search: bool = True
+    search_classifier_threshold: float = 0.8
 
     redis_url: str
 
@@ -1,21 +1,182 @@
+from sqlalchemy import event, exc
+from sqlalchemy.engine import make_url
 from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
 from sqlalchemy.orm import DeclarativeBase
+from sqlalchemy.pool import AsyncAdaptedQueuePool
 
 from app.core.config import settings
 
 from sqlalchemy.ext.asyncio import AsyncSession
 
+import logging
+import time
+import uuid
+
+
+logger = logging.getLogger(__name__)
 
 DATABASE_URL = settings.database_url
+DB_SLOW_CHECKOUT_SECONDS = settings.db_slow_checkout_ms / 1000
 
 
 class Base(DeclarativeBase):
     pass
 
 
-engine = create_async_engine(DATABASE_URL, echo=False)
+# Счётчики пулов (в пределах воркера): имя пула -> ожидание свободного
+# соединения в очереди и открытие новых соединений
+pool_wait_stats: dict[str, dict] = {}
+
+
+def _pool_stats(name: str) -> dict:
+    return pool_wait_stats.setdefault(
+        name,
+        {
+            "checkouts": 0,
+            "wait_total": 0.0,
+            "wait_max": 0.0,
+            "timeouts": 0,
+            "connects": 0,
+            "connect_total": 0.0,
+            "connect_max": 0.0,
+        },
+    )
+
+
+class MeteredQueuePool(AsyncAdaptedQueuePool):
+    """
+    Очередь соединений, которая считает время выдачи соединения. Открытие
+    нового соединения меряется отдельно (события do_connect/connect, см.
+    _instrument) и из ожидания вычитается: медленный connect к базе не
+    должен выглядеть как нехватка пула. В ожидание входит pre-ping.
+    """
+
+    def connect(self):
+        stats = _pool_stats(self.logging_name)
+        started = time.perf_counter()
+        try:
+            connection = super().connect()
+        except exc.TimeoutError:
+            stats["timeouts"] += 1
+            logger.error(
+                f"[DB] pool {self.logging_name} exhausted: checked_out={self.checkedout()} overflow={self.overflow()}"
+            )
+            raise
+        connect_seconds = connection.record_info.pop("connect_seconds", 0.0)
+        waited = time.perf_counter() - started - connect_seconds
+        stats["checkouts"] += 1
+        stats["wait_total"] += waited
+        stats["wait_max"] = max(stats["wait_max"], waited)
+        if waited > DB_SLOW_CHECKOUT_SECONDS:
+            logger.warning(f"[DB] waited {waited * 1000:.0f}ms for a connection")
+        return connection
+
+
+def _instrument(engine, name: str):
+    """Время открытия соединений пула: от do_connect до события connect."""
+    stats = _pool_stats(name)
+
+    @event.listens_for(engine.sync_engine, "do_connect")
+    def _connect_started(dialect, connection_record, cargs, cparams):
+        connection_record.record_info["connect_started"] = time.perf_counter()
+
+    @event.listens_for(engine.sync_engine, "connect")
+    def _connected(dbapi_connection, connection_record):
+        started = connection_record.record_info.pop("connect_started", None)
+        if started is None:
+            return
+        elapsed = time.perf_counter() - started
+        stats["connects"] += 1
+        stats["connect_total"] += elapsed
+        stats["connect_max"] = max(stats["connect_max"], elapsed)
+        # Вычитается из ожидания выдачи, во время которой соединение открылось
+        connection_record.record_info["connect_seconds"] = elapsed
+
+
+def _engine_options(database_url: str, name: str) -> tuple:
+    url = make_url(database_url)
+    if settings.db_pgbouncer:
+        # PgBouncer в режиме transaction не поддерживает именованные prepared
+        # statements между транзакциями: отключаем кэши и даём уникальные имена
+        url = url.update_query_dict({"prepared_statement_cache_size": "0"})
+        connect_args = {
+            "statement_cache_size": 0,
+            "prepared_statement_name_func": lambda: f"__asyncpg_{uuid.uuid4()}__",
+        }
+    else:
+        url = url.update_query_dict(
+            {"prepared_statement_cache_size": str(settings.db_statement_cache_size)}
+        )
+        connect_args = {"statement_cache_size": settings.db_statement_cache_size}
+
+    options = {
+        "echo": False,
+        "poolclass": MeteredQueuePool,
+        # Имя пула — ключ в pool_wait_stats; сохраняется при пересоздании пула
+        "pool_logging_name": name,
+        "pool_size": settings.db_pool_size,
+        "max_overflow": settings.db_max_overflow,
+        "pool_timeout": settings.db_pool_timeout,
+        "pool_recycle": settings.db_pool_recycle,
+        "pool_pre_ping": settings.db_pool_pre_ping,
+        "connect_args": connect_args,
+    }
+    return url, options
+
+
+def _create_engine(database_url: str, name: str):
+    url, options = _engine_options(database_url, name)
+    engine = create_async_engine(url, **options)
+    _instrument(engine, name)
+    return engine
+
+
+engine = _create_engine(DATABASE_URL, "primary")
 AsyncSessionLocal = async_sessionmaker(engine, expire_on_commit=False)
 
+# Реплики только для чтения; маршрутизация — в app.core.db_routing
+replica_engines = [
+    _create_engine(url, f"replica{i}")
+    for i, url in enumerate(settings.database_replica_urls)
+]
+ReplicaSessionLocals = [
+    async_sessionmaker(replica, expire_on_commit=False) for replica in replica_engines
+]
+
+
+def _engine_metrics(name: str, engine) -> dict:
+    pool = engine.pool
+    stats = _pool_stats(name)
+    checkouts, connects = stats["checkouts"], stats["connects"]
+    return {
+        "pool_size": pool.size(),
+        "max_overflow": settings.db_max_overflow,
+        "checked_out": pool.checkedout(),
+        "checked_in": pool.checkedin(),
+        "overflow": pool.overflow(),
+        "checkouts": checkouts,
+        "wait_avg_ms": (
+            round(stats["wait_total"] / checkouts * 1000, 2) if checkouts else 0.0
+        ),
+        "wait_max_ms": round(stats["wait_max"] * 1000, 2),
+        "timeouts": stats["timeouts"],
+        "connects": connects,
+        "connect_avg_ms": (
+            round(stats["connect_total"] / connects * 1000, 2) if connects else 0.0
+        ),
+        "connect_max_ms": round(stats["connect_max"] * 1000, 2),
+    }
+
+
+def pool_metrics() -> dict:
+    return {
+        "primary": _engine_metrics("primary", engine),
+        "replicas": [
+            _engine_metrics(f"replica{i}", replica)
+            for i, replica in enumerate(replica_engines)
+        ],
+    }
+
 
 async def get_db() -> AsyncSession:
     async with AsyncSessionLocal() as session:
@@ -0,0 +1,148 @@
+from sqlalchemy import event, text
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.core.database import (
+    AsyncSessionLocal,
+    ReplicaSessionLocals,
+    replica_engines,
+)
+import app.redis_client
+
+import asyncio
+import itertools
+import logging
+import time
+
+
+logger = logging.getLogger(__name__)
+
+REPLICA_MAX_LAG = settings.replica_max_lag_seconds
+READ_YOUR_WRITES_SECONDS = settings.read_your_writes_seconds
+
+# Отставание реплики в секундах; 0, если всё полученное WAL уже применено
+REPLICA_LAG_SQL = text(
+    "SELECT CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 "
+    "ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0) END"
+)
+
+# Отставание каждой реплики по последней проверке; None — реплика недоступна.
+# До первой проверки реплики считаются недоступными
+_replica_lag: list[float | None] = [None] * len(replica_engines)
+_round_robin = itertools.count()
+# Пользователи, которые недавно писали через этот воркер: user_id -> время записи
+_recent_writes: dict[int, float] = {}
+# Ссылки на фоновые отметки, чтобы задачи не собрал GC до завершения
+_pending_marks: set[asyncio.Task] = set()
+
+
+def _recent_write_key(user_id: int) -> str:
+    return f"recent_write:{user_id}"
+
+
+@event.listens_for(Session, "after_flush")
+def _remember_flush(session, flush_context):
+    session.info["wrote"] = True
+
+
+@event.listens_for(Session, "after_rollback")
+def _forget_flush(session):
+    session.info.pop("wrote", None)
+
+
+async def _share_recent_write(redis, user_id: int):
+    try:
+        await redis.set(_recent_write_key(user_id), 1, ex=READ_YOUR_WRITES_SECONDS)
+    except Exception as e:
+        logger.error(f"[DBRouting] failed to mark recent write: {e}")
+
+
+@event.listens_for(Session, "after_commit")
+def _mark_after_commit(session):
+    """
+    После коммита с изменениями чтения этого пользователя на время
+    READ_YOUR_WRITES_SECONDS идут в primary. user_id в session.info
+    кладёт аутентификация (resolve_user) или код, открывший сессию.
+    """
+    user_id = session.info.get("user_id")
+    if not session.info.pop("wrote", False) or user_id is None:
+        return
+    _recent_writes[user_id] = time.monotonic()
+    redis = app.redis_client.redis
+    if redis is not None:
+        # Отметка для остальных воркеров; коммит её не ждёт
+        task = asyncio.get_running_loop().create_task(
+            _share_recent_write(redis, user_id)
+        )
+        _pending_marks.add(task)
+        task.add_done_callback(_pending_marks.discard)
+
+
+async def _wrote_recently(user_id: int) -> bool:
+    written_at = _recent_writes.get(user_id)
+    if written_at is not None:
+        if time.monotonic() - written_at <= READ_YOUR_WRITES_SECONDS:
+            return True
+        del _recent_writes[user_id]
+
+    redis = app.redis_client.redis
+    if redis is None:
+        return False
+    try:
+        return bool(await redis.exists(_recent_write_key(user_id)))
+    except Exception as e:
+        # Без Redis не можем гарантировать свежие данные — читаем с primary
+        logger.error(f"[DBRouting] recent write check failed: {e}")
+        return True
+
+
+def _pick_replica():
+    healthy = [
+        i
+        for i, lag in enumerate(_replica_lag)
+        if lag is not None and lag <= REPLICA_MAX_LAG
+    ]
+    if not healthy:
+        return None
+    return ReplicaSessionLocals[healthy[next(_round_robin) % len(healthy)]]
+
+
+async def read_session(user_id: int | None = None) -> AsyncSession:
+    """
+    Сессия для запросов только на чтение: реплика с допустимым отставанием,
+    иначе primary. Пользователь, который недавно писал, читает с primary,
+    чтобы увидеть свои изменения.
+    """
+    if not ReplicaSessionLocals:
+        return AsyncSessionLocal()
+    if user_id is not None and await _wrote_recently(user_id):
+        return AsyncSessionLocal()
+    replica = _pick_replica()
+    if replica is None:
+        return AsyncSessionLocal()
+    return replica()
+
+
+async def check_replica_lag():
+    for i, replica in enumerate(replica_engines):
+        try:
+            async with replica.connect() as conn:
+                lag = float((await conn.execute(REPLICA_LAG_SQL)).scalar() or 0)
+        except Exception as e:
+            if _replica_lag[i] is not None:
+                logger.error(f"[DBRouting] replica {i} unavailable: {e}")
+            _replica_lag[i] = None
+            continue
+        if lag > REPLICA_MAX_LAG:
+            logger.warning(
+                f"[DBRouting] replica {i} lag {lag:.1f}s, reads go to primary"
+            )
+        _replica_lag[i] = lag
+
+
+async def run_replica_monitor(interval: int):
+    """Фоновая задача воркера: периодически обновляет отставание реплик."""
+    while True:
+        await check_replica_lag()
+        await asyncio.sleep(interval)
@@ -6,18 +6,17 @@ from jose import jwt, JWTError
 from app.models import User
 from app.core.config import settings
 from app.core.database import get_db
+from app.core.db_routing import read_session
+from app.core.user_cache import cache_user, get_cached_user
+from app.token_limit import check_quotas
 
-import tiktoken
-import re
-from datetime import date
-
+from app.services.tokenizer_service import count_tokens_exact
 
-VOICE_SYMBOLS_LIMIT = settings.voice_symbols_limit
+import re
 
 
 def count_tokens(text: str, model: str = "gpt-3.5-turbo") -> int:
-    enc = tiktoken.encoding_for_model(model)
-    return len(enc.encode(text))
+    return count_tokens_exact(text, model)
 
 
 def is_valid_text(text: str) -> bool:
@@ -44,9 +43,17 @@ def is_valid_text(text: str) -> bool:
     return True
 
 
-async def get_current_user(
-    token: str = Depends(settings.oauth2_scheme), db: AsyncSession = Depends(get_db)
-) -> User:
+class Principal:
+    """Аутентифицированный пользователь без ORM-объекта — для эндпоинтов, которым нужен только id."""
+
+    __slots__ = ("id", "email")
+
+    def __init__(self, id: int, email: str | None):
+        self.id = id
+        self.email = email
+
+
+def decode_user_id(token: str) -> int:
     try:
         payload = jwt.decode(token, settings.secret_key, algorithms=["HS256"])
         user_id: str = payload.get("sub")
@@ -54,12 +61,46 @@ async def get_current_user(
             raise HTTPException(status_code=401, detail="Invalid token")
     except JWTError:
         raise HTTPException(status_code=401, detail="Invalid token")
+    return int(user_id)
+
+
+async def resolve_user(user_id: int, db: AsyncSession) -> dict:
+    """
+    Поля пользователя: из кэша (память воркера, затем Redis), иначе из БД.
+    Сессия БД берёт соединение из пула только при промахе кэша.
+    """
+    # По user_id в сессии db_routing включает чтение своих записей с primary
+    db.info["user_id"] = user_id
+    data = await get_cached_user(user_id)
+    if data is not None:
+        return data
 
-    result = await db.execute(select(User).where(User.id == int(user_id)))
+    result = await db.execute(select(User).where(User.id == user_id))
     user = result.scalar_one_or_none()
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
-    return user
+    return await cache_user(user)
+
+
+async def get_current_user(
+    token: str = Depends(settings.oauth2_scheme), db: AsyncSession = Depends(get_db)
+) -> User:
+    # Отсоединённый объект User из кэша: только поля, без связей и хеша пароля
+    return User(**await resolve_user(decode_user_id(token), db))
+
+
+async def get_current_principal(
+    token: str = Depends(settings.oauth2_scheme), db: AsyncSession = Depends(get_db)
+) -> Principal:
+    data = await resolve_user(decode_user_id(token), db)
+    return Principal(data["id"], data["email"])
+
+
+async def get_read_db(current_user: Principal = Depends(get_current_principal)):
+    """Сессия только для чтения: реплика, если она не отстаёт и пользователь недавно не писал."""
+    session = await read_session(current_user.id)
+    async with session:
+        yield session
 
 
 async def get_voice_summary_within_limit(redis, user_id: str, text: str) -> str:
@@ -69,12 +110,8 @@ async def get_voice_summary_within_limit(redis, user_id: str, text: str) -> str:
     Если нет — только часть, которая помещается в лимит.
     """
 
-    today = date.today().isoformat()
-    key = f"voice_symbols:{user_id}:{today}"
-    current = await redis.get(key)
-    current = int(current) if current else 0
-    limit = int(VOICE_SYMBOLS_LIMIT)
-    remaining = limit - current
+    status = await check_quotas(redis, user_id, {"voice": 0})
+    remaining = status["remaining"]["voice"]
     if remaining <= 0:
         return ""
     return text[:remaining]
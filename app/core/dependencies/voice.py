@@ -4,23 +4,34 @@ from edge_tts.exceptions import NoAudioReceived
 
 
 from app.core.dependencies.utils import is_valid_text, count_tokens
+from app.services.tokenizer_service import count_tokens_approx, count_tokens_async
 
 from app.token_limit import (
-    check_ai_limit_only,
-    check_voice_limit_only,
-    increment_voice_limit,
-    increment_ai_limit,
+    ANSWER_TOKENS_ESTIMATE,
+    INTENT_TOKENS_ESTIMATE,
+    QUOTAS,
+    check_quotas,
+    release_usage,
+    reserve_usage,
+    settle_usage,
 )
 
 from app.core.dependencies.web import voice_website_summary
+from app.core.rate_limit import allow_ws_message
+from app.services.readability_service import clean_client_page
 
 import app.redis_client
-from app.core.database import get_db
+from app.core.database import AsyncSessionLocal
+from app.core.db_routing import read_session
 from app.core.config import settings
 from app.models import Event
 
-from app.services.voice.speech import synthesize_speech_async, transcribe_audio_async
-from app.services.voice.web_search import needs_web_search, process_web_search_results
+from app.services.voice.speech import (
+    negotiate_audio_format,
+    synthesize_speech_async,
+    transcribe_audio_async,
+)
+from app.services.voice.web_search import answer_with_optional_search
 
 from app.services.voice.agents.intent_agent import IntentAgent
 from app.services.voice.agents.action_agent import ActionAgent
@@ -30,6 +41,7 @@ from app.services.voice.agents.calendar_agent import CalendarAgent
 
 
 import os
+import asyncio
 import logging
 import tempfile
 import base64
@@ -42,9 +54,69 @@ voice = settings.eleven_labs_voice_id
 CMD_JSON_RE = re.compile(r"^\s*\{.*\}\s*$", re.S)  # грубая проверка JSON
 
 
-async def handle_voice_websocket(websocket: WebSocket, user_id: str):
+async def _reserve_turn(websocket: WebSocket, redis, user_id: str, amounts: dict):
+    """
+    Резервирует все квоты хода одним вызовом. Если какой-то не хватает,
+    сообщает клиенту, какой именно и сколько осталось, и возвращает None.
+    """
+    status = await check_quotas(redis, user_id, amounts, reserve=True)
+    if not status["allowed"]:
+        await websocket.send_json(
+            {
+                "error": QUOTAS[status["exceeded"]]["detail"],
+                "remaining": status["remaining"],
+            }
+        )
+        return None
+    return status["reservation"]
+
+
+TTS_NO_AUDIO_ERROR = "Ошибка синтеза речи: не удалось получить аудио. Попробуйте другой язык или переформулируйте запрос."
+
+
+async def _speak_reserved(
+    redis, user_id: str, answer: str, audio_format: dict
+) -> tuple[str, str | None]:
+    """
+    Озвучивает ответ под резервом квоты voice на всю его длину: списание
+    закрывается только после успешного синтеза, при ошибке TTS резерв
+    возвращается. Возвращает (audio_base64, ошибка): при нехватке квоты или
+    ошибке синтеза аудио пустое, а ошибка — текст для клиента.
+    """
+    if not answer:
+        return "", None
+    status = await check_quotas(redis, user_id, {"voice": len(answer)}, reserve=True)
+    if not status["allowed"]:
+        return "", QUOTAS["voice"]["detail"]
+    reservation = status["reservation"]
+
+    logger = logging.getLogger(__name__)
+    with tempfile.NamedTemporaryFile(delete=False, suffix=audio_format["suffix"]) as f:
+        tts_path = f.name
+    try:
+        await synthesize_speech_async(answer, voice, tts_path, audio_format)
+    except NoAudioReceived:
+        logger.error("[TTS] No audio received from edge_tts.")
+        await release_usage(redis, reservation)
+        return "", TTS_NO_AUDIO_ERROR
+    except Exception as tts_e:
+        logger.error(f"TTS error: {tts_e}", exc_info=True)
+        await release_usage(redis, reservation)
+        return "", f"Ошибка синтеза речи: {tts_e}"
+    with open(tts_path, "rb") as f:
+        audio_b64 = base64.b64encode(f.read()).decode()
+    os.remove(tts_path)
+    await settle_usage(redis, reservation, {"voice": len(answer)})
+    return audio_b64, None
+
+
+async def handle_voice_websocket(
+    websocket: WebSocket, user_id: str, audio_format: dict | None = None
+):
     await websocket.accept()
+    audio_format = audio_format or negotiate_audio_format()
     user_tabs = []
+    user_page = None  # текст активной страницы, присланный расширением
 
     user_id = str(user_id)
     redis = app.redis_client.redis
@@ -57,18 +129,22 @@ async def handle_voice_websocket(websocket: WebSocket, user_id: str):
             if "bytes" in msg:
                 audio_bytes = msg["bytes"]
 
-                # ГЛОБАЛЬНАЯ ПРОВЕРКА ЛИМИТОВ
-                try:
-                    await check_ai_limit_only(redis, user_id, 1)
-                    await check_voice_limit_only(redis, user_id, 1)
-                except HTTPException as e:
-                    if e.status_code == 429:
-                        await websocket.send_json(
-                            {"error": "Token or voice limit exceeded"}
-                        )
-                        continue
-                    else:
-                        raise
+                if not await allow_ws_message(websocket, "voice", user_id):
+                    continue
+
+                # ГЛОБАЛЬНАЯ ПРОВЕРКА ЛИМИТОВ (включая токены на определение
+                # намерения) — один вызов Redis на все квоты
+                status = await check_quotas(
+                    redis, user_id, {"tokens": INTENT_TOKENS_ESTIMATE, "voice": 1}
+                )
+                if not status["allowed"]:
+                    await websocket.send_json(
+                        {
+                            "error": "Token or voice limit exceeded",
+                            "remaining": status["remaining"],
+                        }
+                    )
+                    continue
 
                 if not audio_bytes:
                     logger.info("Пустой аудиофайл получен, пропуск.")
@@ -98,12 +174,6 @@ async def handle_voice_websocket(websocket: WebSocket, user_id: str):
 
                 lang = result.get("language", "en")
 
-                # CHECK FOR TOKENS BEFORE DETECTING INTENT
-                tokens_needed_for_detect_intent = 500
-                await check_ai_limit_only(
-                    redis, user_id, tokens_needed_for_detect_intent
-                )
-
                 intent = await IntentAgent.detect_intent(text)
                 logger.info(f"Detected intent: {intent}")
 
@@ -117,56 +187,43 @@ async def handle_voice_websocket(websocket: WebSocket, user_id: str):
                         tokens_in_command + 500
                     )  # 500 is tokens for tabs
 
-                    try:
-                        await check_ai_limit_only(
-                            redis, user_id, tokens_needed_for_handle_command
-                        )
-                    except HTTPException as e:
-                        if e.status_code == 429:
-                            await websocket.send_json({"error": "Token limit exceeded"})
-                            continue
-                        else:
-                            raise
+                    reservation = await _reserve_turn(
+                        websocket,
+                        redis,
+                        user_id,
+                        {"tokens": tokens_needed_for_handle_command},
+                    )
+                    if reservation is None:
+                        continue
 
-                    cmd = await ActionAgent.handle_command(text, lang, user_tabs)
+                    try:
+                        cmd = await ActionAgent.handle_command(text, lang, user_tabs)
+                    except Exception:
+                        await release_usage(redis, reservation)
+                        raise
                     logger.info(f"AI responded with command: {cmd}")
                     answer = cmd.get("answer", "")
 
                     tokens_in_answer = count_tokens(answer)
 
-                    await increment_ai_limit(
-                        redis, user_id, tokens_needed_for_handle_command
+                    await settle_usage(
+                        redis,
+                        reservation,
+                        {"tokens": tokens_needed_for_handle_command + tokens_in_answer},
                     )
-                    await increment_ai_limit(redis, user_id, tokens_in_answer)
-
-                    # По умолчанию пустые значения
-                    audio_b64 = ""
 
                     # Синтезируем озвучку только если есть ответ
-                    if len(answer) > 0:
-                        await check_voice_limit_only(redis, user_id, len(answer))
-
-                        with tempfile.NamedTemporaryFile(
-                            delete=False, suffix=".mp3"
-                        ) as f:
-                            tts_path = f.name
-                        try:
-                            await synthesize_speech_async(answer, voice, tts_path)
-                        except Exception as tts_e:
-                            logger.error(f"TTS error: {tts_e}", exc_info=True)
-                            audio_b64 = ""
-                        else:
-                            with open(tts_path, "rb") as f:
-                                audio_b64 = base64.b64encode(f.read()).decode()
-                            os.remove(tts_path)
-
+                    audio_b64, voice_error = await _speak_reserved(
+                        redis, user_id, answer, audio_format
+                    )
                     response_json = {
                         "answer": answer,
                         "audio_base64": audio_b64,
+                        "audio_format": audio_format["mime"],
                         "command": cmd,
                     }
-
-                    await increment_voice_limit(redis, user_id, len(answer))
+                    if voice_error:
+                        response_json["voice_error"] = voice_error
 
                     logger.info(f"Sending command response JSON: {response_json}")
                     await websocket.send_json(response_json)
@@ -179,23 +236,27 @@ async def handle_voice_websocket(websocket: WebSocket, user_id: str):
                         tokens_in_media + 500
                     )  # 500 is tokens for tabs
 
-                    try:
-                        await check_ai_limit_only(
-                            redis, user_id, tokens_needed_for_handle_media
-                        )
-                    except HTTPException as e:
-                        if e.status_code == 429:
-                            await websocket.send_json({"error": "Token limit exceeded"})
-                            continue
-                        else:
-                            raise
+                    reservation = await _reserve_turn(
+                        websocket,
+                        redis,
+                        user_id,
+                        {"tokens": tokens_needed_for_handle_media},
+                    )
+                    if reservation is None:
+                        continue
 
-                    cmd = await MediaAgent.handle_media_command(text, lang)
+                    try:
+                        cmd = await MediaAgent.handle_media_command(text, lang)
+                    except Exception:
+                        await release_usage(redis, reservation)
+                        raise
 
-                    await increment_ai_limit(
-                        redis, user_id, tokens_needed_for_handle_media
+                    tokens_in_answer = count_tokens(json.dumps(cmd, ensure_ascii=False))
+                    await settle_usage(
+                        redis,
+                        reservation,
+                        {"tokens": tokens_needed_for_handle_media + tokens_in_answer},
                     )
-                    await increment_ai_limit(redis, user_id, tokens_in_answer)
 
                     logger.info(f"AI responded with media command: {cmd}")
                     await websocket.send_json(cmd)
@@ -206,7 +267,21 @@ async def handle_voice_websocket(websocket: WebSocket, user_id: str):
                         (tab for tab in user_tabs if tab.get("active")), None
                     )
                     url = active_tab["url"] if active_tab else ""
-                    answer = await voice_website_summary(url, user_id)
+                    client_page = (
+                        user_page["text"]
+                        if user_page and user_page["url"] == url
+                        else None
+                    )
+                    try:
+                        answer = await voice_website_summary(
+                            url, user_id, audio_format, client_page
+                        )
+                    except HTTPException as e:
+                        if e.status_code == 429:
+                            await websocket.send_json({"error": e.detail})
+                            continue
+                        else:
+                            raise
 
                     logger.info(
                         f"AI responded with website summary: {answer.get('text', '')}"
@@ -216,107 +291,114 @@ async def handle_voice_websocket(websocket: WebSocket, user_id: str):
                         {
                             "text": answer.get("text", ""),
                             "audio_base64": answer.get("audio_base64", ""),
+                            "audio_format": audio_format["mime"],
                         }
                     )
 
                     logger.info("Sent TTS response for text")
                     continue
                 elif intent == "question":
-                    tokens_in = count_tokens(text)
-                    needs_search, search_query = await needs_web_search(text)
-                    if needs_search and search_query:
+                    # Резерв по быстрой оценке, точный подсчёт — при закрытии
+                    tokens_in = count_tokens_approx(text)
+
+                    reservation = await _reserve_turn(
+                        websocket,
+                        redis,
+                        user_id,
+                        {"tokens": tokens_in + ANSWER_TOKENS_ESTIMATE},
+                    )
+                    if reservation is None:
+                        continue
+                    search_reservations = []
+
+                    async def on_search(search_query: str):
                         logger.info(f"Требуется веб-поиск для запроса: {search_query}")
-                        tokens_in += 500  # добавляем 500 токенов за web search
-                    # Проверка лимита до генерации
+                        # добавляем 500 токенов за web search
+                        search_reservations.append(
+                            await reserve_usage(redis, user_id, {"tokens": 500})
+                        )
+
+                    # Решение о веб-поиске и обычный ответ считаются параллельно
                     try:
-                        await check_ai_limit_only(redis, user_id, tokens_in)
+                        answer, used_search, _ = await answer_with_optional_search(
+                            text, ActionAgent.handle_question, on_search
+                        )
                     except HTTPException as e:
+                        await release_usage(redis, reservation)
                         if e.status_code == 429:
                             await websocket.send_json({"error": "Token limit exceeded"})
                             continue
                         else:
                             raise
-                    # Генерация ответа
-                    if needs_search and search_query:
-                        answer = await process_web_search_results(search_query, text)
+                    if used_search:
                         logger.info(f"Получен ответ на основе веб-поиска: {answer}")
                     else:
-                        answer = await ActionAgent.handle_question(text)
                         logger.info(f"AI responded with default answer: {answer}")
-                    # Инкремент входящих токенов
-                    await increment_ai_limit(redis, user_id, tokens_in)
-                    # Инкремент исходящих токенов
-                    tokens_out = count_tokens(answer)
-                    await increment_ai_limit(redis, user_id, tokens_out)
-                    # --- синтез и отправка ответа (оставить как есть) ---
-
-                    await check_voice_limit_only(redis, user_id, len(answer))
-
-                    with tempfile.NamedTemporaryFile(delete=False, suffix=".mp3") as f:
-                        tts_path = f.name
-                    try:
-                        await synthesize_speech_async(answer, voice, tts_path)
-                    except NoAudioReceived:
-                        answer = "Ошибка синтеза речи: не удалось получить аудио. Попробуйте другой язык или переформулируйте запрос."
-                        logger.error("[TTS] No audio received from edge_tts.")
-                        audio_b64 = ""
-                    except Exception as tts_e:
-                        logger.error(f"TTS error: {tts_e}", exc_info=True)
-                        answer = f"Ошибка синтеза речи: {tts_e}"
-                        audio_b64 = ""
-                    else:
-                        with open(tts_path, "rb") as f:
-                            audio_b64 = base64.b64encode(f.read()).decode()
-                        os.remove(tts_path)
-
-                    await increment_voice_limit(redis, user_id, len(answer))
+                    tokens_in = await count_tokens_async(text)
+                    tokens_out = await count_tokens_async(answer)
+                    for search_reservation in search_reservations:
+                        await settle_usage(redis, search_reservation, {"tokens": 500})
+                    # Закрываем резерв фактическими входящими/исходящими токенами
+                    await settle_usage(
+                        redis, reservation, {"tokens": tokens_in + tokens_out}
+                    )
 
-                    await websocket.send_json(
-                        {"text": answer, "language": lang, "audio_base64": audio_b64}
+                    # --- синтез и отправка ответа ---
+                    audio_b64, voice_error = await _speak_reserved(
+                        redis, user_id, answer, audio_format
                     )
+                    response_json = {
+                        "text": answer,
+                        "language": lang,
+                        "audio_base64": audio_b64,
+                        "audio_format": audio_format["mime"],
+                    }
+                    if voice_error == QUOTAS["voice"]["detail"]:
+                        # Ответ без озвучки: текст всё равно отдаём
+                        response_json["voice_error"] = voice_error
+                    elif voice_error:
+                        response_json["text"] = answer = voice_error
+                    await websocket.send_json(response_json)
                     logger.info(f"Sent TTS response for text: {answer}")
                     continue
                 elif intent == "generate_text":
-                    tokens_in = count_tokens(text)
+                    tokens_in = count_tokens_approx(text)
+                    reservation = await _reserve_turn(
+                        websocket,
+                        redis,
+                        user_id,
+                        {"tokens": tokens_in + ANSWER_TOKENS_ESTIMATE},
+                    )
+                    if reservation is None:
+                        continue
                     try:
-                        await check_ai_limit_only(redis, user_id, tokens_in)
-                    except HTTPException as e:
-                        if e.status_code == 429:
-                            await websocket.send_json({"error": "Token limit exceeded"})
-                            continue
-                        else:
-                            raise
-                    result = await TextGenerationAgent.handle_generate_text(text, lang)
+                        result = await TextGenerationAgent.handle_generate_text(
+                            text, lang
+                        )
+                    except Exception:
+                        await release_usage(redis, reservation)
+                        raise
                     logger.info(f"AI generated text or note: {result}")
                     note_cmd = result.get("command", {})
                     answer = note_cmd.get("answer", "") if note_cmd else ""
-                    # Инкремент входящих токенов
-                    await increment_ai_limit(redis, user_id, tokens_in)
-                    # Инкремент исходящих токенов
-                    tokens_out = count_tokens(answer)
-                    await increment_ai_limit(redis, user_id, tokens_out)
-                    # --- синтез и отправка ответа (оставить как есть) ---
-
-                    await check_voice_limit_only(redis, user_id, len(answer))
+                    tokens_in = await count_tokens_async(text)
+                    tokens_out = await count_tokens_async(answer)
+                    await settle_usage(
+                        redis, reservation, {"tokens": tokens_in + tokens_out}
+                    )
 
-                    with tempfile.NamedTemporaryFile(delete=False, suffix=".mp3") as f:
-                        tts_path = f.name
-                    try:
-                        await synthesize_speech_async(answer, voice, tts_path)
-                    except Exception as tts_e:
-                        logger.error(f"TTS error: {tts_e}", exc_info=True)
-                        audio_b64 = ""
-                    else:
-                        with open(tts_path, "rb") as f:
-                            audio_b64 = base64.b64encode(f.read()).decode()
-                        os.remove(tts_path)
+                    # --- синтез и отправка ответа ---
+                    audio_b64, voice_error = await _speak_reserved(
+                        redis, user_id, answer, audio_format
+                    )
                     response_json = {
                         "answer": answer,
                         "audio_base64": audio_b64,
+                        "audio_format": audio_format["mime"],
                         **result,
                     }
-
-                    await increment_voice_limit(redis, user_id, len(answer))
+                    if voice_error:
+                        response_json["voice_error"] = voice_error
 
                     logger.info(f"Sending generate_text response JSON: {response_json}")
                     await websocket.send_json(response_json)
@@ -324,8 +406,8 @@ async def handle_voice_websocket(websocket: WebSocket, user_id: str):
                     continue
 
                 elif intent == "calendar":
-                    # Fetch user's events first
-                    async with get_db() as db:
+                    # Fetch user's events first (реплика, если не отстаёт)
+                    async with await read_session(int(user_id)) as db:
                         events = await db.execute(
                             select(Event).where(Event.user_id == int(user_id))
                         )
@@ -339,99 +421,77 @@ async def handle_voice_websocket(websocket: WebSocket, user_id: str):
                             for event in events.scalars().all()
                         ]
 
-                        # Get AI response
-                        cmd = await CalendarAgent.handle_calendar_command(
-                            text, lang, user_events
+                    # Get AI response
+                    cmd = await CalendarAgent.handle_calendar_command(
+                        text, lang, user_events
+                    )
+                    logger.info(f"AI responded with calendar command: {cmd}")
+
+                    # Handle event creation directly here
+                    if cmd.get("command", {}).get("operation") == "create_event":
+                        event_data = cmd["command"]["data"]
+                        # Convert string date to datetime object
+                        from datetime import datetime
+
+                        start_date = datetime.fromisoformat(event_data["start_date"])
+
+                        new_event = Event(
+                            title=event_data["title"],
+                            description=event_data["description"],
+                            start_date=start_date,  # Now it's a datetime object
+                            location=event_data.get("location"),
+                            user_id=int(user_id),
+                            reminder=15,
                         )
-                        logger.info(f"AI responded with calendar command: {cmd}")
+                        async with AsyncSessionLocal(
+                            info={"user_id": int(user_id)}
+                        ) as db:
+                            db.add(new_event)
+                            await db.commit()
+                        logger.info(f"New event created: {new_event}")
 
-                        # Handle event creation directly here
-                        if cmd.get("command", {}).get("operation") == "create_event":
-                            event_data = cmd["command"]["data"]
-                            # Convert string date to datetime object
-                            from datetime import datetime
+                        answer = cmd["command"]["answer"]
+                        # Synthesize voice response. Событие уже сохранено, поэтому
+                        # ответ отправляется всегда, без аудио при нехватке квоты
+                        audio_b64, voice_error = await _speak_reserved(
+                            redis, user_id, answer, audio_format
+                        )
+                        response_json = {
+                            "answer": answer,
+                            "audio_base64": audio_b64,
+                            "audio_format": audio_format["mime"],
+                        }
+                        if voice_error:
+                            response_json["voice_error"] = voice_error
 
-                            start_date = datetime.fromisoformat(
-                                event_data["start_date"]
-                            )
+                        # Send answer with audio
+                        await websocket.send_json(response_json)
+                    else:
+                        # For queries, also add voice synthesis
+                        answer = cmd["command"]["answer"]
+                        audio_b64, voice_error = await _speak_reserved(
+                            redis, user_id, answer, audio_format
+                        )
+                        if voice_error:
+                            cmd["voice_error"] = voice_error
 
-                            new_event = Event(
-                                title=event_data["title"],
-                                description=event_data["description"],
-                                start_date=start_date,  # Now it's a datetime object
-                                location=event_data.get("location"),
-                                user_id=int(user_id),
-                                reminder=15,
-                            )
-                            db.add(new_event)
-                            await db.commit()
-                            logger.info(f"New event created: {new_event}")
-
-                            answer = cmd["command"]["answer"]
-                            # Synthesize voice response
-                            await check_voice_limit_only(redis, user_id, len(answer))
-
-                            with tempfile.NamedTemporaryFile(
-                                delete=False, suffix=".mp3"
-                            ) as f:
-                                tts_path = f.name
-                            try:
-                                await synthesize_speech_async(answer, voice, tts_path)
-                            except NoAudioReceived:
-                                logger.error("[TTS] No audio received from edge_tts.")
-                                audio_b64 = ""
-                            except Exception as tts_e:
-                                logger.error(f"TTS error: {tts_e}", exc_info=True)
-                                audio_b64 = ""
-                            else:
-                                with open(tts_path, "rb") as f:
-                                    audio_b64 = base64.b64encode(f.read()).decode()
-                                os.remove(tts_path)
-
-                            await increment_voice_limit(redis, user_id, len(answer))
-
-                            # Send answer with audio
-                            await websocket.send_json(
-                                {"answer": answer, "audio_base64": audio_b64}
-                            )
-                        else:
-                            # For queries, also add voice synthesis
-                            answer = cmd["command"]["answer"]
-                            await check_voice_limit_only(redis, user_id, len(answer))
-
-                            with tempfile.NamedTemporaryFile(
-                                delete=False, suffix=".mp3"
-                            ) as f:
-                                tts_path = f.name
-                            try:
-                                await synthesize_speech_async(answer, voice, tts_path)
-                            except NoAudioReceived:
-                                logger.error("[TTS] No audio received from edge_tts.")
-                                audio_b64 = ""
-                            except Exception as tts_e:
-                                logger.error(f"TTS error: {tts_e}", exc_info=True)
-                                audio_b64 = ""
-                            else:
-                                with open(tts_path, "rb") as f:
-                                    audio_b64 = base64.b64encode(f.read()).decode()
-                                os.remove(tts_path)
-
-                            await increment_voice_limit(redis, user_id, len(answer))
-
-                            # Send full command with audio
-                            cmd["audio_base64"] = audio_b64
-                            await websocket.send_json(cmd)
-                        continue
+                        # Send full command with audio
+                        cmd["audio_base64"] = audio_b64
+                        cmd["audio_format"] = audio_format["mime"]
+                        await websocket.send_json(cmd)
+                    continue
                 else:
                     answer = "Please, repeat your command."
                     logger.info("AI could not understand request")
 
-                with tempfile.NamedTemporaryFile(delete=False, suffix=".mp3") as f:
+                with tempfile.NamedTemporaryFile(
+                    delete=False, suffix=audio_format["suffix"]
+                ) as f:
                     tts_path = f.name
                 try:
-                    await synthesize_speech_async(answer, voice, tts_path)
+                    await synthesize_speech_async(answer, voice, tts_path, audio_format)
                 except NoAudioReceived:
-                    answer = "Ошибка синтеза речи: не удалось получить аудио. Попробуйте другой язык или переформулируйте запрос."
+                    answer = TTS_NO_AUDIO_ERROR
                     logger.error("[TTS] No audio received from edge_tts.")
                     audio_b64 = ""
                 except Exception as tts_e:
@@ -444,7 +504,12 @@ async def handle_voice_websocket(websocket: WebSocket, user_id: str):
                     os.remove(tts_path)
 
                 await websocket.send_json(
-                    {"text": answer, "language": lang, "audio_base64": audio_b64}
+                    {
+                        "text": answer,
+                        "language": lang,
+                        "audio_base64": audio_b64,
+                        "audio_format": audio_format["mime"],
+                    }
                 )
                 logger.info(f"Sent TTS response for text: {answer}")
 
@@ -454,6 +519,22 @@ async def handle_voice_websocket(websocket: WebSocket, user_id: str):
                     if isinstance(parsed, dict) and "tabs" in parsed:
                         user_tabs = parsed["tabs"]
                         logger.info(f"Received user tabs: {user_tabs}")
+                    if isinstance(parsed, dict) and isinstance(
+                        parsed.get("page"), dict
+                    ):
+                        page = parsed["page"]
+                        try:
+                            page_text = await asyncio.to_thread(
+                                clean_client_page,
+                                page.get("text"),
+                                page.get("html"),
+                                page.get("html_gz"),
+                            )
+                        except HTTPException as e:
+                            await websocket.send_json({"error": e.detail})
+                            continue
+                        user_page = {"url": page.get("url", ""), "text": page_text}
+                        logger.info(f"Received page content for {user_page['url']}")
                 except json.JSONDecodeError:
                     logger.error("Failed to decode JSON from text message.")
 
@@ -1,26 +1,77 @@
 from edge_tts.exceptions import NoAudioReceived
 
 import app.redis_client
+from app.core.cache import cache_get, cache_set, single_flight
 from app.core.config import settings
-from app.token_limit import check_voice_limit_only, increment_voice_limit
+from app.token_limit import (
+    check_quotas,
+    quota_exceeded_error,
+    release_usage,
+    settle_usage,
+)
 from app.services.summarize_service import summarize_text_full
-from app.core.dependencies.utils import get_voice_summary_within_limit
-from app.services.voice.speech import synthesize_speech_async
+from app.services.summary_cache import (
+    get_cached_url_summary,
+    remember_url_content,
+    summary_style,
+)
+from app.services.voice.speech import (
+    negotiate_audio_format,
+    synthesize_long_speech_async,
+)
+
+from urllib.parse import urlsplit
 
 import logging
 import json
 import os
 import aiohttp
+import asyncio
 import tempfile
 import base64
+import hashlib
+import re
+import time
+import unicodedata
+import zlib
 
 
 logger = logging.getLogger(__name__)
 serper_api_key = settings.serper_api_key
 voice = settings.eleven_labs_voice_id
+SUMMARIZE_MAX_INPUT_CHARS = settings.summarize_max_input_chars
+SUMMARIZE_CHUNK_TOKENS = settings.summarize_chunk_tokens
+PAGE_CACHE_TTL = settings.page_cache_ttl
+PAGE_CACHE_STALE_TTL = settings.page_cache_stale_ttl
+PAGE_CACHE_MAX_ENTRIES = settings.page_cache_max_entries
+PAGE_CACHE_DOMAIN_TTLS = settings.page_cache_domain_ttls
+SEARCH_CACHE_TTL_VOLATILE = settings.search_cache_ttl_volatile
+SEARCH_CACHE_TTL_NEWS = settings.search_cache_ttl_news
+SEARCH_CACHE_TTL_DEFAULT = settings.search_cache_ttl_default
+SEARCH_CACHE_MAX_ENTRIES = settings.search_cache_max_entries
+# Меняем версию при изменении нормализации, чтобы не отдавать старые записи
+SEARCH_CACHE_VERSION = "v2"
+SEARCH_LOCK_WAIT_STEPS = 30  # по 100 мс
+
+# Ссылки на фоновые обновления, чтобы их не собрал GC
+_background_tasks = set()
+
+
+def _page_cache_ttl(website_url: str) -> int:
+    """TTL свежести по домену: точное совпадение или поддомен из настроек."""
+    host = (urlsplit(website_url).hostname or "").lower()
+    for domain, ttl in PAGE_CACHE_DOMAIN_TTLS.items():
+        domain = domain.lower()
+        if host == domain or host.endswith("." + domain):
+            return ttl
+    return PAGE_CACHE_TTL
 
 
-async def fetch_website(website_url: str):
+def _page_cache_key(website_url: str) -> str:
+    return hashlib.sha256(website_url.strip().encode("utf-8")).hexdigest()
+
+
+async def _scrape_website(website_url: str) -> tuple[str, bool]:
     url = "https://scrape.serper.dev"
     payload = {"url": website_url}
     headers = {
@@ -31,44 +82,140 @@ async def fetch_website(website_url: str):
     async with aiohttp.ClientSession() as session:
         async with session.post(url, headers=headers, json=payload) as response:
             result = await response.text()
-            return result
-
-
-async def voice_website_summary(website_url: str, current_user_id: str):
-    user_id = str(current_user_id)
-    symbols_needed = 100
-    redis = app.redis_client.redis
-
-    await check_voice_limit_only(redis, user_id, symbols_needed)
-
-    data_to_voice = await fetch_website(website_url)
+            ok = response.status == 200
 
+    # Serper отдаёт JSON вида {"text": ..., "metadata": ...}
     try:
-        parsed = json.loads(data_to_voice)
+        parsed = json.loads(result)
         if isinstance(parsed, dict) and "text" in parsed:
-            data_to_voice = parsed["text"]
+            return parsed["text"], ok
     except Exception:
         pass  # if not JSON — leave as is
+    return result, ok
 
-    if len(data_to_voice) > 1000:
-        truncated_data_to_voice = data_to_voice[:10000]
 
-        summarized_text_to_voice = await summarize_text_full(
-            truncated_data_to_voice, 2000
+async def _scrape_and_cache(website_url: str) -> str:
+    text, ok = await _scrape_website(website_url)
+    if ok and text:
+        body = base64.b64encode(zlib.compress(text.encode("utf-8"))).decode()
+        value = json.dumps({"fetched_at": time.time(), "body": body})
+        ttl = _page_cache_ttl(website_url) + PAGE_CACHE_STALE_TTL
+        await cache_set(
+            app.redis_client.redis,
+            "page",
+            _page_cache_key(website_url),
+            value,
+            ttl,
+            PAGE_CACHE_MAX_ENTRIES,
         )
+    return text
 
-        summarized_text_to_voice = await get_voice_summary_within_limit(
-            redis, user_id, summarized_text_to_voice
-        )
 
+async def _revalidate_page(website_url: str):
+    redis = app.redis_client.redis
+    lock_key = f"page_refresh:{_page_cache_key(website_url)}"
+    # Обновляет только один воркер, остальные продолжают отдавать старую версию
+    if not await redis.set(lock_key, "1", ex=60, nx=True):
+        return
+    try:
+        await _scrape_and_cache(website_url)
+        logger.info(f"[PageCache] revalidated {website_url}")
+    except Exception as e:
+        logger.error(f"[PageCache] revalidation failed for {website_url}: {e}")
+    finally:
+        await redis.delete(lock_key)
+
+
+async def fetch_website(website_url: str) -> str:
+    """
+    Текст страницы через Serper с кэшем в Redis: свежая запись отдаётся сразу,
+    устаревшая (в пределах stale-окна) тоже отдаётся сразу, а в фоне страница
+    скачивается заново.
+    """
+    redis = app.redis_client.redis
+    cached = await cache_get(redis, "page", _page_cache_key(website_url))
+    if cached:
+        entry = json.loads(cached)
+        text = zlib.decompress(base64.b64decode(entry["body"])).decode("utf-8")
+        age = time.time() - entry["fetched_at"]
+        if age > _page_cache_ttl(website_url):
+            task = asyncio.create_task(_revalidate_page(website_url))
+            _background_tasks.add(task)
+            task.add_done_callback(_background_tasks.discard)
+            logger.info(f"[PageCache] stale hit ({int(age)}s) for {website_url}")
+        else:
+            logger.info(f"[PageCache] hit ({int(age)}s) for {website_url}")
+        return text
+
+    return await _scrape_and_cache(website_url)
+
+
+async def get_page_text(website_url: str, client_page: str | None = None) -> str:
+    """
+    Текст страницы: то, что прислало расширение (уже очищенное), а Serper —
+    только если клиент не смог прочитать страницу сам.
+    """
+    if client_page:
+        logger.info(f"Using client-provided page text for {website_url}")
+        return client_page
+    return await fetch_website(website_url)
+
+
+async def voice_website_summary(
+    website_url: str,
+    current_user_id: str,
+    audio_format: dict | None = None,
+    client_page: str | None = None,
+):
+    audio_format = audio_format or negotiate_audio_format()
+    user_id = str(current_user_id)
+    symbols_needed = 100
+    redis = app.redis_client.redis
+
+    # Резерв и остаток квоты озвучки одним вызовом: остаток ограничивает
+    # длину текста, который можно озвучить
+    status = await check_quotas(redis, user_id, {"voice": symbols_needed}, reserve=True)
+    if not status["allowed"]:
+        raise quota_exceeded_error(status)
+    reservation = status["reservation"]
+    voice_allowance = status["remaining"]["voice"] + symbols_needed
+
+    cached = None
+    if not client_page:
+        cached = await get_cached_url_summary(
+            website_url, summary_style(SUMMARIZE_CHUNK_TOKENS)
+        )
+    if cached and cached["length"] > 1000:
+        logger.info(f"Summary cache hit for {website_url}")
+        summarized_text_to_voice = cached["summary"][:voice_allowance]
     else:
-        truncated_data_to_voice = data_to_voice
-        summarized_text_to_voice = truncated_data_to_voice
+        try:
+            data_to_voice = await get_page_text(website_url, client_page)
+            if len(data_to_voice) > 1000:
+                truncated_data_to_voice = data_to_voice[:SUMMARIZE_MAX_INPUT_CHARS]
+                summarized_text_to_voice = await summarize_text_full(
+                    truncated_data_to_voice
+                )
+        except Exception:
+            # Страница или суммаризация недоступны — резерв озвучки не нужен
+            await release_usage(redis, reservation)
+            raise
+
+        if len(data_to_voice) > 1000:
+            await remember_url_content(website_url, truncated_data_to_voice)
+
+            summarized_text_to_voice = summarized_text_to_voice[:voice_allowance]
+
+        else:
+            truncated_data_to_voice = data_to_voice
+            summarized_text_to_voice = truncated_data_to_voice
 
-    with tempfile.NamedTemporaryFile(delete=False, suffix=".mp3") as f:
+    with tempfile.NamedTemporaryFile(delete=False, suffix=audio_format["suffix"]) as f:
         tts_path = f.name
     try:
-        await synthesize_speech_async(summarized_text_to_voice, voice, tts_path)
+        await synthesize_long_speech_async(
+            summarized_text_to_voice, voice, tts_path, audio_format
+        )
     except NoAudioReceived:
         summarized_text_to_voice = "Error occured, could not synthesize text"
         logger.error("[TTS] No audio received from edge_tts.")
@@ -82,18 +229,95 @@ async def voice_website_summary(website_url: str, current_user_id: str):
             audio_b64 = base64.b64encode(f.read()).decode()
         os.remove(tts_path)
     if audio_b64 == "":
+        await release_usage(redis, reservation)
         logger.info(
             f"Error occured and system could not synthesize text. Sent text to client: {summarized_text_to_voice}"
         )
         return {"text": summarized_text_to_voice}
     logger.info(f"Sent voiced text to client: {summarized_text_to_voice}")
 
-    await increment_voice_limit(redis, user_id, len(summarized_text_to_voice) + 50)
+    await settle_usage(
+        redis, reservation, {"voice": len(summarized_text_to_voice) + 50}
+    )
 
-    return {"text": summarized_text_to_voice, "audio_base64": audio_b64}
+    return {
+        "text": summarized_text_to_voice,
+        "audio_base64": audio_b64,
+        "audio_format": audio_format["mime"],
+    }
 
 
-async def handle_web_search(query: str):
+SEARCH_STOPWORDS = {
+    "и",
+    "в",
+    "на",
+    "по",
+    "с",
+    "к",
+    "о",
+    "а",
+    "the",
+    "a",
+    "an",
+    "in",
+    "on",
+    "of",
+    "for",
+    "to",
+    "is",
+    "what",
+    "какой",
+    "какая",
+    "какое",
+    "какие",
+    "сколько",
+    "скажи",
+    "найди",
+    "please",
+    "пожалуйста",
+}
+# Категории запросов, которые быстро устаревают (ищутся по подстроке в
+# нормализованном запросе, поэтому маркеры — отдельные слова или их основы)
+VOLATILE_SEARCH_MARKERS = (
+    "погод",
+    "weather",
+    "температур",
+    "прогноз",
+    "forecast",
+    "курс",
+    "exchange",
+    "доллар",
+    "евро",
+    "рубл",
+    "тенге",
+    "usd",
+    "eur",
+    "btc",
+    "биткоин",
+    "bitcoin",
+)
+NEWS_SEARCH_MARKERS = ("новост", "news", "матч", "score")
+
+
+def normalize_search_query(query: str) -> str:
+    """
+    Приводит запрос к каноничному виду: регистр, пробелы, стоп-слова.
+    Порядок слов сохраняется: "USD to EUR" и "EUR to USD" — разные запросы.
+    """
+    words = re.findall(r"\w+", unicodedata.normalize("NFC", query).lower())
+    words = [w for w in words if w not in SEARCH_STOPWORDS]
+    return " ".join(words)
+
+
+def search_cache_ttl(normalized_query: str) -> int:
+    if any(marker in normalized_query for marker in VOLATILE_SEARCH_MARKERS):
+        return SEARCH_CACHE_TTL_VOLATILE
+    if any(marker in normalized_query for marker in NEWS_SEARCH_MARKERS):
+        return SEARCH_CACHE_TTL_NEWS
+    return SEARCH_CACHE_TTL_DEFAULT
+
+
+async def _serper_search(query: str) -> tuple[dict, bool]:
     url = "https://google.serper.dev/search"
 
     payload = json.dumps({"q": query})
@@ -105,4 +329,55 @@ async def handle_web_search(query: str):
 
     async with aiohttp.ClientSession() as session:
         async with session.post(url, headers=headers, data=payload) as response:
-            return await response.json()
+            return await response.json(), response.status == 200
+
+
+async def _search_and_cache(query: str, normalized: str, cache_key: str) -> dict:
+    redis = app.redis_client.redis
+    lock_key = f"search_lock:{cache_key}"
+    locked = redis is not None and await redis.set(lock_key, "1", ex=10, nx=True)
+    if redis is not None and not locked:
+        # Этот же запрос уже выполняет другой воркер — ждём его результат
+        for _ in range(SEARCH_LOCK_WAIT_STEPS):
+            await asyncio.sleep(0.1)
+            cached = await cache_get(redis, "search", cache_key)
+            if cached:
+                return json.loads(cached)
+
+    try:
+        result, ok = await _serper_search(query)
+        if ok and "organic" in result:
+            await cache_set(
+                redis,
+                "search",
+                cache_key,
+                json.dumps(result, ensure_ascii=False),
+                search_cache_ttl(normalized),
+                SEARCH_CACHE_MAX_ENTRIES,
+            )
+        return result
+    finally:
+        if locked:
+            await redis.delete(lock_key)
+
+
+async def handle_web_search(query: str):
+    """
+    Поиск через Serper с кэшем по нормализованному запросу. TTL зависит от
+    категории: погода и курсы — минуты, новости — дольше, остальное — часы.
+    Одинаковые одновременные запросы делят один вызов Serper.
+    """
+    normalized = normalize_search_query(query) or query.strip().lower()
+    cache_key = hashlib.sha256(
+        f"{SEARCH_CACHE_VERSION}:{normalized}".encode("utf-8")
+    ).hexdigest()
+
+    cached = await cache_get(app.redis_client.redis, "search", cache_key)
+    if cached:
+        logger.info(f"[SearchCache] hit for '{normalized}'")
+        return json.loads(cached)
+
+    return await single_flight(
+        f"search:{cache_key}",
+        lambda: _search_and_cache(query, normalized, cache_key),
+    )
@@ -0,0 +1,158 @@
+from app.core.config import settings
+import app.redis_client
+
+import asyncio
+import json
+import logging
+import time
+import uuid
+
+
+logger = logging.getLogger(__name__)
+
+INVALIDATION_CHANNEL = settings.invalidation_channel
+# Глобальный счётчик сообщений: по разрыву в номерах воркер понимает,
+# что пропустил сообщения (переподключение, переполнение буфера)
+SEQUENCE_KEY = f"{INVALIDATION_CHANNEL}:seq"
+
+# Типы инвалидации и что означает id в сообщении. Вид добавляется вместе
+# с локальным кэшем, который на него подписан (on_invalidate)
+KINDS = {
+    "user": "user_id",
+}
+
+WORKER_ID = uuid.uuid4().hex
+# Сообщения разных воркеров могут прийти не по порядку номеров: пропуск
+# считается потерей, только если номер не пришёл за это время
+MISSED_GRACE_SECONDS = 2.0
+
+# kind -> обработчики вида handler(id); resets — полный сброс локальных кэшей
+_handlers: dict[str, list] = {kind: [] for kind in KINDS}
+_resets: list = []
+_last_seq: int | None = None
+# Номера, которые пропущены, но ещё могут прийти: номер -> когда заметили
+_missing: dict[int, float] = {}
+
+
+def on_invalidate(kind: str, handler, reset=None):
+    """
+    Подписывает локальный кэш воркера на сообщения kind.
+    reset() вызывается, если часть сообщений могла быть пропущена.
+    """
+    if kind not in KINDS:
+        raise ValueError(f"Unknown invalidation kind: {kind}")
+    _handlers[kind].append(handler)
+    if reset is not None and reset not in _resets:
+        _resets.append(reset)
+
+
+def _apply(kind: str, id: int):
+    for handler in _handlers.get(kind, []):
+        try:
+            handler(id)
+        except Exception as e:
+            logger.error(f"[Invalidation] handler failed for {kind}:{id}: {e}")
+
+
+def _reset_all(reason: str):
+    logger.warning(f"[Invalidation] resetting local caches: {reason}")
+    for reset in _resets:
+        try:
+            reset()
+        except Exception as e:
+            logger.error(f"[Invalidation] reset failed: {e}")
+
+
+async def publish(kind: str, id: int):
+    """
+    Вызывается после коммита записи: локальный кэш сбрасывается сразу,
+    остальные воркеры получают сообщение через Redis pub/sub.
+    """
+    if kind not in KINDS:
+        raise ValueError(f"Unknown invalidation kind: {kind}")
+    _apply(kind, id)
+
+    redis = app.redis_client.redis
+    if redis is None:
+        return
+    try:
+        seq = await redis.incr(SEQUENCE_KEY)
+        message = {"kind": kind, "id": id, "seq": seq, "origin": WORKER_ID}
+        await redis.publish(INVALIDATION_CHANNEL, json.dumps(message))
+    except Exception as e:
+        # Остальные воркеры увидят разрыв в номерах и сбросят кэши целиком
+        logger.error(f"[Invalidation] publish failed for {kind}:{id}: {e}")
+
+
+def handle_message(raw: str):
+    global _last_seq
+    try:
+        message = json.loads(raw)
+        kind, id, seq = message["kind"], int(message["id"]), int(message["seq"])
+    except (ValueError, KeyError, TypeError) as e:
+        logger.error(f"[Invalidation] bad message {raw!r}: {e}")
+        return
+
+    now = time.monotonic()
+    if seq in _missing:
+        del _missing[seq]
+    elif _last_seq is not None and seq > _last_seq + 1:
+        for missed in range(_last_seq + 1, seq):
+            _missing[missed] = now
+    _last_seq = max(seq, _last_seq or 0)
+    if message.get("origin") != WORKER_ID:
+        _apply(kind, id)
+    _check_missing(now)
+
+
+def _check_missing(now: float | None = None):
+    """Сбрасывает кэши, если пропущенные номера не пришли за MISSED_GRACE_SECONDS."""
+    now = time.monotonic() if now is None else now
+    lost = [
+        s for s, seen_at in _missing.items() if now - seen_at > MISSED_GRACE_SECONDS
+    ]
+    if lost:
+        for s in lost:
+            del _missing[s]
+        _reset_all(f"missed {len(lost)} messages")
+
+
+async def run_subscriber(retry_delay: float = 1.0):
+    """
+    Фоновая задача воркера: слушает канал инвалидации. После переподключения
+    номер последнего сообщения сверяется со счётчиком в Redis, при
+    расхождении локальные кэши сбрасываются.
+    """
+    global _last_seq
+    while True:
+        redis = app.redis_client.redis
+        pubsub = redis.pubsub()
+        try:
+            await pubsub.subscribe(INVALIDATION_CHANNEL)
+            current = int(await redis.get(SEQUENCE_KEY) or 0)
+            if _last_seq is not None and current > _last_seq:
+                _reset_all(f"missed {current - _last_seq} messages while disconnected")
+            _last_seq = current
+            _missing.clear()
+            logger.info(f"[Invalidation] subscribed, seq={current}")
+
+            while True:
+                # Ждём с таймаутом, чтобы пропуск обнаружился и тогда,
+                # когда следующих сообщений долго нет
+                message = await pubsub.get_message(
+                    ignore_subscribe_messages=True, timeout=MISSED_GRACE_SECONDS
+                )
+                if message is not None and message.get("type") == "message":
+                    handle_message(message["data"])
+                else:
+                    _check_missing()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"[Invalidation] subscriber error: {e}")
+            await asyncio.sleep(retry_delay)
+        finally:
+            try:
+                await pubsub.close()
+            except Exception:
+                pass
@@ -0,0 +1,120 @@
+import app.redis_client
+
+import asyncio
+import logging
+import time
+import uuid
+
+
+logger = logging.getLogger(__name__)
+
+# Локальные (ещё не отправленные в Redis) приращения счётчиков квот:
+# ключ счётчика -> [сумма, expireat]
+_pending: dict[str, list[int]] = {}
+# Пачка, отправка которой не подтверждена (ошибка посреди pipeline):
+# (id пачки, приращения). Повторяется с тем же id, пока Redis не ответит
+_unconfirmed: tuple[str, dict[str, list[int]]] | None = None
+# Последние известные значения счётчиков из Redis: ключ -> (значение, время)
+_snapshots: dict[str, tuple[int, float]] = {}
+
+# Отметка о применённой пачке живёт дольше любой паузы между повторами
+FLUSH_MARK_TTL = 3600
+
+# KEYS[1] — счётчик, KEYS[2] — отметка пачки (тот же hash tag, что у
+# счётчика). ARGV: приращение, expireat, ttl отметки. Повтор пачки с тем же
+# id не списывает приращение второй раз. Возвращает значение счётчика.
+FLUSH_SCRIPT = """
+if redis.call("SET", KEYS[2], 1, "NX", "EX", ARGV[3]) then
+    redis.call("INCRBY", KEYS[1], ARGV[1])
+    redis.call("EXPIREAT", KEYS[1], ARGV[2])
+end
+return tonumber(redis.call("GET", KEYS[1]) or "0")
+"""
+_flush_script = None
+
+
+def record(key: str, amount: int, expire_at: int):
+    """Копит приращение локально; в Redis оно уйдёт при следующем flush."""
+    entry = _pending.setdefault(key, [0, expire_at])
+    entry[0] += amount
+    entry[1] = max(entry[1], expire_at)
+
+
+def pending(key: str) -> int:
+    entry = _pending.get(key)
+    total = entry[0] if entry else 0
+    if _unconfirmed is not None:
+        entry = _unconfirmed[1].get(key)
+        total += entry[0] if entry else 0
+    return total
+
+
+def remember(key: str, value: int):
+    _snapshots[key] = (value, time.monotonic())
+
+
+def cached_total(key: str, max_age: float) -> int | None:
+    """
+    Значение счётчика без похода в Redis: снимок не старше max_age секунд
+    плюс локальные несброшенные приращения. None, если снимок устарел.
+    """
+    snapshot = _snapshots.get(key)
+    if snapshot is None or time.monotonic() - snapshot[1] > max_age:
+        return None
+    return snapshot[0] + pending(key)
+
+
+def prune(max_age: float):
+    """Удаляет устаревшие снимки (вчерашние ключи, неактивные пользователи)."""
+    now = time.monotonic()
+    for key in [k for k, (_, at) in _snapshots.items() if now - at > max_age]:
+        del _snapshots[key]
+
+
+async def flush(redis):
+    """
+    Отправляет накопленные приращения одним pipeline (скрипт на ключ).
+    Если pipeline упал, неизвестно, какие приращения Redis уже применил,
+    поэтому пачка повторяется целиком с тем же id: применённые ключи
+    пропускаются по отметке, и расход не удваивается.
+    """
+    global _pending, _unconfirmed, _flush_script
+    if redis is None:
+        return
+    if _unconfirmed is None:
+        if not _pending:
+            return
+        _unconfirmed, _pending = (uuid.uuid4().hex, _pending), {}
+    batch_id, batch = _unconfirmed
+
+    if _flush_script is None:
+        _flush_script = redis.register_script(FLUSH_SCRIPT)
+    try:
+        async with redis.pipeline(transaction=False) as pipe:
+            for key, (amount, expire_at) in batch.items():
+                await _flush_script(
+                    keys=[key, f"quota_flush:{key}:{batch_id}"],
+                    args=[amount, expire_at, FLUSH_MARK_TTL],
+                    client=pipe,
+                )
+            results = await pipe.execute()
+    except Exception as e:
+        logger.error(f"[QuotaLedger] flush failed, {len(batch)} keys kept: {e}")
+        return
+
+    _unconfirmed = None
+    for key, total in zip(batch, results):
+        remember(key, int(total))
+    logger.debug(f"[QuotaLedger] flushed {len(batch)} keys")
+
+
+async def run_flusher(interval: float, max_age: float):
+    """Фоновая задача воркера: сбрасывает локальный журнал каждые interval секунд."""
+    try:
+        while True:
+            await asyncio.sleep(interval)
+            await flush(app.redis_client.redis)
+            prune(max_age)
+    finally:
+        # При остановке отправляем остаток, чтобы не потерять расход
+        await flush(app.redis_client.redis)
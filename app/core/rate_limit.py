@@ -0,0 +1,126 @@
+from fastapi import Depends, HTTPException, WebSocket
+
+from app.core.config import settings
+from app.core.dependencies.utils import Principal, get_current_principal
+import app.redis_client
+
+import logging
+import math
+import time
+
+
+logger = logging.getLogger(__name__)
+
+# Лимиты по умолчанию: "запросов/период"; переопределяются settings.rate_limits
+DEFAULT_RATE_LIMITS = {
+    "default": "60/minute",
+    "translate": "30/minute",
+    "summarize": "10/minute",
+    "voice": "20/minute",
+    "chat": "30/minute",
+}
+PERIODS = {"second": 1, "minute": 60, "hour": 3600, "day": 86400}
+
+# GCRA: в ключе хранится теоретическое время следующего запроса (TAT, мс).
+# ARGV: now, интервал между запросами, допустимый всплеск (всё в мс).
+# Возвращает {1, 0} или {0, через сколько мс можно повторить}.
+GCRA_SCRIPT = """
+local now = tonumber(ARGV[1])
+local interval = tonumber(ARGV[2])
+local tolerance = tonumber(ARGV[3])
+local tat = math.max(tonumber(redis.call("GET", KEYS[1]) or now), now)
+local new_tat = tat + interval
+local allow_at = new_tat - tolerance
+if allow_at > now then
+    return {0, allow_at - now}
+end
+redis.call("SET", KEYS[1], new_tat, "PX", math.ceil(new_tat - now))
+return {1, 0}
+"""
+
+_script = None
+
+
+def parse_rate(rate: str) -> tuple[int, int]:
+    """'10/minute' -> (10, 60)"""
+    count, period = rate.split("/")
+    return int(count), PERIODS[period.strip().rstrip("s")]
+
+
+def get_rate(scope: str, user_id: str) -> tuple[int, int]:
+    """Лимит для пользователя: персональный, затем по эндпоинту, затем общий."""
+    user_rates = settings.rate_limit_overrides.get(str(user_id), {})
+    rate = (
+        user_rates.get(scope)
+        or settings.rate_limits.get(scope)
+        or DEFAULT_RATE_LIMITS.get(scope)
+        or settings.rate_limits.get("default")
+        or DEFAULT_RATE_LIMITS["default"]
+    )
+    return parse_rate(rate)
+
+
+async def hit(scope: str, user_id: str) -> float:
+    """
+    Засчитывает запрос пользователя к scope. Возвращает 0, если запрос
+    разрешён, иначе — через сколько секунд можно повторить.
+    Всплеск до count запросов разрешён сразу, дальше — равномерно.
+    """
+    global _script
+    redis = app.redis_client.redis
+    if redis is None:
+        raise RuntimeError("Redis client is not initialized!")
+
+    count, period = get_rate(scope, user_id)
+    interval = period * 1000 / count
+    if _script is None:
+        _script = redis.register_script(GCRA_SCRIPT)
+    try:
+        allowed, retry_ms = await _script(
+            keys=[f"rate:{scope}:{user_id}"],
+            args=[int(time.time() * 1000), interval, interval * count],
+            client=redis,
+        )
+    except Exception as e:
+        # Ограничитель не должен ронять сервис, если Redis недоступен
+        logger.error(f"[RateLimit] check failed for {scope}/{user_id}: {e}")
+        return 0
+    if allowed:
+        return 0
+    logger.warning(
+        f"[RateLimit] user_id={user_id} | scope={scope} | limit={count}/{period}s | retry_after={int(retry_ms)}ms"
+    )
+    return int(retry_ms) / 1000
+
+
+def rate_limit(scope: str):
+    """
+    Зависимость FastAPI: 429 с заголовком Retry-After, если пользователь
+    превысил лимит запросов к scope.
+        @router.post(..., dependencies=[Depends(rate_limit("summarize"))])
+    """
+
+    async def dependency(current_user: Principal = Depends(get_current_principal)):
+        retry_after = await hit(scope, str(current_user.id))
+        if retry_after:
+            raise HTTPException(
+                status_code=429,
+                detail="Too many requests",
+                headers={"Retry-After": str(math.ceil(retry_after))},
+            )
+
+    return dependency
+
+
+async def allow_ws_message(websocket: WebSocket, scope: str, user_id: str) -> bool:
+    """
+    Проверка лимита для каждого сообщения WebSocket. При превышении
+    отправляет клиенту ошибку с retry_after и возвращает False.
+    """
+    retry_after = await hit(scope, str(user_id))
+    if not retry_after:
+        return True
+    await websocket.send_json(
+        {"error": "Too many requests", "retry_after": math.ceil(retry_after)}
+    )
+    return False
@@ -3,20 +3,16 @@ from jose import jwt
 from passlib.context import CryptContext
 
 from app.core.config import settings
+from app.services.email_queue import enqueue_email
 
+from concurrent.futures import ThreadPoolExecutor
+
+import asyncio
 import json
 from itsdangerous import URLSafeTimedSerializer, BadSignature, SignatureExpired
 
-from email.message import EmailMessage
-from aiosmtplib import send
-
 
 SECRET_KEY = settings.secret_key
-
-SMTP_HOST = settings.smtp_host
-SMTP_PORT = settings.smtp_port
-SMTP_USER = settings.smtp_user
-SMTP_PASS = settings.smtp_pass
 FRONTEND_URL = settings.frontend_url
 
 SALT = "email-confirmation"
@@ -41,60 +37,62 @@ def verify_email_token(token: str, max_age: int = 3600) -> dict:
         raise ValueError("Токен недействителен")
 
 
+# Письма ставятся в очередь и уходят из фонового воркера (email_queue),
+# поэтому запрос не ждёт SMTP-рукопожатия
 async def send_confirmation_email(email: str, token: str):
     confirm_url = f"{FRONTEND_URL}/confirm-email?token={token}"
-
-    message = EmailMessage()
-    message["From"] = SMTP_USER
-    message["To"] = email
-    message["Subject"] = "Подтверждение регистрации"
-    message.set_content(
+    await enqueue_email(
+        email,
+        "Подтверждение регистрации",
         f"Здравствуйте!\n\nДля завершения регистрации перейдите по ссылке:\n{confirm_url}\n\n"
-        "Если вы не регистрировались, просто проигнорируйте это письмо."
-    )
-
-    await send(
-        message,
-        hostname=SMTP_HOST,
-        port=SMTP_PORT,
-        username=SMTP_USER,
-        password=SMTP_PASS,
-        start_tls=True,
+        "Если вы не регистрировались, просто проигнорируйте это письмо.",
     )
 
 
 async def send_change_pass_confirmation_email(email: str, token: str):
     confirm_url = f"{FRONTEND_URL}/confirm-password?token={token}"
-
-    message = EmailMessage()
-    message["From"] = SMTP_USER
-    message["To"] = email
-    message["Subject"] = "Смена пароля"
-    message.set_content(
+    await enqueue_email(
+        email,
+        "Смена пароля",
         f"Здравствуйте!\n\nДля смены пароля перейдите по ссылке:\n{confirm_url}\n\n"
-        "Если вы не пытались поменять пароль, просто проигнорируйте это письмо."
-    )
-
-    await send(
-        message,
-        hostname=SMTP_HOST,
-        port=SMTP_PORT,
-        username=SMTP_USER,
-        password=SMTP_PASS,
-        start_tls=True,
+        "Если вы не пытались поменять пароль, просто проигнорируйте это письмо.",
     )
 
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# Хеши с другим числом раундов считаются устаревшими и обновляются при входе
+pwd_context = CryptContext(
+    schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=settings.bcrypt_rounds
+)
 ALGORITHM = "HS256"
 
+# bcrypt — ~100+ мс чистого CPU, поэтому считаем его в отдельном ограниченном
+# пуле: цикл событий не блокируется, а всплеск логинов ждёт в очереди пула
+password_executor = ThreadPoolExecutor(
+    max_workers=settings.password_hash_workers, thread_name_prefix="bcrypt"
+)
+
+
+async def _run_in_hash_pool(func, *args):
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(password_executor, func, *args)
+
+
+async def hash_password(password: str) -> str:
+    return await _run_in_hash_pool(pwd_context.hash, password)
+
 
-def hash_password(password: str) -> str:
-    return pwd_context.hash(password)
+async def verify_password(password: str, hashed: str) -> bool:
+    return await _run_in_hash_pool(pwd_context.verify, password, hashed)
 
 
-def verify_password(password: str, hashed: str) -> bool:
-    return pwd_context.verify(password, hashed)
+async def verify_and_update_password(
+    password: str, hashed: str
+) -> tuple[bool, str | None]:
+    """
+    Проверяет пароль и, если хеш посчитан с устаревшим числом раундов,
+    возвращает новый хеш для сохранения (иначе None).
+    """
+    return await _run_in_hash_pool(pwd_context.verify_and_update, password, hashed)
 
 
 def create_access_token(subject: str, expires_delta: int | None = None) -> str:
@@ -0,0 +1,96 @@
+from app.core.config import settings
+from app.core.invalidation import on_invalidate, publish
+import app.redis_client
+
+from collections import OrderedDict
+
+import json
+import logging
+import time
+
+
+logger = logging.getLogger(__name__)
+
+USER_CACHE_TTL = settings.user_cache_ttl
+USER_CACHE_LOCAL_TTL = settings.user_cache_local_ttl
+USER_CACHE_MAX_ENTRIES = settings.user_cache_max_entries
+
+# Поля пользователя, которые кэшируются (хеш пароля сюда не попадает)
+USER_FIELDS = ("id", "name", "email", "avatar_url", "is_oauth_user")
+
+# LRU в памяти воркера: user_id -> (поля, время записи)
+_local: OrderedDict[int, tuple[dict, float]] = OrderedDict()
+
+
+def _redis_key(user_id: int) -> str:
+    return f"user:{user_id}"
+
+
+def _remember_local(user_id: int, data: dict):
+    _local[user_id] = (data, time.monotonic())
+    _local.move_to_end(user_id)
+    while len(_local) > USER_CACHE_MAX_ENTRIES:
+        _local.popitem(last=False)
+
+
+def user_to_dict(user) -> dict:
+    return {field: getattr(user, field) for field in USER_FIELDS}
+
+
+async def get_cached_user(user_id: int) -> dict | None:
+    """
+    Поля пользователя из кэша: сначала LRU воркера, затем Redis.
+    None — пользователя нужно достать из БД.
+    """
+    entry = _local.get(user_id)
+    if entry is not None:
+        data, cached_at = entry
+        if time.monotonic() - cached_at <= USER_CACHE_LOCAL_TTL:
+            _local.move_to_end(user_id)
+            return data
+        del _local[user_id]
+
+    redis = app.redis_client.redis
+    if redis is None:
+        return None
+    try:
+        cached = await redis.get(_redis_key(user_id))
+    except Exception as e:
+        logger.error(f"[UserCache] get failed for user_id={user_id}: {e}")
+        return None
+    if not cached:
+        return None
+    data = json.loads(cached)
+    _remember_local(user_id, data)
+    return data
+
+
+async def cache_user(user) -> dict:
+    data = user_to_dict(user)
+    _remember_local(data["id"], data)
+    redis = app.redis_client.redis
+    if redis is not None:
+        try:
+            await redis.set(_redis_key(data["id"]), json.dumps(data), ex=USER_CACHE_TTL)
+        except Exception as e:
+            logger.error(f"[UserCache] set failed for user_id={data['id']}: {e}")
+    return data
+
+
+def evict_local_user(user_id: int):
+    _local.pop(user_id, None)
+
+
+async def invalidate_user(user_id: int):
+    """
+    Сбрасывает пользователя после смены пароля, удаления аккаунта или
+    изменения профиля: копию в Redis и, через шину инвалидации,
+    локальные копии во всех воркерах.
+    """
+    redis = app.redis_client.redis
+    if redis is not None:
+        await redis.delete(_redis_key(user_id))
+    await publish("user", user_id)
+
+
+on_invalidate("user", evict_local_user, reset=_local.clear)
@@ -3,10 +3,31 @@ from fastapi.middleware.cors import CORSMiddleware
 
 
 from app.core.config import settings
-from app.routers import auth, chat, note, translate, user, tools, smtp, voice, calendar
+from app.routers import (
+    auth,
+    chat,
+    note,
+    translate,
+    user,
+    tools,
+    smtp,
+    voice,
+    calendar,
+    usage,
+    metrics,
+)
 from app import redis_client
+from app.core import quota_ledger
+from app.token_limit import migrate_legacy_quota_keys
+from app.core.invalidation import run_subscriber
+from app.core.security import password_executor
+from app.core.database import replica_engines
+from app.core.db_routing import run_replica_monitor
+from app.services.usage_rollup import run_usage_rollup
+from app.services.email_queue import run_email_worker
 
 import redis.asyncio as aioredis
+import asyncio
 import logging
 from contextlib import asynccontextmanager
 
@@ -24,7 +45,40 @@ async def lifespan(app: FastAPI):
     print("Lifespan startup: initializing redis")
     redis_client.redis = await aioredis.from_url(REDIS_URL, decode_responses=True)
     print("Lifespan startup: redis initialized")
+    try:
+        await migrate_legacy_quota_keys(redis_client.redis)
+    except Exception as e:
+        logging.getLogger(__name__).error(f"[Quota] legacy key migration failed: {e}")
+    flusher = None
+    if settings.quota_write_behind:
+        flusher = asyncio.create_task(
+            quota_ledger.run_flusher(
+                settings.quota_flush_interval_ms / 1000,
+                settings.quota_local_max_age_ms / 1000,
+            )
+        )
+    invalidation = asyncio.create_task(run_subscriber())
+    replica_monitor = None
+    if replica_engines:
+        replica_monitor = asyncio.create_task(
+            run_replica_monitor(settings.replica_lag_check_interval)
+        )
+    rollup = None
+    if settings.usage_rollup_enabled:
+        rollup = asyncio.create_task(run_usage_rollup(settings.usage_rollup_interval))
+    email_worker = None
+    if settings.email_worker_enabled:
+        email_worker = asyncio.create_task(run_email_worker())
     yield
+    # Flusher останавливается последним: при отмене он досылает журнал квот
+    for task in (email_worker, invalidation, replica_monitor, rollup, flusher):
+        if task:
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+    password_executor.shutdown(wait=False)
     print("Lifespan shutdown: closing redis")
     await redis_client.redis.close()
     print("Lifespan shutdown: redis closed")
@@ -63,3 +117,5 @@ app.include_router(smtp.router)
 app.include_router(voice.router)
 app.include_router(calendar.router)
 app.include_router(auth.router)
+app.include_router(usage.router)
+app.include_router(metrics.router)
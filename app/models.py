@@ -1,4 +1,14 @@
-from sqlalchemy import String, Integer, Column, ForeignKey, DateTime, Text, Boolean
+from sqlalchemy import (
+    String,
+    Integer,
+    BigInteger,
+    Column,
+    ForeignKey,
+    DateTime,
+    Date,
+    Text,
+    Boolean,
+)
 from sqlalchemy.orm import relationship
 from datetime import datetime
 
@@ -81,3 +91,17 @@ class Event(Base):
     reminder = Column(Integer, index=True)
 
     user = relationship("User", back_populates="events")
+
+
+class UsageDaily(Base):
+    """Дневной расход квот пользователя, собранный из счётчиков Redis."""
+
+    __tablename__ = "usage_daily"
+
+    user_id = Column(Integer, primary_key=True)
+    day = Column(Date, primary_key=True, index=True)
+    tokens = Column(BigInteger, nullable=False, default=0)
+    translate_symbols = Column(BigInteger, nullable=False, default=0)
+    voice_symbols = Column(BigInteger, nullable=False, default=0)
+    summarize_symbols = Column(BigInteger, nullable=False, default=0)
+    updated_at = Column(DateTime, default=datetime.utcnow)
@@ -7,12 +7,29 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from app.schemas import RegisterRequest, LoginRequest, TokenResponse
 from app.models import User
 from app.core.database import get_db
-from app.core.security import hash_password, verify_password, create_access_token
+from app.core.security import (
+    hash_password,
+    verify_and_update_password,
+    create_access_token,
+)
 
 
 router = APIRouter()
 
 
+async def authenticate_user(db: AsyncSession, user: User | None, password: str):
+    """Проверка пароля; при смене bcrypt_rounds хеш тихо пересчитывается."""
+    if not user or not user.hashed_password:
+        return None
+    valid, new_hash = await verify_and_update_password(password, user.hashed_password)
+    if not valid:
+        return None
+    if new_hash:
+        user.hashed_password = new_hash
+        await db.commit()
+    return user
+
+
 @router.post("/auth/register", status_code=status.HTTP_201_CREATED)
 async def register(data: RegisterRequest, db: AsyncSession = Depends(get_db)):
     res = await db.execute(select(User).where(User.email == data.email))
@@ -20,7 +37,9 @@ async def register(data: RegisterRequest, db: AsyncSession = Depends(get_db)):
         raise HTTPException(status_code=409, detail="User already exists")
 
     user = User(
-        email=data.email, hashed_password=hash_password(data.password), name=data.name
+        email=data.email,
+        hashed_password=await hash_password(data.password),
+        name=data.name,
     )
     db.add(user)
     await db.commit()
@@ -34,8 +53,8 @@ async def login(
     data: OAuth2PasswordRequestForm = Depends(), db: AsyncSession = Depends(get_db)
 ) -> TokenResponse:
     res = await db.execute(select(User).where(User.email == data.username))
-    user = res.scalar_one_or_none()
-    if not user or not verify_password(data.password, user.hashed_password):
+    user = await authenticate_user(db, res.scalar_one_or_none(), data.password)
+    if not user:
         raise HTTPException(status_code=401, detail="Invalid credentials")
 
     return TokenResponse(access_token=create_access_token(str(user.id)))
@@ -46,8 +65,8 @@ async def login(
     data: LoginRequest, db: AsyncSession = Depends(get_db)
 ) -> TokenResponse:
     res = await db.execute(select(User).where(User.email == data.email))
-    user = res.scalar_one_or_none()
-    if not user or not verify_password(data.password, user.hashed_password):
+    user = await authenticate_user(db, res.scalar_one_or_none(), data.password)
+    if not user:
         raise HTTPException(status_code=401, detail="Invalid credentials")
 
     return TokenResponse(access_token=create_access_token(str(user.id)))
@@ -3,10 +3,14 @@ from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.models import User, Event
+from app.models import Event
 from app.schemas import EventCreate, EventRead, EventUpdate
 
-from app.core.dependencies.utils import get_current_user
+from app.core.dependencies.utils import (
+    Principal,
+    get_current_principal,
+    get_read_db,
+)
 from app.core.database import get_db
 
 
@@ -21,7 +25,7 @@ router = APIRouter()
 async def create_note(
     event: EventCreate,
     db: AsyncSession = Depends(get_db),
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_principal),
 ):
     new_calendar = Event(
         title=event.title,
@@ -39,8 +43,8 @@ async def create_note(
 
 @router.get("/calendar/get/all", response_model=list[EventRead], tags=["Calendar"])
 async def get_all_notes(
-    db: AsyncSession = Depends(get_db),
-    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_read_db),
+    current_user: Principal = Depends(get_current_principal),
 ):
     events = await db.execute(select(Event).where(Event.user_id == current_user.id))
     if events is None:
@@ -52,7 +56,7 @@ async def get_all_notes(
 async def get_event(
     event_id: int,
     db: AsyncSession = Depends(get_db),
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_principal),
 ):
     event = await db.get(Event, event_id)
     if event is None or event.user_id != current_user.id:
@@ -67,7 +71,7 @@ async def update_event(
     event_id: int,
     updated_event: EventUpdate,
     db: AsyncSession = Depends(get_db),
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_principal),
 ):
     event = await db.get(Event, event_id)
     if event is None or event.user_id != current_user.id:
@@ -95,7 +99,7 @@ async def update_event(
 async def delete_event(
     event_id: int,
     db: AsyncSession = Depends(get_db),
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_principal),
 ):
     event = await db.get(Event, event_id)
     if event is None or event.user_id != current_user.id:
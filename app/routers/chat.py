@@ -7,20 +7,28 @@ from app.core.database import AsyncSessionLocal
 from app.models import ChatSession, Message, User
 from app.schemas import ChatSessionMessageRead, ChatSessionRead
 
-from app.core.dependencies.utils import get_current_user, count_tokens
+from app.core.dependencies.utils import get_current_user, get_read_db
+from app.services.tokenizer_service import count_tokens_approx, count_tokens_async
 from app.core.database import get_db
 from app.core.config import settings
+from app.core.rate_limit import allow_ws_message
 from app.services.voice.ai import get_ai_answer, get_35_ai_answer
 
-from app.services.voice.web_search import needs_web_search, process_web_search_results
+from app.services.voice.web_search import answer_with_optional_search
 
-from app.token_limit import check_ai_limit_only, increment_ai_limit
+from app.token_limit import (
+    ANSWER_TOKENS_ESTIMATE,
+    release_usage,
+    reserve_usage,
+    settle_usage,
+)
 import app.redis_client
 
 from jose import JWTError, jwt
 from typing import List
 import logging
 
+
 logger = logging.getLogger(__name__)
 
 
@@ -29,7 +37,8 @@ router = APIRouter()
 
 @router.get("/chat/all", response_model=List[ChatSessionRead], tags=["Chat"])
 async def get_all_chats(
-    db: AsyncSession = Depends(get_db), current_user: User = Depends(get_current_user)
+    db: AsyncSession = Depends(get_read_db),
+    current_user: User = Depends(get_current_user),
 ):
     result = await db.execute(
         select(ChatSession).where(ChatSession.user_id == current_user.id)
@@ -61,7 +70,7 @@ async def delete_chat(
 )
 async def get_all_messages(
     chat_id: int,
-    db: AsyncSession = Depends(get_db),
+    db: AsyncSession = Depends(get_read_db),
     current_user: User = Depends(get_current_user),
 ):
     result = await db.execute(
@@ -138,18 +147,24 @@ async def websocket_chat(websocket: WebSocket):
             messages = messages_result.scalars().all()
             history = [{"role": msg.role, "content": msg.content} for msg in messages]
             await websocket.send_json({"history": history})
-        first_message = None
-        try:
-            while True:
-                data = await websocket.receive_text()
-                tokens_in = count_tokens(data)
-
-                logger.info(f"Получено сообщение: {data}")
-
+    # Сессия БД открывается только на время записи: между сообщениями
+    # соединение не держится (иначе оно простаивает в открытой транзакции)
+    first_message = None
+    try:
+        while True:
+            data = await websocket.receive_text()
+            if not await allow_ws_message(websocket, "chat", user_id):
+                continue
+
+            logger.info(f"Получено сообщение: {data}")
+
+            chat_name = None
+            if chat_session is None:
+                # Получаем название чата от ИИ
+                prompt = f"Придумай короткое название для чата по этому сообщению. Ответь ТОЛЬКО ОДНИМ СЛОВОМ: {data}"
+                chat_name = await get_ai_answer(prompt)
+            async with AsyncSessionLocal(info={"user_id": user.id}) as db:
                 if chat_session is None:
-                    # Получаем название чата от ИИ
-                    prompt = f"Придумай короткое название для чата по этому сообщению. Ответь ТОЛЬКО ОДНИМ СЛОВОМ: {data}"
-                    chat_name = await get_ai_answer(prompt)
                     chat_session = ChatSession(user_id=user.id, name=chat_name)
                     db.add(chat_session)
                     await db.commit()
@@ -161,29 +176,27 @@ async def websocket_chat(websocket: WebSocket):
                 )
                 db.add(user_msg)
                 await db.commit()
-                logger.info(f"Сохранено сообщение пользователя в чат {chat_session.id}")
+            logger.info(f"Сохранено сообщение пользователя в чат {chat_session.id}")
 
-                # Проверяем, нужен ли веб-поиск для ответа
-                needs_search, search_query = await needs_web_search(data)
+            # Решение о веб-поиске и обычный ответ считаются параллельно,
+            # лимит списывается только за тот путь, который победил.
+            # Оценка расхода резервируется заранее и закрывается по факту
+            redis = app.redis_client.redis
+            reservations = []
+            try:
+                reservations.append(
+                    await reserve_usage(
+                        redis,
+                        user_id,
+                        {"tokens": count_tokens_approx(data) + ANSWER_TOKENS_ESTIMATE},
+                    )
+                )
 
-                if needs_search and search_query:
+                async def on_search(search_query: str):
                     logger.info(f"Требуется веб-поиск для запроса: {search_query}")
-                    tokens_in += 500
-                    try:
-                        await check_ai_limit_only(
-                            app.redis_client.redis, user_id, tokens_in
-                        )
-                    except HTTPException as e:
-                        if e.status_code == 429:
-                            response = {"text": "Token limit exceeded"}
-                            await websocket.send_json(response)
-                            await websocket.close(
-                                code=4001, reason="Token limit exceeded"
-                            )
-                            logger.warning("WebSocket закрыт: превышен лимит токенов")
-                            return
-                        else:
-                            raise
+                    reservations.append(
+                        await reserve_usage(redis, user_id, {"tokens": 500})
+                    )
                     # Отправляем промежуточное сообщение о поиске
                     await websocket.send_json(
                         {
@@ -192,67 +205,53 @@ async def websocket_chat(websocket: WebSocket):
                         }
                     )
 
-                    # Выполняем поиск и обрабатываем результаты
-                    ai_answer = await process_web_search_results(search_query, data)
-
-                    # После успешной генерации — инкрементируем лимит входящих токенов
-                    await increment_ai_limit(app.redis_client.redis, user_id, tokens_in)
-
-                    tokens_out = count_tokens(ai_answer)
-
-                    # После успешной генерации — инкрементируем лимит исходящих токенов
-                    await increment_ai_limit(
-                        app.redis_client.redis, user_id, tokens_out
-                    )
-
-                    logger.info(f"Получен ответ на основе веб-поиска: {ai_answer}")
+                ai_answer, used_search, _ = await answer_with_optional_search(
+                    data, get_35_ai_answer, on_search
+                )
+            except HTTPException as e:
+                for reservation in reservations:
+                    await release_usage(redis, reservation)
+                if e.status_code == 429:
+                    response = {"text": "Token limit exceeded"}
+                    await websocket.send_json(response)
+                    await websocket.close(code=4001, reason="Token limit exceeded")
+                    logger.warning("WebSocket закрыт: превышен лимит токенов")
+                    return
                 else:
-                    # Получаем обычный ответ от ИИ
-                    try:
-                        await check_ai_limit_only(
-                            app.redis_client.redis, user_id, tokens_in
-                        )
-                    except HTTPException as e:
-                        if e.status_code == 429:
-                            response = {"text": "Token limit exceeded"}
-                            await websocket.send_json(response)
-                            await websocket.close(
-                                code=4001, reason="Token limit exceeded"
-                            )
-                            logger.warning("WebSocket закрыт: превышен лимит токенов")
-                            return
-                        else:
-                            raise
-                    ai_answer = await get_35_ai_answer(data)
-
-                    # После успешной генерации — инкрементируем лимит входящих токенов
-                    await increment_ai_limit(app.redis_client.redis, user_id, tokens_in)
-
-                    tokens_out = count_tokens(ai_answer)
-
-                    # После успешной генерации — инкрементируем лимит исходящих токенов
-                    await increment_ai_limit(
-                        app.redis_client.redis, user_id, tokens_out
-                    )
+                    raise
+
+            # После успешной генерации — закрываем резерв входящими и
+            # исходящими токенами, поиск стоит фиксированные 500
+            tokens_in = await count_tokens_async(data)
+            tokens_out = await count_tokens_async(ai_answer)
+            await settle_usage(
+                redis, reservations[0], {"tokens": tokens_in + tokens_out}
+            )
+            for reservation in reservations[1:]:
+                await settle_usage(redis, reservation, {"tokens": 500})
 
-                    logger.info(f"Получен обычный ответ от ИИ: {ai_answer}")
+            if used_search:
+                logger.info(f"Получен ответ на основе веб-поиска: {ai_answer}")
+            else:
+                logger.info(f"Получен обычный ответ от ИИ: {ai_answer}")
 
-                # Сохраняем ответ ИИ
+            # Сохраняем ответ ИИ
+            async with AsyncSessionLocal(info={"user_id": user.id}) as db:
                 ai_msg = Message(
                     session_id=chat_session.id, role="assistant", content=ai_answer
                 )
                 db.add(ai_msg)
                 await db.commit()
-                logger.info(f"Сохранён ответ ИИ в чат {chat_session.id}")
-                # Отправляем ответ пользователю
-                response = {"text": ai_answer}
-                await websocket.send_json(response)
-                logger.info("Ответ отправлен успешно")
-        except WebSocketDisconnect:
-            logger.info("Клиент отключился от чата")
-        except Exception as e:
-            logger.error(f"Ошибка WebSocket чата: {e}", exc_info=True)
-            try:
-                await websocket.close(code=1011, reason="Server error")
-            except:
-                logger.error("Не удалось закрыть WebSocket после ошибки.")
+            logger.info(f"Сохранён ответ ИИ в чат {chat_session.id}")
+            # Отправляем ответ пользователю
+            response = {"text": ai_answer}
+            await websocket.send_json(response)
+            logger.info("Ответ отправлен успешно")
+    except WebSocketDisconnect:
+        logger.info("Клиент отключился от чата")
+    except Exception as e:
+        logger.error(f"Ошибка WebSocket чата: {e}", exc_info=True)
+        try:
+            await websocket.close(code=1011, reason="Server error")
+        except:
+            logger.error("Не удалось закрыть WebSocket после ошибки.")
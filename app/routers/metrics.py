@@ -0,0 +1,16 @@
+from fastapi import APIRouter, Depends, HTTPException
+
+from app.models import User
+from app.core.dependencies.utils import get_current_user
+from app.core.database import pool_metrics
+from app.core.config import settings
+
+
+router = APIRouter()
+
+
+@router.get("/metrics/db-pool", tags=["Metrics"])
+async def get_db_pool_metrics(current_user: User = Depends(get_current_user)):
+    if current_user.email not in settings.admin_emails:
+        raise HTTPException(status_code=403, detail="Forbidden")
+    return pool_metrics()
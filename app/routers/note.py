@@ -3,10 +3,14 @@ from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.models import Notes, User
+from app.models import Notes
 from app.schemas import NoteCreate, NoteRead, NoteUpdate
 
-from app.core.dependencies.utils import get_current_user
+from app.core.dependencies.utils import (
+    Principal,
+    get_current_principal,
+    get_read_db,
+)
 from app.core.database import get_db
 
 
@@ -21,7 +25,7 @@ router = APIRouter()
 async def create_note(
     note: NoteCreate,
     db: AsyncSession = Depends(get_db),
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_principal),
 ):
     new_note = Notes(title=note.title, content=note.content, user_id=current_user.id)
     db.add(new_note)
@@ -32,8 +36,8 @@ async def create_note(
 
 @router.get("/notes/get/all", response_model=list[NoteRead], tags=["Note"])
 async def get_all_notes(
-    db: AsyncSession = Depends(get_db),
-    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_read_db),
+    current_user: Principal = Depends(get_current_principal),
 ):
     notes = await db.execute(select(Notes).where(Notes.user_id == current_user.id))
     if notes is None:
@@ -45,7 +49,7 @@ async def get_all_notes(
 async def get_note(
     note_id: int,
     db: AsyncSession = Depends(get_db),
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_principal),
 ):
     note = await db.get(Notes, note_id)
     if note is None or note.user_id != current_user.id:
@@ -58,7 +62,7 @@ async def update_note(
     note_id: int,
     updated_note: NoteUpdate,
     db: AsyncSession = Depends(get_db),
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_principal),
 ):
     note = await db.get(Notes, note_id)
     if note is None or note.user_id != current_user.id:
@@ -76,7 +80,7 @@ async def update_note(
 async def delete_note(
     note_id: int,
     db: AsyncSession = Depends(get_db),
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_principal),
 ):
     note = await db.get(Notes, note_id)
     if note is None or note.user_id != current_user.id:
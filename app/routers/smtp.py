@@ -34,10 +34,11 @@ async def pre_register(data: RegisterRequest, db: AsyncSession = Depends(get_db)
         )
 
     # создаём токен с именем, email и хешированным паролем
+    hashed_password = await hash_password(data.password)
     payload = {
         "name": data.name,
         "email": data.email,
-        "hashed_password": hash_password(data.password),
+        "hashed_password": hashed_password,
     }
     token = generate_email_token(payload)
 
@@ -46,7 +47,7 @@ async def pre_register(data: RegisterRequest, db: AsyncSession = Depends(get_db)
     pending = PendingUser(
         email=data.email,
         name=data.name,
-        hashed_password=hash_password(data.password),
+        hashed_password=hashed_password,
         created_at=datetime.utcnow(),
     )
 
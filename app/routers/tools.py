@@ -1,19 +1,40 @@
 from fastapi import APIRouter, Depends, Query
+from fastapi.responses import StreamingResponse
 
 from googletrans import Translator
 
 from app.models import User
 
 from app.core.dependencies.utils import get_current_user
-from app.core.dependencies.web import fetch_website
-
-from app.services.summarize_service import summarize_text_full
+from app.core.dependencies.web import get_page_text
+from app.core.rate_limit import rate_limit
+
+from app.services.readability_service import clean_client_page
+from app.services.summarize_service import (
+    summarize_charge,
+    summarize_text_full,
+    summarize_text_stream,
+)
+from app.services.summary_cache import (
+    get_cached_url_summary,
+    remember_url_content,
+    summary_style,
+)
 
 from app.schemas import SummaryRequest, TextRequest
 
+import asyncio
 import logging
-
-from app.token_limit import check_summarize_limit_only, increment_summarize_limit
+import json
+
+from app.token_limit import (
+    check_summarize_limit_only,
+    release_usage,
+    reserve_quota,
+    reserve_usage,
+    settle_usage,
+)
+from app.core.config import settings
 import app.redis_client
 
 
@@ -21,10 +42,14 @@ router = APIRouter()
 translator = Translator()
 logger = logging.getLogger(__name__)
 
+SUMMARIZE_MAX_INPUT_CHARS = settings.summarize_max_input_chars
+SUMMARIZE_CHUNK_TOKENS = settings.summarize_chunk_tokens
+
 
 @router.post(
     "/tool/summarize/new",
     tags=["Tools"],
+    dependencies=[Depends(rate_limit("summarize"))],
 )
 async def summarize_webpage_new(
     summary_request: SummaryRequest,
@@ -36,33 +61,167 @@ async def summarize_webpage_new(
 
     await check_summarize_limit_only(redis, user_id, 1001)
 
-    website_text = await fetch_website(summary_request.url)
-    truncated_website_text = website_text[:8000]
+    client_page = await asyncio.to_thread(
+        clean_client_page,
+        summary_request.text,
+        summary_request.html,
+        summary_request.html_gz,
+    )
+
+    # Страницу недавно уже суммаризировали — не скачиваем её заново
+    cached = None
+    if not client_page:
+        cached = await get_cached_url_summary(
+            summary_request.url, summary_style(SUMMARIZE_CHUNK_TOKENS)
+        )
+    if cached:
+        logger.info(f"Summary cache hit for {summary_request.url}")
+        await reserve_quota(
+            redis, user_id, {"summarize": summarize_charge(cached["length"])}
+        )
+        return cached["summary"]
+
+    website_text = await get_page_text(summary_request.url, client_page)
+    truncated_website_text = website_text[:SUMMARIZE_MAX_INPUT_CHARS]
     logger.info(f"TRUNCATED TEXT TO SUMMARIZE: {truncated_website_text}")
-    symbols_needed = len(truncated_website_text)
-    await check_summarize_limit_only(
-        redis, user_id, symbols_needed
+    symbols_needed = summarize_charge(len(truncated_website_text))
+    reservation = await reserve_usage(
+        redis, user_id, {"summarize": symbols_needed}
     )  # returns 429 if limit exceeded
-    summarized_text = await summarize_text_full(truncated_website_text, 2000)
-    await increment_summarize_limit(redis, user_id, symbols_needed)
+    try:
+        summarized_text = await summarize_text_full(truncated_website_text)
+    except Exception:
+        await release_usage(redis, reservation)
+        raise
+    # Присланный клиентом текст не привязываем к URL: его нельзя проверить
+    if not client_page:
+        await remember_url_content(summary_request.url, truncated_website_text)
+    await settle_usage(redis, reservation, {"summarize": symbols_needed})
     return summarized_text
 
 
-@router.post("/tools/summarize/selected", tags=["Tools"])
+@router.post(
+    "/tools/summarize/selected",
+    tags=["Tools"],
+    dependencies=[Depends(rate_limit("summarize"))],
+)
 async def summarize_text(
     summarize_request: TextRequest, current_user: User = Depends(get_current_user)
 ):
     text_to_summarize = summarize_request.text
 
-    truncated_text_to_summarize = text_to_summarize[:5000]
+    truncated_text_to_summarize = text_to_summarize[:SUMMARIZE_MAX_INPUT_CHARS]
 
     user_id = str(current_user.id)
-    symbols_needed = len(truncated_text_to_summarize)
+    symbols_needed = summarize_charge(len(truncated_text_to_summarize))
     redis = app.redis_client.redis
-    await check_summarize_limit_only(
-        redis, user_id, symbols_needed
+    reservation = await reserve_usage(
+        redis, user_id, {"summarize": symbols_needed}
     )  # returns 429 if limit exceeded
-    summarized_text = await summarize_text_full(truncated_text_to_summarize, 3000)
-    await increment_summarize_limit(redis, user_id, symbols_needed)
+    try:
+        summarized_text = await summarize_text_full(truncated_text_to_summarize)
+    except Exception:
+        await release_usage(redis, reservation)
+        raise
+    await settle_usage(redis, reservation, {"summarize": symbols_needed})
     logger.info(f"Sent summarized text to client: {text_to_summarize}")
     return {"summarized_text": summarized_text}
+
+
+async def _summary_ndjson(
+    redis, reservation: dict, text: str, symbols_needed: int, url: str | None = None
+):
+    # Резерв закрываем, когда финальное суммари готово; если клиент
+    # отключился или суммаризация упала — возвращаем его в квоту
+    settled = False
+    try:
+        async for event in summarize_text_stream(text):
+            if event["type"] == "done":
+                if url:
+                    await remember_url_content(url, text)
+                await settle_usage(redis, reservation, {"summarize": symbols_needed})
+                settled = True
+            yield json.dumps(event, ensure_ascii=False) + "\n"
+    except Exception as e:
+        logger.error(f"Streaming summary failed: {e}", exc_info=True)
+        yield json.dumps({"type": "error", "detail": "Summarization failed"}) + "\n"
+    finally:
+        if not settled:
+            await release_usage(redis, reservation)
+
+
+@router.post(
+    "/tool/summarize/new/stream",
+    tags=["Tools"],
+    dependencies=[Depends(rate_limit("summarize"))],
+)
+async def summarize_webpage_stream(
+    summary_request: SummaryRequest,
+    current_user: User = Depends(get_current_user),
+):
+    user_id = str(current_user.id)
+    redis = app.redis_client.redis
+    logger.info(f"Website came to summarize (stream): {summary_request.url}")
+
+    await check_summarize_limit_only(redis, user_id, 1001)
+
+    client_page = await asyncio.to_thread(
+        clean_client_page,
+        summary_request.text,
+        summary_request.html,
+        summary_request.html_gz,
+    )
+
+    cached = None
+    if not client_page:
+        cached = await get_cached_url_summary(
+            summary_request.url, summary_style(SUMMARIZE_CHUNK_TOKENS)
+        )
+    if cached:
+        await reserve_quota(
+            redis, user_id, {"summarize": summarize_charge(cached["length"])}
+        )
+        event = {"type": "done", "summary": cached["summary"], "cached": True}
+        return StreamingResponse(
+            iter([json.dumps(event, ensure_ascii=False) + "\n"]),
+            media_type="application/x-ndjson",
+        )
+
+    website_text = await get_page_text(summary_request.url, client_page)
+    truncated_website_text = website_text[:SUMMARIZE_MAX_INPUT_CHARS]
+    symbols_needed = summarize_charge(len(truncated_website_text))
+    reservation = await reserve_usage(redis, user_id, {"summarize": symbols_needed})
+
+    return StreamingResponse(
+        _summary_ndjson(
+            redis,
+            reservation,
+            truncated_website_text,
+            symbols_needed,
+            url=None if client_page else summary_request.url,
+        ),
+        media_type="application/x-ndjson",
+    )
+
+
+@router.post(
+    "/tools/summarize/selected/stream",
+    tags=["Tools"],
+    dependencies=[Depends(rate_limit("summarize"))],
+)
+async def summarize_text_stream_route(
+    summarize_request: TextRequest, current_user: User = Depends(get_current_user)
+):
+    truncated_text_to_summarize = summarize_request.text[:SUMMARIZE_MAX_INPUT_CHARS]
+
+    user_id = str(current_user.id)
+    symbols_needed = summarize_charge(len(truncated_text_to_summarize))
+    redis = app.redis_client.redis
+    reservation = await reserve_usage(redis, user_id, {"summarize": symbols_needed})
+
+    return StreamingResponse(
+        _summary_ndjson(
+            redis, reservation, truncated_text_to_summarize, symbols_needed
+        ),
+        media_type="application/x-ndjson",
+    )
@@ -7,6 +7,7 @@ from app.models import User
 
 from app.core.dependencies.utils import get_current_user
 from app.core.database import get_db
+from app.core.rate_limit import rate_limit
 
 from typing import List
 
@@ -18,6 +19,7 @@ from app.schemas import TranslateRequest
 import logging
 import app.redis_client
 
+
 logger = logging.getLogger(__name__)
 
 
@@ -25,7 +27,11 @@ router = APIRouter()
 translator = Translator()
 
 
-@router.post("/translate", tags=["Translate"])
+@router.post(
+    "/translate",
+    tags=["Translate"],
+    dependencies=[Depends(rate_limit("translate"))],
+)
 async def translate(
     text: str = Query(..., description="Text to translate"),
     src: str = Query("ru", description="Source language"),
@@ -36,7 +42,11 @@ async def translate(
     return {"translated_text": result.text}
 
 
-@router.post("/translate-page", tags=["Translate"])
+@router.post(
+    "/translate-page",
+    tags=["Translate"],
+    dependencies=[Depends(rate_limit("translate"))],
+)
 async def translate_page(
     texts: List[str] = Body(..., embed=True, description="List of texts to translate"),
     dest: str = Query("en", description="Destination language"),
@@ -55,7 +65,11 @@ async def translate_page(
     return {"translated_texts": translated}
 
 
-@router.post("/translate-new", tags=["Translate"])
+@router.post(
+    "/translate-new",
+    tags=["Translate"],
+    dependencies=[Depends(rate_limit("translate"))],
+)
 async def translate_new(
     data: TranslateRequest,
     current_user: User = Depends(get_current_user),
@@ -0,0 +1,57 @@
+from fastapi import APIRouter, Depends, HTTPException, Query
+
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models import User, UsageDaily
+from app.schemas import UsageDailyRead, UsageSummaryRead
+
+from app.core.dependencies.utils import get_current_user
+from app.core.database import get_db
+from app.core.config import settings
+
+from datetime import date, timedelta
+
+
+router = APIRouter()
+
+
+@router.get("/usage/me", response_model=list[UsageDailyRead], tags=["Usage"])
+async def get_my_usage(
+    days: int = Query(30, ge=1, le=366),
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+):
+    since = date.today() - timedelta(days=days - 1)
+    result = await db.execute(
+        select(UsageDaily)
+        .where((UsageDaily.user_id == current_user.id) & (UsageDaily.day >= since))
+        .order_by(UsageDaily.day)
+    )
+    return result.scalars().all()
+
+
+@router.get("/usage/summary", response_model=list[UsageSummaryRead], tags=["Usage"])
+async def get_usage_summary(
+    days: int = Query(30, ge=1, le=366),
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+):
+    if current_user.email not in settings.admin_emails:
+        raise HTTPException(status_code=403, detail="Forbidden")
+
+    since = date.today() - timedelta(days=days - 1)
+    result = await db.execute(
+        select(
+            UsageDaily.day,
+            func.count(UsageDaily.user_id).label("users"),
+            func.sum(UsageDaily.tokens).label("tokens"),
+            func.sum(UsageDaily.translate_symbols).label("translate_symbols"),
+            func.sum(UsageDaily.voice_symbols).label("voice_symbols"),
+            func.sum(UsageDaily.summarize_symbols).label("summarize_symbols"),
+        )
+        .where(UsageDaily.day >= since)
+        .group_by(UsageDaily.day)
+        .order_by(UsageDaily.day)
+    )
+    return [dict(row._mapping) for row in result.all()]
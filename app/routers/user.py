@@ -2,6 +2,7 @@ from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy import select
 
 from app.core.dependencies.utils import get_current_user
+from app.core.user_cache import invalidate_user
 from app.core.database import get_db
 from app.models import User
 from app.schemas import UserRead, ChangePasswordRequest, ForgotPasswordRequest
@@ -63,8 +64,9 @@ async def change_password(
     if not user:
         raise HTTPException(status_code=400, detail="No such a user")
 
-    user.hashed_password = hash_password(data.new_password)
+    user.hashed_password = await hash_password(data.new_password)
     await db.commit()
+    await invalidate_user(user.id)
     return "Password successfully changed"
 
 
@@ -94,6 +96,7 @@ async def user_delete(
         raise HTTPException(status_code=404, detail="It is not your account")
     await db.delete(user)
     await db.commit()
+    await invalidate_user(user_id)
     return "Deleted"
 
 
@@ -1,7 +1,7 @@
-from fastapi import APIRouter, Depends, WebSocket
+from fastapi import APIRouter, Depends, Query, WebSocket
 
 from sqlalchemy import select
-from app.core.database import get_db
+from app.core.database import AsyncSessionLocal
 
 from app.models import User
 from app.schemas import TextRequest, SummaryRequest
@@ -11,13 +11,19 @@ from edge_tts.exceptions import NoAudioReceived
 from app.core.dependencies.utils import get_current_user
 from app.core.dependencies.web import voice_website_summary
 from app.core.dependencies.voice import handle_voice_websocket
+from app.core.rate_limit import rate_limit
 
 from app.core.config import settings
-from app.services.voice.speech import synthesize_speech_async
+from app.services.readability_service import clean_client_page
+from app.services.voice.speech import (
+    negotiate_audio_format,
+    synthesize_long_speech_async,
+)
 import app.redis_client
 from app.token_limit import check_voice_limit_only, increment_voice_limit
 
 from jose import JWTError, jwt
+import asyncio
 import logging
 import tempfile
 import os
@@ -38,7 +44,7 @@ async def websocket_voice(websocket: WebSocket):
         await websocket.close()
         logger.error("WebSocket закрыт: не передан токен.")
         return
-    async with get_db() as db:
+    async with AsyncSessionLocal() as db:
         try:
             payload = jwt.decode(token, settings.secret_key, algorithms=["HS256"])
             user_id: str = payload.get("sub")
@@ -60,13 +66,29 @@ async def websocket_voice(websocket: WebSocket):
             logger.error(f"WebSocket закрыт: пользователь с id {user_id} не найден.")
             return
 
-    await handle_voice_websocket(websocket, str(user_id))
-
-
-@router.post("/tools/voice/selected", tags=["Tools"])
+    audio_format = negotiate_audio_format(
+        websocket.query_params.get("codec"),
+        (
+            int(websocket.query_params["bitrate"])
+            if websocket.query_params.get("bitrate", "").isdigit()
+            else None
+        ),
+    )
+    await handle_voice_websocket(websocket, str(user_id), audio_format)
+
+
+@router.post(
+    "/tools/voice/selected",
+    tags=["Tools"],
+    dependencies=[Depends(rate_limit("voice"))],
+)
 async def voice_text(
-    voice_request: TextRequest, current_user: User = Depends(get_current_user)
+    voice_request: TextRequest,
+    codec: str | None = Query(None, description="Audio codec: mp3 or opus"),
+    bitrate: int | None = Query(None, description="Audio bitrate in kbps"),
+    current_user: User = Depends(get_current_user),
 ):
+    audio_format = negotiate_audio_format(codec, bitrate)
     user_id = str(current_user.id)
     symbols_needed = len(voice_request.text)
     redis = app.redis_client.redis
@@ -74,10 +96,10 @@ async def voice_text(
     await check_voice_limit_only(redis, user_id, symbols_needed)
 
     text_to_voice = voice_request.text
-    with tempfile.NamedTemporaryFile(delete=False, suffix=".mp3") as f:
+    with tempfile.NamedTemporaryFile(delete=False, suffix=audio_format["suffix"]) as f:
         tts_path = f.name
     try:
-        await synthesize_speech_async(text_to_voice, voice, tts_path)
+        await synthesize_long_speech_async(text_to_voice, voice, tts_path, audio_format)
     except NoAudioReceived:
         text_to_voice = "Error occured, could not synthesize text"
         logger.error("[TTS] No audio received from edge_tts.")
@@ -99,11 +121,30 @@ async def voice_text(
 
     await increment_voice_limit(redis, user_id, symbols_needed)
 
-    return {"text": text_to_voice, "audio_base64": audio_b64}
+    return {
+        "text": text_to_voice,
+        "audio_base64": audio_b64,
+        "audio_format": audio_format["mime"],
+    }
 
 
-@router.post("/tools/voice/website_summary", tags=["Tools"])
+@router.post(
+    "/tools/voice/website_summary",
+    tags=["Tools"],
+    dependencies=[Depends(rate_limit("voice"))],
+)
 async def voice_website_summary_route(
-    data: SummaryRequest, current_user: User = Depends(get_current_user)
+    data: SummaryRequest,
+    codec: str | None = Query(None, description="Audio codec: mp3 or opus"),
+    bitrate: int | None = Query(None, description="Audio bitrate in kbps"),
+    current_user: User = Depends(get_current_user),
 ):
-    return await voice_website_summary(data.url, current_user.id)
+    client_page = await asyncio.to_thread(
+        clean_client_page, data.text, data.html, data.html_gz
+    )
+    return await voice_website_summary(
+        data.url,
+        current_user.id,
+        negotiate_audio_format(codec, bitrate),
+        client_page,
+    )
@@ -1,5 +1,5 @@
 from pydantic import BaseModel, EmailStr
-from datetime import datetime
+from datetime import date, datetime
 
 
 class EmailSchema(BaseModel):
@@ -82,6 +82,10 @@ class TokenResponse(BaseModel):
 
 class SummaryRequest(BaseModel):
     url: str
+    # Текст страницы, уже извлечённый расширением, или снимок DOM
+    text: str | None = None
+    html: str | None = None
+    html_gz: str | None = None  # gzip + base64
 
 
 class TextRequest(BaseModel):
@@ -121,3 +125,23 @@ class EventUpdate(BaseModel):
     start_date: datetime | None = None
     location: str | None = None
     reminder: int | None = None
+
+
+class UsageDailyRead(BaseModel):
+    day: date
+    tokens: int
+    translate_symbols: int
+    voice_symbols: int
+    summarize_symbols: int
+
+    class Config:
+        orm_mode = True
+
+
+class UsageSummaryRead(BaseModel):
+    day: date
+    users: int
+    tokens: int
+    translate_symbols: int
+    voice_symbols: int
+    summarize_symbols: int
@@ -0,0 +1,282 @@
+from app.core.config import settings
+import app.redis_client
+
+from email.message import EmailMessage
+from aiosmtplib import SMTP
+
+import asyncio
+import json
+import logging
+import time
+import uuid
+
+
+logger = logging.getLogger(__name__)
+
+EMAIL_QUEUE_KEY = "email_queue"
+EMAIL_RETRY_KEY = "email_queue:retry"
+EMAIL_DEAD_KEY = "email_queue:dead"
+# Воркеры с письмами в работе; у каждого свой список email_queue:processing:<id>
+EMAIL_WORKERS_KEY = "email_queue:workers"
+
+WORKER_ID = uuid.uuid4().hex
+# Воркер, который не отмечался дольше этого, считается упавшим:
+# его письма в работе возвращаются в очередь
+EMAIL_WORKER_TTL = 60
+
+# smtp — настоящий сервер; console — письма только пишутся в лог
+# (локальная разработка и тесты). Для локального SMTP-стенда (MailHog,
+# aiosmtpd) достаточно smtp_host/smtp_port и email_smtp_tls=False
+EMAIL_BACKEND = settings.email_backend
+EMAIL_SMTP_TLS = settings.email_smtp_tls
+EMAIL_POOL_SIZE = settings.email_pool_size
+EMAIL_BATCH_SIZE = settings.email_batch_size
+EMAIL_MAX_ATTEMPTS = settings.email_max_attempts
+EMAIL_RETRY_BASE_DELAY = settings.email_retry_base_delay
+
+
+async def enqueue_email(to: str, subject: str, body: str):
+    """Ставит письмо в очередь Redis; отправит его фоновый воркер."""
+    redis = app.redis_client.redis
+    if redis is None:
+        raise RuntimeError("Redis client is not initialized!")
+    job = {"to": to, "subject": subject, "body": body, "attempt": 0}
+    await redis.lpush(EMAIL_QUEUE_KEY, json.dumps(job, ensure_ascii=False))
+    logger.info(f"[Email] queued '{subject}' to {to}")
+
+
+def _build_message(job: dict) -> EmailMessage:
+    message = EmailMessage()
+    message["From"] = settings.smtp_user
+    message["To"] = job["to"]
+    message["Subject"] = job["subject"]
+    message.set_content(job["body"])
+    return message
+
+
+class SMTPPool:
+    """
+    Пул авторизованных SMTP-соединений: рукопожатие STARTTLS и логин
+    выполняются один раз на соединение, а не на каждое письмо.
+    Семафор ограничивает число соединений; слот освобождается и при
+    выброшенном соединении, поэтому ожидающие не зависают, если сервер
+    недоступен.
+    """
+
+    def __init__(self, size: int):
+        self._slots = asyncio.Semaphore(size)
+        self._idle: list[SMTP] = []
+
+    async def _connect(self) -> SMTP:
+        client = SMTP(
+            hostname=settings.smtp_host,
+            port=settings.smtp_port,
+            username=settings.smtp_user or None,
+            password=settings.smtp_pass or None,
+            start_tls=EMAIL_SMTP_TLS,
+        )
+        await client.connect()
+        return client
+
+    async def acquire(self) -> SMTP:
+        await self._slots.acquire()
+        try:
+            if self._idle:
+                client = self._idle.pop()
+                if not client.is_connected:
+                    await client.connect()
+                return client
+            return await self._connect()
+        except BaseException:
+            self._slots.release()
+            raise
+
+    def release(self, client: SMTP, broken: bool = False):
+        if broken:
+            client.close()
+        else:
+            self._idle.append(client)
+        self._slots.release()
+
+    async def close(self):
+        while self._idle:
+            client = self._idle.pop()
+            try:
+                await client.quit()
+            except Exception:
+                client.close()
+
+
+async def _send(pool: SMTPPool | None, job: dict):
+    if EMAIL_BACKEND == "console":
+        logger.info(
+            f"[Email] console backend: to={job['to']} subject='{job['subject']}'\n{job['body']}"
+        )
+        return
+    client = await pool.acquire()
+    try:
+        await client.send_message(_build_message(job))
+    except Exception:
+        pool.release(client, broken=True)
+        raise
+    pool.release(client)
+
+
+async def _retry_or_drop(redis, job: dict, error: Exception):
+    job["attempt"] += 1
+    if job["attempt"] >= EMAIL_MAX_ATTEMPTS:
+        logger.error(
+            f"[Email] giving up on '{job['subject']}' to {job['to']} after {job['attempt']} attempts: {error}"
+        )
+        await redis.lpush(EMAIL_DEAD_KEY, json.dumps(job, ensure_ascii=False))
+        return
+    delay = EMAIL_RETRY_BASE_DELAY * 2 ** (job["attempt"] - 1)
+    logger.warning(
+        f"[Email] send to {job['to']} failed (attempt {job['attempt']}), retry in {delay}s: {error}"
+    )
+    await redis.zadd(
+        EMAIL_RETRY_KEY, {json.dumps(job, ensure_ascii=False): time.time() + delay}
+    )
+
+
+async def _requeue_due(redis):
+    """Возвращает в очередь письма, у которых подошло время повтора."""
+    due = await redis.zrangebyscore(EMAIL_RETRY_KEY, 0, time.time(), start=0, num=100)
+    for raw in due:
+        # ZREM решает, какой воркер забирает письмо
+        if await redis.zrem(EMAIL_RETRY_KEY, raw):
+            await redis.lpush(EMAIL_QUEUE_KEY, raw)
+
+
+def _processing_key(worker_id: str) -> str:
+    return f"{EMAIL_QUEUE_KEY}:processing:{worker_id}"
+
+
+def _alive_key(worker_id: str) -> str:
+    return f"{EMAIL_QUEUE_KEY}:alive:{worker_id}"
+
+
+async def _heartbeat(redis):
+    await redis.set(_alive_key(WORKER_ID), 1, ex=EMAIL_WORKER_TTL)
+    await redis.sadd(EMAIL_WORKERS_KEY, WORKER_ID)
+
+
+async def _run_heartbeat():
+    while True:
+        await asyncio.sleep(EMAIL_WORKER_TTL / 3)
+        try:
+            await _heartbeat(app.redis_client.redis)
+        except Exception as e:
+            logger.error(f"[Email] heartbeat failed: {e}")
+
+
+async def _requeue_processing(redis, worker_id: str) -> int:
+    """Возвращает в очередь письма из списка в работе воркера worker_id."""
+    processing = _processing_key(worker_id)
+    moved = 0
+    # LMOVE по одному: параллельный воркер не заберёт письмо второй раз
+    while await redis.lmove(processing, EMAIL_QUEUE_KEY, "RIGHT", "RIGHT"):
+        moved += 1
+    return moved
+
+
+async def _recover_orphaned(redis):
+    """
+    Письма упавших воркеров (процесс убит посреди отправки) остаются в их
+    списках в работе; воркер без свежей отметки считается упавшим.
+    """
+    for worker_id in await redis.smembers(EMAIL_WORKERS_KEY):
+        if worker_id == WORKER_ID or await redis.exists(_alive_key(worker_id)):
+            continue
+        moved = await _requeue_processing(redis, worker_id)
+        await redis.srem(EMAIL_WORKERS_KEY, worker_id)
+        if moved:
+            logger.warning(f"[Email] requeued {moved} emails of worker {worker_id}")
+
+
+async def _next_batch(redis) -> list[tuple[str, dict]]:
+    """
+    Забирает пачку писем, перекладывая их в список в работе этого воркера
+    (BLMOVE/LMOVE): письмо не теряется, если воркер упадёт до отправки.
+    Возвращает пары (исходная строка, письмо).
+    """
+    processing = _processing_key(WORKER_ID)
+    raw = await redis.blmove(EMAIL_QUEUE_KEY, processing, 1, "RIGHT", "LEFT")
+    if raw is None:
+        return []
+    raws = [raw]
+    if EMAIL_BATCH_SIZE > 1:
+        async with redis.pipeline(transaction=False) as pipe:
+            for _ in range(EMAIL_BATCH_SIZE - 1):
+                pipe.lmove(EMAIL_QUEUE_KEY, processing, "RIGHT", "LEFT")
+            raws += [r for r in await pipe.execute() if r is not None]
+    return [(raw, json.loads(raw)) for raw in raws]
+
+
+async def _process(redis, pool: SMTPPool | None, raw: str, job: dict) -> bool:
+    """
+    Отправляет письмо; неудачное откладывает на повтор. Из списка в работе
+    письмо убирается только после отправки или постановки на повтор.
+    """
+    try:
+        await _send(pool, job)
+        sent = True
+    except Exception as e:
+        await _retry_or_drop(redis, job, e)
+        sent = False
+    await redis.lrem(_processing_key(WORKER_ID), 1, raw)
+    return sent
+
+
+async def run_email_worker():
+    """
+    Фоновая задача воркера: забирает письма пачками, отправляет их через
+    пул SMTP-соединений, неудачные повторяет с экспоненциальной задержкой.
+    """
+    pool = SMTPPool(EMAIL_POOL_SIZE) if EMAIL_BACKEND != "console" else None
+    redis = app.redis_client.redis
+    try:
+        await _heartbeat(redis)
+        await _recover_orphaned(redis)
+    except Exception as e:
+        logger.error(f"[Email] failed to recover in-flight emails: {e}")
+    heartbeat = asyncio.create_task(_run_heartbeat())
+    try:
+        while True:
+            redis = app.redis_client.redis
+            try:
+                await _requeue_due(redis)
+                batch = await _next_batch(redis)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"[Email] queue error: {e}")
+                await asyncio.sleep(1)
+                continue
+            if not batch:
+                continue
+
+            results = await asyncio.gather(
+                *[_process(redis, pool, raw, job) for raw, job in batch],
+                return_exceptions=True,
+            )
+            for result in results:
+                if isinstance(result, Exception):
+                    # Письмо осталось в списке в работе: вернётся в очередь при
+                    # остановке воркера или после его падения
+                    logger.error(f"[Email] queue error: {result}")
+            sent = sum(1 for r in results if r is True)
+            logger.info(f"[Email] sent {sent}/{len(batch)}")
+    finally:
+        heartbeat.cancel()
+        if pool:
+            await pool.close()
+        # Неотправленное при остановке возвращаем в очередь сразу, не дожидаясь
+        # истечения отметки
+        redis = app.redis_client.redis
+        try:
+            await _requeue_processing(redis, WORKER_ID)
+            await redis.srem(EMAIL_WORKERS_KEY, WORKER_ID)
+            await redis.delete(_alive_key(WORKER_ID))
+        except Exception as e:
+            logger.error(f"[Email] failed to requeue in-flight emails: {e}")
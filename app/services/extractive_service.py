@@ -0,0 +1,216 @@
+from app.core.config import settings
+from app.services.tokenizer_service import count_tokens_batch, count_tokens_exact
+
+import numpy as np
+import logging
+import re
+
+
+logger = logging.getLogger(__name__)
+
+EXTRACTIVE_MAX_SENTENCES = settings.extractive_max_sentences
+
+SENTENCE_SPLIT_RE = re.compile(r"(?<=[.!?…])\s+")
+WORD_RE = re.compile(r"\w{3,}", re.UNICODE)
+LINE_KEY_RE = re.compile(r"[^\w]+|\d+", re.UNICODE)
+
+# Типичный мусор скрейпа: баннеры cookies, навигация, подписки.
+# Шаблоны привязаны к началу/концу строки (после нормализации ключа),
+# чтобы не выбрасывать обычные заголовки вроде "How to sign in to ..."
+BOILERPLATE_PATTERNS = [
+    re.compile(p)
+    for p in (
+        r"^(accept|reject|allow|decline)( all)?( cookies?)?$",
+        r"^(принять|отклонить|разрешить)( все)?( cookies?| куки| файлы cookie)?$",
+        r"^(we|this (web)?site) uses? cookies\b",
+        r"^(мы используем|сайт использует|этот сайт использует) (файлы )?(cookies?|куки)\b",
+        r"^(cookie policy|cookie settings|настройки cookie)$",
+        r"^(subscribe|подписаться|подпишитесь)( to (our )?newsletter| на (нашу )?рассылку)?$",
+        r"(all rights reserved|все права защищены)$",
+        r"^(privacy policy|terms of (use|service)|политика конфиденциальности)$",
+        r"^(sign in|log in|sign up|войти|вход|регистрация)$",
+        r"^(skip to (main )?content|перейти к (основному )?содержанию)$",
+    )
+]
+
+TEXTRANK_DAMPING = 0.85
+TEXTRANK_ITERATIONS = 50
+MIN_SIMILARITY = 0.05
+# Рёбер графа на предложение: граф остаётся разреженным (O(n·k), а не n²)
+TEXTRANK_TOP_K = 20
+# Сколько пар (i, j) копить перед схлопыванием дубликатов
+PAIR_BUFFER_LIMIT = 2_000_000
+
+
+def remove_boilerplate_lines(text: str) -> str:
+    """
+    Убирает повторяющиеся строки (меню, повторные заголовки) и короткие
+    служебные строки. Строки сравниваются без регистра, цифр и пунктуации,
+    поэтому почти одинаковые тоже считаются дубликатами.
+    """
+    seen = set()
+    kept = []
+    for line in text.split("\n"):
+        stripped = line.strip()
+        if not stripped:
+            continue
+        key = " ".join(LINE_KEY_RE.sub(" ", stripped.lower()).split())
+        if not key or key in seen:
+            continue
+        seen.add(key)
+        if len(stripped) < 120 and any(p.search(key) for p in BOILERPLATE_PATTERNS):
+            continue
+        kept.append(stripped)
+    return "\n".join(kept)
+
+
+def _tfidf(sentences: list[str]) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """TF-IDF в разреженном виде: (строки, столбцы, веса), строки L2-нормированы."""
+    vocab = {}
+    rows, cols = [], []
+    for i, sentence in enumerate(sentences):
+        for word in WORD_RE.findall(sentence.lower()):
+            rows.append(i)
+            cols.append(vocab.setdefault(word, len(vocab)))
+    if not rows:
+        return np.array([], int), np.array([], int), np.array([], float)
+
+    rows = np.asarray(rows)
+    cols = np.asarray(cols)
+    # Схлопываем повторы слова в предложении в частоту
+    pairs, tf = np.unique(rows * len(vocab) + cols, return_counts=True)
+    rows, cols = np.divmod(pairs, len(vocab))
+
+    df = np.bincount(cols, minlength=len(vocab))
+    idf = np.log((1 + len(sentences)) / (1 + df)) + 1.0
+    weights = (1 + np.log(tf)) * idf[cols]
+
+    norms = np.sqrt(np.bincount(rows, weights=weights**2, minlength=len(sentences)))
+    weights = weights / np.maximum(norms[rows], 1e-12)
+    return rows, cols, weights
+
+
+def _compact_pairs(keys: list, values: list) -> tuple[np.ndarray, np.ndarray]:
+    keys = np.concatenate(keys)
+    values = np.concatenate(values)
+    unique, inverse = np.unique(keys, return_inverse=True)
+    return unique, np.bincount(inverse, weights=values).astype(np.float32)
+
+
+def _similarity(n: int, rows: np.ndarray, cols: np.ndarray, weights: np.ndarray):
+    """
+    Косинусная близость X·Xᵀ в разреженном виде (строки, столбцы, веса):
+    пары собираются по спискам вхождений слов, у каждого предложения
+    остаются TEXTRANK_TOP_K самых близких соседей.
+    """
+    order = np.argsort(cols, kind="stable")
+    rows, cols, weights = rows[order], cols[order], weights[order]
+    bounds = np.flatnonzero(np.diff(cols)) + 1
+
+    keys, values, buffered = [], [], 0
+    for postings, w in zip(np.split(rows, bounds), np.split(weights, bounds)):
+        # Слова, которые есть почти везде, ничего не говорят о близости
+        if len(postings) < 2 or len(postings) > n // 2 + 1:
+            continue
+        i, j = np.meshgrid(postings, postings, indexing="ij")
+        mask = i != j
+        keys.append((i[mask] * n + j[mask]).astype(np.int64))
+        values.append(np.outer(w, w)[mask])
+        buffered += len(keys[-1])
+        if buffered > PAIR_BUFFER_LIMIT:
+            compacted = _compact_pairs(keys, values)
+            keys, values, buffered = [compacted[0]], [compacted[1]], len(compacted[0])
+    if not keys:
+        return np.array([], int), np.array([], int), np.array([], np.float32)
+
+    pair_keys, similarity = _compact_pairs(keys, values)
+    keep = similarity >= MIN_SIMILARITY
+    src, dst = np.divmod(pair_keys[keep], n)
+    similarity = similarity[keep]
+
+    # top-k по строке: сортируем по (строка, -близость) и берём первые k в каждой
+    order = np.lexsort((-similarity, src))
+    src, dst, similarity = src[order], dst[order], similarity[order]
+    starts = np.searchsorted(src, src, side="left")
+    rank = np.arange(len(src)) - starts
+    top = rank < TEXTRANK_TOP_K
+    return src[top], dst[top], similarity[top]
+
+
+def _textrank(n: int, src: np.ndarray, dst: np.ndarray, similarity: np.ndarray):
+    scores = np.full(n, 1.0 / n)
+    if len(src) == 0:
+        return scores
+    out_weight = np.bincount(src, weights=similarity, minlength=n)
+    transition = similarity / out_weight[src]
+    for _ in range(TEXTRANK_ITERATIONS):
+        flow = np.bincount(dst, weights=transition * scores[src], minlength=n)
+        updated = (1 - TEXTRANK_DAMPING) / n + TEXTRANK_DAMPING * flow
+        if np.abs(updated - scores).sum() < 1e-6:
+            scores = updated
+            break
+        scores = updated
+    return scores
+
+
+def _score_sentences(sentences: list[str]) -> np.ndarray:
+    """Оценка значимости предложений блока: TextRank + сумма TF-IDF."""
+    n = len(sentences)
+    rows, cols, weights = _tfidf(sentences)
+    if n < 2 or len(rows) == 0:
+        return np.ones(n)
+    salience = np.bincount(rows, weights=weights, minlength=n)
+    centrality = _textrank(n, *_similarity(n, rows, cols, weights))
+    return 0.7 * _normalize(centrality) + 0.3 * _normalize(salience)
+
+
+def _normalize(values: np.ndarray) -> np.ndarray:
+    span = values.max() - values.min()
+    if span <= 0:
+        return np.ones_like(values)
+    return (values - values.min()) / span
+
+
+def extract_salient_text(text: str, token_budget: int) -> str:
+    """
+    Локальная экстрактивная выжимка перед LLM: чистит мусорные строки и, если
+    текст длиннее token_budget, оставляет самые значимые предложения
+    (TF-IDF + TextRank) в исходном порядке.
+    """
+    cleaned = remove_boilerplate_lines(text)
+    if count_tokens_exact(cleaned) <= token_budget:
+        return cleaned
+
+    sentences = [
+        s.strip()
+        for line in cleaned.split("\n")
+        for s in SENTENCE_SPLIT_RE.split(line)
+        if s.strip()
+    ]
+    n = len(sentences)
+    if n < 2:
+        return cleaned
+
+    # Очень длинные страницы ранжируются блоками по EXTRACTIVE_MAX_SENTENCES:
+    # оценки нормированы внутри блока, поэтому в выжимку попадает вся страница
+    scores = np.concatenate(
+        [
+            _score_sentences(sentences[start : start + EXTRACTIVE_MAX_SENTENCES])
+            for start in range(0, n, EXTRACTIVE_MAX_SENTENCES)
+        ]
+    )
+
+    sentence_tokens = count_tokens_batch(sentences)
+    selected = []
+    used_tokens = 0
+    for i in np.argsort(-scores, kind="stable"):
+        tokens = sentence_tokens[i]
+        if used_tokens + tokens > token_budget:
+            continue
+        selected.append(i)
+        used_tokens += tokens
+
+    logger.info(
+        f"[Extractive] kept {len(selected)}/{n} sentences, ~{used_tokens} tokens"
+    )
+    return " ".join(sentences[i] for i in sorted(selected))
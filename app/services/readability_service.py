@@ -0,0 +1,174 @@
+from fastapi import HTTPException
+from html.parser import HTMLParser
+
+from app.core.config import settings
+from app.services.extractive_service import remove_boilerplate_lines
+
+import base64
+import gzip
+import io
+import re
+
+
+PAGE_SNAPSHOT_MAX_BYTES = settings.page_snapshot_max_bytes
+
+SKIP_TAGS = {
+    "script",
+    "style",
+    "noscript",
+    "template",
+    "svg",
+    "canvas",
+    "iframe",
+    "nav",
+    "header",
+    "footer",
+    "aside",
+    "form",
+    "button",
+    "select",
+}
+BLOCK_TAGS = {
+    "p",
+    "div",
+    "section",
+    "article",
+    "main",
+    "li",
+    "ul",
+    "ol",
+    "h1",
+    "h2",
+    "h3",
+    "h4",
+    "h5",
+    "h6",
+    "blockquote",
+    "pre",
+    "td",
+    "tr",
+    "table",
+    "figcaption",
+    "dd",
+    "dt",
+}
+VOID_TAGS = {"br", "img", "hr", "input", "meta", "link", "source", "wbr"}
+CONTENT_TAGS = {"article", "main"}
+
+MIN_BLOCK_CHARS = 30
+MAX_LINK_DENSITY = 0.5
+
+
+class _ReadableParser(HTMLParser):
+    """
+    Собирает текст по блокам, пропуская служебные элементы, и для каждого
+    блока считает, какая доля текста — ссылки (меню и списки ссылок).
+    """
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.skip_depth = 0
+        self.link_depth = 0
+        self.content_depth = 0
+        self.blocks = []  # (text, link_chars, inside_article_or_main)
+        self._text = []
+        self._link_chars = 0
+
+    def _flush(self):
+        text = re.sub(r"\s+", " ", "".join(self._text)).strip()
+        if text:
+            self.blocks.append((text, self._link_chars, self.content_depth > 0))
+        self._text = []
+        self._link_chars = 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag in SKIP_TAGS:
+            self.skip_depth += 1
+            return
+        if self.skip_depth:
+            return
+        if tag == "br":
+            self._text.append(" ")
+        if tag in BLOCK_TAGS:
+            self._flush()
+        if tag in CONTENT_TAGS:
+            self.content_depth += 1
+        if tag == "a":
+            self.link_depth += 1
+
+    def handle_endtag(self, tag):
+        if tag in SKIP_TAGS:
+            self.skip_depth = max(0, self.skip_depth - 1)
+            return
+        if self.skip_depth or tag in VOID_TAGS:
+            return
+        if tag in BLOCK_TAGS:
+            self._flush()
+        if tag in CONTENT_TAGS:
+            self.content_depth = max(0, self.content_depth - 1)
+        if tag == "a":
+            self.link_depth = max(0, self.link_depth - 1)
+
+    def handle_data(self, data):
+        if self.skip_depth:
+            return
+        self._text.append(data)
+        if self.link_depth:
+            self._link_chars += len(data.strip())
+
+    def close(self):
+        super().close()
+        self._flush()
+
+
+def extract_readable_text(html: str) -> str:
+    """
+    Упрощённый readability: оставляет содержательные блоки страницы
+    (достаточно длинные и не состоящие в основном из ссылок). Если на странице
+    есть <article>/<main> с текстом, берётся только он.
+    """
+    parser = _ReadableParser()
+    parser.feed(html)
+    parser.close()
+
+    blocks = [
+        (text, in_content)
+        for text, link_chars, in_content in parser.blocks
+        if len(text) >= MIN_BLOCK_CHARS and link_chars / len(text) <= MAX_LINK_DENSITY
+    ]
+    content_blocks = [text for text, in_content in blocks if in_content]
+    if sum(len(text) for text in content_blocks) >= 500:
+        selected = content_blocks
+    else:
+        selected = [text for text, _ in blocks]
+    return remove_boilerplate_lines("\n".join(selected))
+
+
+def decode_dom_snapshot(html_gz: str) -> str:
+    """Распаковывает снимок DOM от расширения (gzip + base64)."""
+    try:
+        compressed = base64.b64decode(html_gz)
+        with gzip.GzipFile(fileobj=io.BytesIO(compressed)) as f:
+            raw = f.read(PAGE_SNAPSHOT_MAX_BYTES + 1)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid page snapshot")
+    if len(raw) > PAGE_SNAPSHOT_MAX_BYTES:
+        raise HTTPException(status_code=413, detail="Page snapshot is too large")
+    return raw.decode("utf-8", errors="ignore")
+
+
+def clean_client_page(
+    text: str | None = None, html: str | None = None, html_gz: str | None = None
+) -> str | None:
+    """
+    Текст страницы, присланный расширением: готовый текст чистится от
+    служебных строк, HTML (в том числе сжатый) прогоняется через extractor.
+    Возвращает None, если клиент ничего не прислал.
+    """
+    if text and text.strip():
+        return remove_boilerplate_lines(text)
+    if html_gz:
+        html = decode_dom_snapshot(html_gz)
+    if html and html.strip():
+        return extract_readable_text(html)
+    return None
@@ -1,38 +1,312 @@
-from app.services.voice.ai import get_ai_answer, get_35_ai_answer
+from fastapi import HTTPException
 
+from app.core.config import settings
+from app.services.tokenizer_service import (
+    count_tokens_async,
+    count_tokens_batch,
+    truncate_to_tokens,
+)
+from app.services.extractive_service import extract_salient_text
+from app.services.summary_cache import (
+    cache_chunk_summaries,
+    cache_summary,
+    get_cached_chunk_summaries,
+    get_cached_summary,
+    summary_style,
+)
+from app.services.voice.ai import (
+    get_ai_answer,
+    get_35_ai_answer,
+    is_ai_error,
+    stream_ai_answer,
+)
 
-async def summarize_text_full(text: str, chunk_size: int = 3000) -> str:
-    # 1. Делим текст на части
-    chunks = split_text_into_chunks(text, chunk_size)
+import asyncio
+import logging
+import re
+
+
+logger = logging.getLogger(__name__)
+
+SUMMARIZE_REQUEST_CONCURRENCY = settings.summarize_request_concurrency
+SUMMARIZE_CHUNK_TOKENS = settings.summarize_chunk_tokens
+SUMMARIZE_CHUNK_OVERLAP_TOKENS = settings.summarize_chunk_overlap_tokens
+SUMMARIZE_REDUCE_MAX_TOKENS = settings.summarize_reduce_max_tokens
+SUMMARIZE_MAX_DEPTH = settings.summarize_max_depth
+SUMMARIZE_MAX_CALLS = settings.summarize_max_calls
+SUMMARIZE_CHARGE_MAX_CHARS = settings.summarize_charge_max_chars
+EXTRACTIVE_ENABLED = settings.extractive_enabled
+
+SENTENCE_SPLIT_RE = re.compile(r"(?<=[.!?…])\s+|\n+")
+
+# Общий лимит одновременных запросов к LLM от всех суммаризаций воркера
+_global_semaphore = asyncio.Semaphore(settings.summarize_global_concurrency)
+
+
+def summarize_charge(text_length: int) -> int:
+    """Сколько символов квоты summarize списать за суммаризацию текста такой длины."""
+    return min(text_length, SUMMARIZE_CHARGE_MAX_CHARS)
+
+
+def _merge_to_budget(chunks: list[str], calls: int) -> list[str]:
+    """
+    Склеивает соседние части, чтобы их стало не больше calls: при нехватке
+    бюджета вызовов части становятся крупнее, но текст не теряется.
+    """
+    if len(chunks) <= calls:
+        return chunks
+    size, extra = divmod(len(chunks), calls)
+    merged, start = [], 0
+    for i in range(calls):
+        end = start + size + (1 if i < extra else 0)
+        merged.append("\n".join(chunks[start:end]))
+        start = end
+    return merged
+
+
+async def summarize_text_full(text: str, chunk_tokens: int | None = None) -> str:
+    """
+    Суммаризирует текст любой длины деревом map-reduce: части суммаризируются
+    параллельно, их суммари снова режутся на части, пока не влезут в один
+    финальный запрос. Глубина дерева и число LLM-вызовов ограничены настройками.
+    Готовые суммари кэшируются по хешу содержимого и общие для всех пользователей.
+    """
+    chunk_tokens = chunk_tokens or SUMMARIZE_CHUNK_TOKENS
+    style = summary_style(chunk_tokens)
+
+    cached = await get_cached_summary(text, style)
+    if cached is not None:
+        logger.info("[Summarize] cache hit for whole text")
+        return cached
+
+    summary = await _summarize_tree(text, chunk_tokens)
+    if summary and not is_ai_error(summary):
+        await cache_summary(text, style, summary)
+    return summary
+
+
+async def summarize_text_stream(text: str, chunk_tokens: int | None = None):
+    """
+    То же, что summarize_text_full, но отдаёт события по ходу работы:
+    {"type": "partial", ...} — суммари очередной части, как только она готова,
+    {"type": "delta", "text": ...} — кусочки финального суммари,
+    {"type": "done", "summary": ...} — итог.
+    """
+    chunk_tokens = chunk_tokens or SUMMARIZE_CHUNK_TOKENS
+    style = summary_style(chunk_tokens)
+
+    cached = await get_cached_summary(text, style)
+    if cached is not None:
+        logger.info("[Summarize] cache hit for whole text")
+        yield {"type": "done", "summary": cached, "cached": True}
+        return
+
+    events = asyncio.Queue()
+    tree = asyncio.create_task(_summarize_tree(text, chunk_tokens, events.put_nowait))
+    try:
+        while True:
+            next_event = asyncio.create_task(events.get())
+            done, _ = await asyncio.wait(
+                {next_event, tree}, return_when=asyncio.FIRST_COMPLETED
+            )
+            if next_event in done:
+                yield next_event.result()
+                continue
+            next_event.cancel()
+            break
+        while not events.empty():
+            yield events.get_nowait()
+        summary = tree.result()
+    finally:
+        if not tree.done():
+            tree.cancel()
+
+    if summary and not is_ai_error(summary):
+        await cache_summary(text, style, summary)
+    yield {"type": "done", "summary": summary, "cached": False}
 
-    # 2. Генерируем краткие суммари для каждой части
-    partial_summaries = []
-    for chunk in chunks:
-        summary = await summarize_single_chunk(chunk)
-        partial_summaries.append(summary)
+
+async def _summarize_tree(text: str, chunk_tokens: int, on_event=None) -> str:
+    # 0. Локально выкидываем мусор, а лишнее режем, только если текст не
+    # помещается в первый уровень дерева при бюджете вызовов
+    if EXTRACTIVE_ENABLED:
+        token_budget = (SUMMARIZE_MAX_CALLS - 1) * max(
+            chunk_tokens - SUMMARIZE_CHUNK_OVERLAP_TOKENS, 1
+        )
+        text = await asyncio.to_thread(extract_salient_text, text, token_budget)
+
+    # 1. Делим текст на части по предложениям
+    chunks = await asyncio.to_thread(
+        split_text_into_chunks, text, chunk_tokens, SUMMARIZE_CHUNK_OVERLAP_TOKENS
+    )
+    if not chunks:
+        return ""
+    if len(chunks) == 1:
+        return (await summarize_chunks(chunks) or [""])[0]
+
+    def on_partial(index: int, summary: str):
+        if on_event and depth == 0:
+            on_event(
+                {"type": "partial", "index": index, "total": total, "text": summary}
+            )
+
+    # 2. Уровни дерева: суммаризируем части, пока результат не влезет в reduce
+    calls_left = SUMMARIZE_MAX_CALLS - 1  # один вызов оставляем на финал
+    depth = 0
+    while True:
+        if len(chunks) > calls_left:
+            logger.warning(
+                f"[Summarize] call budget exceeded at depth {depth}: "
+                f"merging {len(chunks)} chunks into {calls_left}"
+            )
+            chunks = _merge_to_budget(chunks, calls_left)
+        calls_left -= len(chunks)
+        total = len(chunks)
+
+        partial_summaries = await summarize_chunks(chunks, on_partial=on_partial)
+        if not partial_summaries:
+            raise HTTPException(status_code=502, detail="Summarization failed")
+
+        merged = "\n\n".join(partial_summaries)
+        depth += 1
+        if (
+            len(partial_summaries) == 1
+            or await count_tokens_async(merged) <= SUMMARIZE_REDUCE_MAX_TOKENS
+            or depth >= SUMMARIZE_MAX_DEPTH
+            or calls_left <= 0
+        ):
+            break
+        chunks = await asyncio.to_thread(split_text_into_chunks, merged, chunk_tokens)
+        logger.info(f"[Summarize] depth {depth}: {len(chunks)} chunks to reduce")
 
     # 3. Финальный суммаризатор
-    merged = "\n\n".join(partial_summaries)
-    if len(partial_summaries) > 1:
-        final_summary = await summarize_final_chunk(merged)
-    else:
-        final_summary = await summarize_single_chunk(partial_summaries[0])
+    if await count_tokens_async(merged) > SUMMARIZE_REDUCE_MAX_TOKENS:
+        logger.warning(
+            "[Summarize] merged summaries exceed the final prompt, truncating"
+        )
+        merged = truncate_to_tokens(merged, SUMMARIZE_REDUCE_MAX_TOKENS)
+    if on_event is None:
+        return await summarize_final_chunk(merged)
+
+    deltas = []
+    async for delta in stream_ai_answer(build_final_prompt(merged)):
+        deltas.append(delta)
+        on_event({"type": "delta", "text": delta})
+    return "".join(deltas).strip()
+
+
+async def summarize_chunks(
+    chunks: list[str], max_concurrency: int | None = None, on_partial=None
+) -> list[str]:
+    """
+    Суммаризирует части параллельно (не больше max_concurrency на запрос и не
+    больше глобального лимита на воркер). Порядок результатов совпадает с
+    порядком частей; упавшие части пропускаются. Части, которые уже
+    суммаризировались раньше, берутся из кэша. on_partial(index, summary)
+    вызывается для каждой части сразу, как только её суммари готово.
+    """
+    cached = await get_cached_chunk_summaries(chunks)
+    if on_partial:
+        for i, summary in enumerate(cached):
+            if summary is not None:
+                on_partial(i, summary)
+    missing = [chunk for chunk, summary in zip(chunks, cached) if summary is None]
+    if len(missing) < len(chunks):
+        logger.info(
+            f"[Summarize] chunk cache: {len(chunks) - len(missing)}/{len(chunks)} hits"
+        )
+
+    request_semaphore = asyncio.Semaphore(
+        max_concurrency or SUMMARIZE_REQUEST_CONCURRENCY
+    )
+
+    async def run(index: int, chunk: str) -> str:
+        async with request_semaphore:
+            async with _global_semaphore:
+                summary = await summarize_single_chunk(chunk)
+        if on_partial and not is_ai_error(summary):
+            on_partial(index, summary)
+        return summary
 
-    return final_summary
+    results = await asyncio.gather(
+        *(run(i, chunk) for i, chunk in enumerate(chunks) if cached[i] is None),
+        return_exceptions=True,
+    )
 
+    fresh = {}
+    for chunk, result in zip(missing, results):
+        if isinstance(result, Exception) or is_ai_error(result):
+            logger.error(f"[Summarize] chunk failed: {result}")
+            continue
+        fresh[chunk] = result
+    await cache_chunk_summaries(fresh)
 
-def split_text_into_chunks(text: str, max_chars: int = 3000) -> list[str]:
-    paragraphs = text.split("\n")
+    partial_summaries = []
+    for chunk, summary in zip(chunks, cached):
+        if summary is None:
+            summary = fresh.get(chunk)
+        if summary is not None:
+            partial_summaries.append(summary)
+    return partial_summaries
+
+
+def _split_into_sentences(text: str, max_tokens: int) -> list[tuple[str, int]]:
+    sentences = []
+    parts = [s.strip() for s in SENTENCE_SPLIT_RE.split(text) if s and s.strip()]
+    for sentence, tokens in zip(parts, count_tokens_batch(parts)):
+        if tokens <= max_tokens:
+            sentences.append((sentence, tokens))
+            continue
+        # Предложение длиннее части (таблицы, код, текст без точек) — режем по словам
+        current = []
+        current_tokens = 0
+        words = sentence.split()
+        for word, word_tokens in zip(
+            words, count_tokens_batch([" " + w for w in words])
+        ):
+            if current and current_tokens + word_tokens > max_tokens:
+                sentences.append((" ".join(current), current_tokens))
+                current = []
+                current_tokens = 0
+            current.append(word)
+            current_tokens += word_tokens
+        if current:
+            sentences.append((" ".join(current), current_tokens))
+    return sentences
+
+
+def split_text_into_chunks(
+    text: str, max_tokens: int = 1500, overlap_tokens: int = 0
+) -> list[str]:
+    """
+    Делит текст на части не длиннее max_tokens токенов по границам предложений.
+    Каждая следующая часть начинается с последних предложений предыдущей
+    (не больше overlap_tokens токенов), чтобы не терять контекст на стыках.
+    """
+    sentences = _split_into_sentences(text, max_tokens)
     chunks = []
-    current = ""
-    for p in paragraphs:
-        if len(current) + len(p) + 1 <= max_chars:
-            current += "\n" + p
-        else:
-            chunks.append(current.strip())
-            current = p
+    current = []
+    current_tokens = 0
+    for sentence, tokens in sentences:
+        if current and current_tokens + tokens > max_tokens:
+            chunks.append(" ".join(s for s, _ in current))
+            # Перекрытие: переносим хвост предыдущей части
+            overlap = []
+            overlap_size = 0
+            for prev_sentence, prev_tokens in reversed(current):
+                if overlap_size + prev_tokens > overlap_tokens:
+                    break
+                overlap.insert(0, (prev_sentence, prev_tokens))
+                overlap_size += prev_tokens
+            if overlap_size + tokens > max_tokens:
+                overlap = []
+                overlap_size = 0
+            current = overlap
+            current_tokens = overlap_size
+        current.append((sentence, tokens))
+        current_tokens += tokens
     if current:
-        chunks.append(current.strip())
+        chunks.append(" ".join(s for s, _ in current))
     return chunks
 
 
@@ -48,8 +322,8 @@ async def summarize_single_chunk(chunk: str) -> str:
     return await get_35_ai_answer(prompt)
 
 
-async def summarize_final_chunk(chunk: str) -> str:
-    prompt = f"""
+def build_final_prompt(chunk: str) -> str:
+    return f"""
     You are a summarizer. IMPORTANT: Language: "As in the TEXT section"
     Summarize the following content in 12-14 sentences.
     No markdown, no lists, just readable text.
@@ -57,4 +331,7 @@ async def summarize_final_chunk(chunk: str) -> str:
     TEXT:
     {chunk}
     """
-    return await get_ai_answer(prompt)
+
+
+async def summarize_final_chunk(chunk: str) -> str:
+    return await get_ai_answer(build_final_prompt(chunk))
@@ -0,0 +1,125 @@
+from app.core.cache import cache_get, cache_get_many, cache_set, cache_set_many
+from app.core.config import settings
+import app.redis_client
+
+import hashlib
+import json
+import re
+import time
+import unicodedata
+
+
+SUMMARY_CACHE_TTL = settings.summary_cache_ttl
+SUMMARY_URL_CACHE_TTL = settings.summary_url_cache_ttl
+SUMMARY_CACHE_MAX_ENTRIES = settings.summary_cache_max_entries
+
+# Меняем версию при изменении промптов, чтобы не отдавать старые суммари
+SUMMARY_STYLE_VERSION = "v1"
+
+
+def normalize_content(text: str) -> str:
+    text = unicodedata.normalize("NFC", text)
+    return re.sub(r"\s+", " ", text).strip().lower()
+
+
+def content_hash(text: str) -> str:
+    return hashlib.sha256(normalize_content(text).encode("utf-8")).hexdigest()
+
+
+def _url_hash(url: str) -> str:
+    return hashlib.sha256(url.strip().encode("utf-8")).hexdigest()
+
+
+def summary_style(chunk_tokens: int) -> str:
+    return f"{SUMMARY_STYLE_VERSION}-{chunk_tokens}"
+
+
+async def get_cached_summary(text: str, style: str) -> str | None:
+    cached = await cache_get(
+        app.redis_client.redis, "summary", f"{content_hash(text)}:{style}"
+    )
+    if not cached:
+        return None
+    return json.loads(cached)["summary"]
+
+
+async def cache_summary(text: str, style: str, summary: str):
+    value = json.dumps(
+        {
+            "summary": summary,
+            "style": style,
+            "length": len(summary),
+            "created_at": int(time.time()),
+        },
+        ensure_ascii=False,
+    )
+    await cache_set(
+        app.redis_client.redis,
+        "summary",
+        f"{content_hash(text)}:{style}",
+        value,
+        SUMMARY_CACHE_TTL,
+        SUMMARY_CACHE_MAX_ENTRIES,
+    )
+
+
+async def get_cached_chunk_summaries(chunks: list[str]) -> list[str | None]:
+    """Частичные суммари по хешу каждой части: при правке страницы
+    пересчитываются только изменившиеся части."""
+    keys = [f"{SUMMARY_STYLE_VERSION}:{content_hash(chunk)}" for chunk in chunks]
+    return await cache_get_many(app.redis_client.redis, "summary_chunk", keys)
+
+
+async def cache_chunk_summaries(summaries: dict[str, str]):
+    items = {
+        f"{SUMMARY_STYLE_VERSION}:{content_hash(chunk)}": summary
+        for chunk, summary in summaries.items()
+    }
+    await cache_set_many(
+        app.redis_client.redis,
+        "summary_chunk",
+        items,
+        SUMMARY_CACHE_TTL,
+        SUMMARY_CACHE_MAX_ENTRIES,
+    )
+
+
+async def get_cached_url_summary(url: str, style: str) -> dict | None:
+    """
+    Возвращает {"summary", "length", "fetched_at"} если страницу по этому URL
+    недавно скачивали и для её содержимого уже есть суммари.
+    """
+    redis = app.redis_client.redis
+    cached = await cache_get(redis, "summary_url", _url_hash(url))
+    if not cached:
+        return None
+    entry = json.loads(cached)
+    if time.time() - entry["fetched_at"] > SUMMARY_URL_CACHE_TTL:
+        return None
+
+    summary = await cache_get(redis, "summary", f"{entry['content_hash']}:{style}")
+    if not summary:
+        return None
+    return {
+        "summary": json.loads(summary)["summary"],
+        "length": entry["length"],
+        "fetched_at": entry["fetched_at"],
+    }
+
+
+async def remember_url_content(url: str, text: str):
+    value = json.dumps(
+        {
+            "content_hash": content_hash(text),
+            "length": len(text),
+            "fetched_at": int(time.time()),
+        }
+    )
+    await cache_set(
+        app.redis_client.redis,
+        "summary_url",
+        _url_hash(url),
+        value,
+        SUMMARY_URL_CACHE_TTL,
+        SUMMARY_CACHE_MAX_ENTRIES,
+    )
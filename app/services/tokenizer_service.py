@@ -0,0 +1,62 @@
+from app.core.config import settings
+
+from functools import lru_cache
+
+import asyncio
+import math
+import tiktoken
+
+
+DEFAULT_MODEL = "gpt-3.5-turbo"
+TOKENIZER_THREAD_THRESHOLD = settings.tokenizer_thread_threshold_chars
+
+
+@lru_cache(maxsize=16)
+def get_encoding(model: str = DEFAULT_MODEL) -> tiktoken.Encoding:
+    """Кодировка загружается один раз на модель и дальше берётся из кэша."""
+    try:
+        return tiktoken.encoding_for_model(model)
+    except KeyError:
+        return tiktoken.get_encoding("cl100k_base")
+
+
+def count_tokens_approx(text: str) -> int:
+    """
+    Быстрая оценка без токенизации — для предварительного резерва квот:
+    латиница ~4 символа на токен, остальное (кириллица и др.) ~2 символа
+    на токен. Это не верхняя граница: на коде, числах и редких словах
+    точное значение бывает больше, поэтому фактический расход
+    досписывается при settle по count_tokens_exact.
+    """
+    ascii_chars = len(text.encode("ascii", errors="ignore"))
+    other_chars = len(text) - ascii_chars
+    return math.ceil(ascii_chars / 4 + other_chars / 2)
+
+
+def count_tokens_exact(text: str, model: str = DEFAULT_MODEL) -> int:
+    # encode_ordinary не падает на спецтокенах вроде <|endoftext|> в тексте
+    return len(get_encoding(model).encode_ordinary(text))
+
+
+def count_tokens_batch(texts: list[str], model: str = DEFAULT_MODEL) -> list[int]:
+    """
+    Точный подсчёт для списка строк. Обычный цикл: encode_ordinary_batch
+    на каждый вызов поднимает свой пул потоков, что дороже самого подсчёта.
+    """
+    enc = get_encoding(model)
+    return [len(enc.encode_ordinary(text)) for text in texts]
+
+
+async def count_tokens_async(text: str, model: str = DEFAULT_MODEL) -> int:
+    """Точный подсчёт; длинные тексты считаются в пуле потоков, не блокируя цикл."""
+    if len(text) > TOKENIZER_THREAD_THRESHOLD:
+        return await asyncio.to_thread(count_tokens_exact, text, model)
+    return count_tokens_exact(text, model)
+
+
+def truncate_to_tokens(text: str, max_tokens: int, model: str = DEFAULT_MODEL) -> str:
+    enc = get_encoding(model)
+    tokens = enc.encode_ordinary(text)
+    if len(tokens) <= max_tokens:
+        return text
+    return enc.decode(tokens[:max_tokens])
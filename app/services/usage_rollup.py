@@ -0,0 +1,129 @@
+from sqlalchemy.dialects.postgresql import insert
+
+from app.core.config import settings
+from app.core.database import AsyncSessionLocal
+from app.models import UsageDaily
+from app.token_limit import QUOTAS, quota_key_user_id
+import app.redis_client
+
+from datetime import date, datetime
+
+import asyncio
+import logging
+
+
+logger = logging.getLogger(__name__)
+
+USAGE_ROLLUP_BATCH_SIZE = settings.usage_rollup_batch_size
+
+# Вид квоты -> колонка usage_daily
+USAGE_COLUMNS = {
+    "tokens": "tokens",
+    "translate": "translate_symbols",
+    "voice": "voice_symbols",
+    "summarize": "summarize_symbols",
+}
+# Префикс ключа счётчика -> колонка
+PREFIX_COLUMNS = {
+    QUOTAS[kind]["prefix"]: column for kind, column in USAGE_COLUMNS.items()
+}
+
+
+async def _scan_counters(redis, pattern: str, batch_size: int):
+    """
+    Обходит ключи по шаблону через SCAN (без KEYS) и отдаёт пачки
+    (ключи, значения): значения каждой пачки берутся одним MGET.
+    """
+    cursor = 0
+    while True:
+        cursor, keys = await redis.scan(cursor, match=pattern, count=batch_size)
+        if keys:
+            yield keys, await redis.mget(keys)
+        if cursor == 0:
+            break
+
+
+async def _upsert(db, columns: tuple[str, ...], rows: list[dict]):
+    stmt = insert(UsageDaily).values(rows)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[UsageDaily.user_id, UsageDaily.day],
+        set_={
+            **{column: stmt.excluded[column] for column in columns},
+            "updated_at": stmt.excluded.updated_at,
+        },
+    )
+    await db.execute(stmt)
+
+
+def _batch_rows(keys: list, values: list, day: date, now: datetime) -> dict:
+    """
+    Строки usage_daily из пачки ключей: счётчики одного пользователя
+    сливаются в одну строку (дубли в одном INSERT ломают ON CONFLICT).
+    Строки группируются по набору колонок, которые в пачке есть: остальные
+    колонки у существующих строк не трогаем — их значения придут в других
+    пачках. Возвращает {колонки: строки}.
+    """
+    by_user: dict[int, dict] = {}
+    for key, value in zip(keys, values):
+        column = PREFIX_COLUMNS.get(key.split(":", 1)[0])
+        user_id = quota_key_user_id(key)
+        if column is None or not value or not user_id.isdigit():
+            continue
+        by_user.setdefault(int(user_id), {})[column] = max(0, int(value))
+
+    groups: dict[tuple[str, ...], list[dict]] = {}
+    for user_id, counters in by_user.items():
+        row = {c: 0 for c in USAGE_COLUMNS.values()}
+        row.update(counters, user_id=user_id, day=day, updated_at=now)
+        groups.setdefault(tuple(sorted(counters)), []).append(row)
+    return groups
+
+
+async def rollup_usage(day: date) -> int:
+    """
+    Переносит дневные счётчики квот из Redis в usage_daily: один SCAN по
+    ключам всех видов за день, MGET пачками и bulk INSERT ... ON CONFLICT
+    DO UPDATE. Повторный запуск за тот же день просто обновляет значения.
+    Возвращает число записанных строк.
+    """
+    redis = app.redis_client.redis
+    if redis is None:
+        raise RuntimeError("Redis client is not initialized!")
+
+    written = 0
+    now = datetime.utcnow()
+    # Под шаблон попадают только счётчики с hash tag: "<вид>:{id}:<день>"
+    pattern = f"*:{{*}}:{day.isoformat()}"
+    async with AsyncSessionLocal() as db:
+        async for keys, values in _scan_counters(
+            redis, pattern, USAGE_ROLLUP_BATCH_SIZE
+        ):
+            for columns, rows in _batch_rows(keys, values, day, now).items():
+                await _upsert(db, columns, rows)
+                written += len(rows)
+        await db.commit()
+
+    logger.info(f"[UsageRollup] {day.isoformat()}: upserted {written} rows")
+    return written
+
+
+async def run_usage_rollup(interval: int):
+    """
+    Фоновая задача: раз в interval секунд сохраняет текущий день, а после
+    полуночи ещё раз добирает итог вчерашнего. Между воркерами работает
+    один — остальные пропускают цикл по блокировке в Redis.
+    """
+    last_day = date.today()
+    while True:
+        await asyncio.sleep(interval)
+        redis = app.redis_client.redis
+        today = date.today()
+        days = [today] if today == last_day else [last_day, today]
+        try:
+            if await redis.set("usage_rollup_lock", "1", ex=interval, nx=True):
+                for day in days:
+                    await rollup_usage(day)
+        except Exception as e:
+            logger.error(f"[UsageRollup] failed: {e}", exc_info=True)
+            continue
+        last_day = today
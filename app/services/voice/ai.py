@@ -2,15 +2,32 @@ from app.core.config import settings
 
 import httpx
 import asyncio
+import json
 import logging
 
+
 logger = logging.getLogger(__name__)
 
 GEMINI_API_KEY = settings.gemini_api_key
 GEMINI_URL = f"https://generativelanguage.googleapis.com/v1beta/models/gemini-2.0-flash:generateContent?key={GEMINI_API_KEY}"
+GEMINI_STREAM_URL = f"https://generativelanguage.googleapis.com/v1beta/models/gemini-2.0-flash:streamGenerateContent?alt=sse&key={GEMINI_API_KEY}"
 AZURE_OPENAI_ENDPOINT = settings.azure_openai_endpoint
 AZURE_OPENAI_KEY = settings.azure_openai_key
 
+# Префиксы ответов, которые возвращаются вместо исключения при сбое провайдера
+AI_ERROR_PREFIXES = (
+    "Что-то пошло не так",
+    "Внешний сервис не ответил вовремя",
+    "Сервер GPT-3.5 не ответил вовремя",
+    "Ошибка подключения к сервису ИИ",
+    "Ошибка сервера ИИ",
+    "Ошибка обращения к ИИ",
+)
+
+
+def is_ai_error(answer: str) -> bool:
+    return answer.startswith(AI_ERROR_PREFIXES)
+
 
 async def get_ai_answer(question: str):
     payload = {"contents": [{"role": "user", "parts": [{"text": question}]}]}
@@ -70,6 +87,41 @@ async def get_ai_answer(question: str):
     return "Ошибка обращения к ИИ. Попробуйте позже."
 
 
+async def stream_ai_answer(question: str):
+    """
+    Отдаёт ответ Gemini по кусочкам по мере генерации (SSE).
+    Если стрим упал до первого куска — возвращает обычный ответ целиком.
+    """
+    payload = {"contents": [{"role": "user", "parts": [{"text": question}]}]}
+    headers = {"Content-Type": "application/json"}
+    started = False
+    try:
+        async with httpx.AsyncClient(timeout=30, http2=False) as client:
+            async with client.stream(
+                "POST", GEMINI_STREAM_URL, json=payload, headers=headers
+            ) as response:
+                response.raise_for_status()
+                async for line in response.aiter_lines():
+                    if not line.startswith("data:"):
+                        continue
+                    data = json.loads(line[len("data:") :])
+                    try:
+                        parts = data["candidates"][0]["content"]["parts"]
+                    except (KeyError, IndexError):
+                        continue
+                    text = "".join(part.get("text", "") for part in parts)
+                    text = text.replace("\n", "")
+                    if text:
+                        started = True
+                        yield text
+    except Exception as e:
+        if started:
+            logger.error(f"Gemini stream interrupted: {e}")
+            raise
+        logger.warning(f"Gemini stream failed, falling back to full answer: {e}")
+        yield await get_ai_answer(question)
+
+
 async def get_35_ai_answer(question: str):
     url = f"{AZURE_OPENAI_ENDPOINT}"
     headers = {
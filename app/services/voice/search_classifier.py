@@ -0,0 +1,302 @@
+import datetime
+import math
+import re
+
+
+# Основы слов, по которым запрос почти наверняка про меняющиеся данные
+VOLATILE_MARKERS = {
+    "погод": 2.5,
+    "weather": 2.5,
+    "прогноз": 2.0,
+    "forecast": 2.0,
+    "температур": 2.5,
+    "temperature": 2.5,
+    "дожд": 2.0,
+    "rain": 2.0,
+    "снег": 2.0,
+    "snow": 2.0,
+    "ауа райы": 2.5,
+    "новост": 2.5,
+    "news": 2.5,
+    "жаңалық": 2.5,
+    "курс": 2.0,
+    "exchange rate": 2.5,
+    "доллар": 1.0,
+    "евро": 1.0,
+    "рубл": 1.0,
+    "тенге": 1.0,
+    "bitcoin": 1.5,
+    "биткоин": 1.5,
+    "ethereum": 1.5,
+    "крипт": 1.5,
+    "crypto": 1.5,
+    "золот": 1.0,
+    "gold": 1.0,
+    "акци": 1.0,
+    "stock": 1.5,
+    "цена": 1.5,
+    "цены": 1.5,
+    "стоимост": 1.5,
+    "price": 2.0,
+    "сколько стоит": 3.0,
+    "билет": 1.0,
+    "ticket": 1.0,
+    "how much is": 1.5,
+    "how much does": 1.5,
+    "расписани": 2.0,
+    "schedule": 2.0,
+    "концерт": 1.5,
+    "concert": 1.5,
+    "матч": 2.0,
+    "score": 2.5,
+    "кто выиграл": 2.5,
+    "who won": 2.5,
+    "победил": 2.0,
+    "winner": 2.0,
+    "турнир": 1.0,
+    "чемпионат": 1.0,
+    "выборы": 1.5,
+    "election": 1.5,
+    # Должности: кто занимает их сейчас, меняется со временем
+    "президент": 2.0,
+    "president": 2.0,
+    "премьер-министр": 2.0,
+    "prime minister": 2.0,
+    "министр": 1.0,
+    "мэр": 2.0,
+    "mayor": 2.0,
+    "ceo": 2.0,
+    "тренер": 1.5,
+    "coach": 1.5,
+    "население": 1.5,
+    "population": 1.5,
+    "пробк": 2.0,
+    "traffic": 1.5,
+    "релиз": 1.0,
+    "release date": 2.0,
+    "выйдет": 2.0,
+    "когда выходит": 2.0,
+    "премьер": 1.0,
+    "в кино": 1.5,
+    "открыт ли": 2.0,
+    "is open": 1.5,
+    "opening hours": 2.0,
+    "часы работы": 2.0,
+    "работает ли": 1.5,
+    "working right now": 1.5,
+    "near me": 3.0,
+    "рядом со мной": 3.0,
+    "который час": 3.0,
+    "what time is it": 3.0,
+    "сколько времени в": 3.0,
+}
+# Слова времени: сами по себе слабые, но усиливают запрос
+TEMPORAL_MARKERS = {
+    "сегодня": 1.5,
+    "today": 1.5,
+    "бүгін": 1.5,
+    "сейчас": 1.5,
+    "now": 1.0,
+    "right now": 1.5,
+    "қазір": 1.5,
+    "завтра": 1.5,
+    "tomorrow": 1.5,
+    "ертең": 1.5,
+    "вчера": 1.0,
+    "yesterday": 1.0,
+    "на этой неделе": 1.5,
+    "this week": 1.5,
+    "выходн": 1.0,
+    "weekend": 1.0,
+    "последн": 1.0,
+    "latest": 1.5,
+    "recent": 1.0,
+    "актуальн": 1.5,
+    "current": 1.0,
+    "свеж": 1.0,
+    "в этом году": 1.0,
+    "this year": 1.0,
+}
+# Формулировки вопросов, на которые модель отвечает без поиска
+STABLE_MARKERS = {
+    "что такое": 2.0,
+    "what is a ": 1.5,
+    "what are": 1.0,
+    "кто такой": 1.5,
+    "кто такая": 1.5,
+    "who was": 1.5,
+    "объясни": 2.0,
+    "explain": 2.0,
+    "расскажи про": 1.0,
+    "почему": 1.0,
+    "why ": 1.0,
+    "как приготовить": 2.5,
+    "рецепт": 2.0,
+    "recipe": 2.0,
+    "how to ": 1.5,
+    "how do i": 1.5,
+    "how can i": 1.5,
+    "difference between": 1.5,
+    "разница между": 1.5,
+    "кто написал": 2.0,
+    "who wrote": 2.0,
+    "когда родился": 2.0,
+    "capital of": 2.0,
+    "столица": 2.0,
+    "summarize": 2.0,
+    "перескажи": 2.0,
+    "как сделать": 1.5,
+    "как написать": 2.0,
+    "напиши": 2.0,
+    "write ": 1.5,
+    "переведи": 2.5,
+    "translate": 2.5,
+    "посоветуй": 1.5,
+    "совет": 1.0,
+    "advice": 1.0,
+    "придумай": 2.0,
+    "определение": 1.5,
+    "definition": 1.5,
+    "формул": 1.5,
+    "formula": 1.5,
+    "теорем": 2.0,
+    "history of": 1.5,
+    "истори": 1.0,
+    "в каком году": 1.0,
+    "привет": 2.0,
+    "hello": 2.0,
+    "спасибо": 2.0,
+    "thank": 2.0,
+}
+QUESTION_WORDS = {
+    "какая",
+    "какой",
+    "какое",
+    "какие",
+    "каков",
+    "что",
+    "кто",
+    "где",
+    "когда",
+    "сколько",
+    "скажи",
+    "подскажи",
+    "найди",
+    "покажи",
+    "узнай",
+    "мне",
+    "пожалуйста",
+    "what",
+    "what's",
+    "whats",
+    "where",
+    "when",
+    "is",
+    "are",
+    "the",
+    "tell",
+    "me",
+    "find",
+    "show",
+    "please",
+    "қандай",
+    "қашан",
+    "қайда",
+}
+
+MATH_RE = re.compile(r"\d+\s*[-+*/^×÷]\s*\d+")
+YEAR_RE = re.compile(r"\b(19\d{2}|20\d{2})\b")
+DATE_RE = re.compile(
+    r"\b\d{1,2}[./]\d{1,2}(?:[./]\d{2,4})?\b"
+    r"|\b\d{1,2}\s+(?:январ|феврал|март|апрел|ма[яй]|июн|июл|август|сентябр|октябр|ноябр|декабр)"
+    r"|\b(?:january|february|march|april|may|june|july|august|september|october|november|december)\s+\d{1,2}\b",
+    re.IGNORECASE,
+)
+# Имя собственное не в начале предложения: город, компания, команда, артист
+ENTITY_RE = re.compile(r"(?<![.!?]\s)(?<!^)\b[A-ZА-ЯЁӘҒҚҢӨҰҮҺІ][\w-]{2,}")
+CYRILLIC_RE = re.compile(r"[Ѐ-ӿ]")
+
+# Большинство сообщений в чате поиска не требуют
+NO_SEARCH_PRIOR = 1.5
+ENTITY_WEIGHT = 0.5
+RECENT_YEAR_WEIGHT = 1.5
+OLD_YEAR_WEIGHT = 1.0
+DATE_WEIGHT = 1.0
+MATH_WEIGHT = 2.5
+DEFAULT_THRESHOLD = 0.8
+
+
+def _has_marker(text_lower: str, marker: str) -> bool:
+    # Маркеры — основы слов, поэтому проверяем только начало слова
+    return re.search(r"(?<!\w)" + re.escape(marker), text_lower) is not None
+
+
+def _marker_score(text_lower: str, markers: dict[str, float]) -> float:
+    return sum(
+        weight for marker, weight in markers.items() if _has_marker(text_lower, marker)
+    )
+
+
+def search_score(text: str) -> float:
+    """
+    Логит «нужен поиск»: сумма весов сигналов свежести (ключевые слова, даты,
+    имена собственные) минус сигналы стабильных знаний и априорный сдвиг.
+    """
+    text_lower = text.lower()
+    volatile = _marker_score(text_lower, VOLATILE_MARKERS)
+    temporal = _marker_score(text_lower, TEMPORAL_MARKERS)
+    stable = _marker_score(text_lower, STABLE_MARKERS)
+
+    # Одно слово времени без темы ("что ты делаешь сейчас?") — слабый сигнал
+    score = volatile + (temporal if volatile else temporal / 2) - stable
+    score -= NO_SEARCH_PRIOR
+
+    current_year = datetime.date.today().year
+    for year in YEAR_RE.findall(text):
+        if int(year) >= current_year - 1:
+            score += RECENT_YEAR_WEIGHT
+        else:
+            score -= OLD_YEAR_WEIGHT
+    if DATE_RE.search(text):
+        score += DATE_WEIGHT
+    if ENTITY_RE.search(text.strip()):
+        score += ENTITY_WEIGHT
+    if MATH_RE.search(text):
+        score -= MATH_WEIGHT
+    return score
+
+
+def build_search_query(text: str) -> str:
+    """
+    Поисковый запрос из вопроса: без вопросительных слов и пунктуации,
+    для запросов о меняющихся данных без указания времени добавляется «сегодня».
+    """
+    words = re.findall(r"[\w'-]+", text)
+    words = [w for w in words if w.lower() not in QUESTION_WORDS]
+    query = " ".join(words) or text.strip()
+
+    query_lower = query.lower()
+    has_time = (
+        _marker_score(query_lower, TEMPORAL_MARKERS)
+        or YEAR_RE.search(query)
+        or DATE_RE.search(query)
+    )
+    if _marker_score(query_lower, VOLATILE_MARKERS) and not has_time:
+        query += " сегодня" if CYRILLIC_RE.search(query) else " today"
+    return query
+
+
+def classify_search_need(
+    text: str, threshold: float = DEFAULT_THRESHOLD
+) -> tuple[bool | None, float, str]:
+    """
+    Локальное решение о веб-поиске.
+    Возвращает (решение, уверенность, поисковый_запрос); решение None,
+    если уверенность ниже threshold и нужно спросить LLM.
+    """
+    probability = 1 / (1 + math.exp(-search_score(text)))
+    if probability >= threshold:
+        return True, probability, build_search_query(text)
+    if 1 - probability >= threshold:
+        return False, 1 - probability, ""
+    return None, max(probability, 1 - probability), ""
@@ -1,16 +1,197 @@
 from app.core.config import settings
 from faster_whisper import WhisperModel
 
+import app.redis_client
+
 import aiohttp
+import asyncio
+import base64
+import hashlib
 import logging
+import re
 
 
 logger = logging.getLogger(__name__)
 
 ELEVEN_LABS_API_KEY = settings.eleven_labs_api_key
+TTS_CHUNK_MAX_CHARS = settings.tts_chunk_max_chars
+TTS_MAX_CONCURRENCY = settings.tts_max_concurrency
+TTS_DEFAULT_CODEC = settings.tts_default_codec
+TTS_CACHE_TTL = settings.tts_cache_ttl
+TTS_CACHE_MAX_CHARS = settings.tts_cache_max_chars
+FFMPEG_PATH = settings.ffmpeg_path
+
+# Форматы, которые можно запросить у сервера. ElevenLabs отдаёт только MP3,
+# поэтому Opus получаем перекодированием через ffmpeg.
+AUDIO_FORMATS = {
+    "mp3": {
+        "mime": "audio/mpeg",
+        "suffix": ".mp3",
+        "bitrates": [32, 64, 96, 128],
+        "default_bitrate": 128,
+    },
+    "opus": {
+        "mime": "audio/ogg; codecs=opus",
+        "suffix": ".ogg",
+        "bitrates": [16, 24, 32, 48, 64],
+        "default_bitrate": 32,
+    },
+}
+
+
+def negotiate_audio_format(
+    codec: str | None = None, bitrate: int | None = None
+) -> dict:
+    """
+    Выбирает формат аудио по пожеланиям клиента: неизвестный кодек заменяется
+    на MP3, битрейт округляется вниз до ближайшего поддерживаемого.
+    """
+    codec = (codec or TTS_DEFAULT_CODEC).strip().lower()
+    if codec not in AUDIO_FORMATS:
+        logger.warning(
+            f"[TTS] Unsupported codec requested: {codec}, falling back to mp3"
+        )
+        codec = "mp3"
+    spec = AUDIO_FORMATS[codec]
+
+    if bitrate is None:
+        chosen_bitrate = spec["default_bitrate"]
+    else:
+        allowed = [b for b in spec["bitrates"] if b <= bitrate]
+        chosen_bitrate = max(allowed) if allowed else min(spec["bitrates"])
+
+    return {
+        "codec": codec,
+        "bitrate": chosen_bitrate,
+        "mime": spec["mime"],
+        "suffix": spec["suffix"],
+        "key": f"{codec}_{chosen_bitrate}",
+    }
+
+
+def _provider_output_format(audio_format: dict) -> str:
+    if audio_format["codec"] == "mp3":
+        if audio_format["bitrate"] == 32:
+            return "mp3_22050_32"
+        return f"mp3_44100_{audio_format['bitrate']}"
+    # Исходник для перекодирования
+    return "mp3_44100_128"
+
+
+async def transcode_audio(audio: bytes, audio_format: dict) -> bytes:
+    """Перекодирует MP3 от провайдера в запрошенный формат через ffmpeg."""
+    if audio_format["codec"] == "mp3" or not audio:
+        return audio
+
+    process = await asyncio.create_subprocess_exec(
+        FFMPEG_PATH,
+        "-hide_banner",
+        "-loglevel",
+        "error",
+        "-f",
+        "mp3",
+        "-i",
+        "pipe:0",
+        "-c:a",
+        "libopus",
+        "-b:a",
+        f"{audio_format['bitrate']}k",
+        "-application",
+        "voip",
+        "-f",
+        "ogg",
+        "pipe:1",
+        stdin=asyncio.subprocess.PIPE,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE,
+    )
+    output, stderr = await process.communicate(audio)
+    if process.returncode != 0:
+        raise Exception(f"Transcoding failed: {stderr.decode(errors='ignore')}")
+    logger.info(
+        f"[TTS] transcoded {len(audio)} bytes of mp3 to {len(output)} bytes of {audio_format['key']}"
+    )
+    return output
+
+
+def speech_cache_key(text: str, voice_id: str, audio_format: dict) -> str:
+    text_hash = hashlib.sha256(text.encode("utf-8")).hexdigest()
+    return f"tts:{voice_id}:{audio_format['key']}:{text_hash}"
+
+
+async def _get_cached_speech(key: str) -> bytes | None:
+    redis = app.redis_client.redis
+    if redis is None:
+        return None
+    cached = await redis.get(key)
+    if not cached:
+        return None
+    return base64.b64decode(cached)
+
+
+async def _cache_speech(key: str, audio: bytes):
+    redis = app.redis_client.redis
+    if redis is None or not audio:
+        return
+    await redis.set(key, base64.b64encode(audio).decode(), ex=TTS_CACHE_TTL)
+
 
+SENTENCE_SPLIT_RE = re.compile(r"(?<=[.!?…;])\s+")
 
-async def synthesize_speech_async(text: str, voice_id: str, output_path: str):
+
+def _split_long_piece(piece: str, max_chars: int) -> list[str]:
+    # Режем слишком длинное предложение по пробелам, в крайнем случае — жёстко
+    parts = []
+    while len(piece) > max_chars:
+        cut = piece.rfind(" ", 0, max_chars)
+        if cut <= 0:
+            cut = max_chars
+        parts.append(piece[:cut].strip())
+        piece = piece[cut:].strip()
+    if piece:
+        parts.append(piece)
+    return parts
+
+
+def split_text_for_speech(text: str, max_chars: int = TTS_CHUNK_MAX_CHARS) -> list[str]:
+    """
+    Делит текст на куски не длиннее max_chars по границам абзацев и предложений,
+    чтобы каждый кусок можно было синтезировать отдельным запросом.
+    """
+    pieces = []
+    for paragraph in text.split("\n"):
+        paragraph = paragraph.strip()
+        if not paragraph:
+            continue
+        if len(paragraph) <= max_chars:
+            pieces.append(paragraph)
+            continue
+        for sentence in SENTENCE_SPLIT_RE.split(paragraph):
+            pieces.extend(_split_long_piece(sentence.strip(), max_chars))
+
+    chunks = []
+    current = ""
+    for piece in pieces:
+        if not current:
+            current = piece
+        elif len(current) + len(piece) + 1 <= max_chars:
+            current += " " + piece
+        else:
+            chunks.append(current)
+            current = piece
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+async def _synthesize_bytes(
+    session: aiohttp.ClientSession,
+    text: str,
+    voice_id: str,
+    output_format: str = "mp3_44100_128",
+    previous_text: str | None = None,
+    next_text: str | None = None,
+) -> bytes:
     url = f"https://api.elevenlabs.io/v1/text-to-speech/{voice_id}"
     headers = {
         "xi-api-key": ELEVEN_LABS_API_KEY,
@@ -22,13 +203,119 @@ async def synthesize_speech_async(text: str, voice_id: str, output_path: str):
         "model_id": "eleven_multilingual_v2",
         "voice_settings": {"stability": 0.5, "similarity_boost": 0.7},
     }
+    # Соседний текст помогает сохранить интонацию на стыках кусков
+    if previous_text:
+        payload["previous_text"] = previous_text
+    if next_text:
+        payload["next_text"] = next_text
+
+    async with session.post(
+        url, json=payload, headers=headers, params={"output_format": output_format}
+    ) as resp:
+        if resp.status != 200:
+            raise Exception(f"TTS failed: {resp.status} - {await resp.text()}")
+        return await resp.read()
+
+
+async def synthesize_speech_async(
+    text: str, voice_id: str, output_path: str, audio_format: dict | None = None
+):
+    audio_format = audio_format or negotiate_audio_format()
+    cacheable = len(text) <= TTS_CACHE_MAX_CHARS
+    cache_key = speech_cache_key(text, voice_id, audio_format)
+
+    audio = await _get_cached_speech(cache_key) if cacheable else None
+    if audio is None:
+        async with aiohttp.ClientSession() as session:
+            audio = await _synthesize_bytes(
+                session, text, voice_id, _provider_output_format(audio_format)
+            )
+        audio = await transcode_audio(audio, audio_format)
+        if cacheable:
+            await _cache_speech(cache_key, audio)
+    else:
+        logger.info(f"[TTS] cache hit for {audio_format['key']}")
+
+    with open(output_path, "wb") as f:
+        f.write(audio)
+
+
+async def iter_speech_chunks(
+    text: str,
+    voice_id: str,
+    max_concurrency: int | None = None,
+    output_format: str = "mp3_44100_128",
+):
+    """
+    Синтезирует длинный текст параллельно по кускам (не более max_concurrency
+    запросов одновременно) и отдаёт MP3 кусков строго по порядку,
+    как только очередной кусок готов.
+    """
+    chunks = split_text_for_speech(text)
+    if not chunks:
+        return
+    semaphore = asyncio.Semaphore(max_concurrency or TTS_MAX_CONCURRENCY)
 
     async with aiohttp.ClientSession() as session:
-        async with session.post(url, json=payload, headers=headers) as resp:
-            if resp.status != 200:
-                raise Exception(f"TTS failed: {resp.status} - {await resp.text()}")
-            with open(output_path, "wb") as f:
-                f.write(await resp.read())
+
+        async def synthesize_chunk(i: int) -> bytes:
+            async with semaphore:
+                return await _synthesize_bytes(
+                    session,
+                    chunks[i],
+                    voice_id,
+                    output_format,
+                    previous_text=chunks[i - 1] if i > 0 else None,
+                    next_text=chunks[i + 1] if i + 1 < len(chunks) else None,
+                )
+
+        tasks = [asyncio.create_task(synthesize_chunk(i)) for i in range(len(chunks))]
+        try:
+            for i, task in enumerate(tasks):
+                audio = await task
+                logger.info(
+                    f"[TTS] chunk {i + 1}/{len(chunks)} ready ({len(audio)} bytes)"
+                )
+                yield audio
+        finally:
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+
+async def synthesize_long_speech_async(
+    text: str,
+    voice_id: str,
+    output_path: str,
+    audio_format: dict | None = None,
+    max_concurrency: int | None = None,
+):
+    audio_format = audio_format or negotiate_audio_format()
+    if len(text) <= TTS_CHUNK_MAX_CHARS:
+        await synthesize_speech_async(text, voice_id, output_path, audio_format)
+        return
+
+    output_format = _provider_output_format(audio_format)
+    if audio_format["codec"] == "mp3":
+        # MP3 состоит из независимых фреймов, поэтому куски можно просто склеить
+        with open(output_path, "wb") as f:
+            async for audio in iter_speech_chunks(
+                text, voice_id, max_concurrency, output_format
+            ):
+                f.write(audio)
+        return
+
+    # Для остальных кодеков склеиваем MP3 и перекодируем один раз целиком
+    parts = [
+        audio
+        async for audio in iter_speech_chunks(
+            text, voice_id, max_concurrency, output_format
+        )
+    ]
+    audio = await transcode_audio(b"".join(parts), audio_format)
+    with open(output_path, "wb") as f:
+        f.write(audio)
 
 
 _model = None
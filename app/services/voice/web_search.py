@@ -1,19 +1,38 @@
 from app.services.voice.ai import get_ai_answer, get_35_ai_answer
 from app.core.dependencies.web import handle_web_search
+from app.services.voice.search_classifier import classify_search_need
+from app.core.config import settings
 
+import asyncio
 import re
 import logging
 import langdetect
 import json
 
+
 logger = logging.getLogger(__name__)
 
+SPECULATIVE_WEB_SEARCH = settings.speculative_web_search
+SEARCH_CLASSIFIER_THRESHOLD = settings.search_classifier_threshold
+
 
 async def needs_web_search(text: str) -> tuple[bool, str]:
     """
     Определяет, нужен ли веб-поиск для ответа на вопрос пользователя.
+    Сначала решает локальный классификатор, LLM спрашиваем только
+    в неочевидных случаях.
     Возвращает (нужен_ли_поиск, поисковый_запрос)
     """
+    decision, confidence, search_query = classify_search_need(
+        text, SEARCH_CLASSIFIER_THRESHOLD
+    )
+    if decision is not None:
+        logger.info(
+            f"[SearchClassifier] decision={decision} confidence={confidence:.2f} "
+            f"query='{search_query}'"
+        )
+        return decision, search_query
+
     prompt = f"""
     Проанализируй вопрос пользователя и определи, нужен ли веб-поиск для получения актуальной информации.
     
@@ -60,29 +79,9 @@ async def needs_web_search(text: str) -> tuple[bool, str]:
             result = json.loads(json_match.group())
             return result.get("needs_search", False), result.get("search_query", "")
         else:
-            # Если JSON не найден, попробуем определить по ключевым словам
-            search_keywords = [
-                "погода",
-                "weather",
-                "новости",
-                "news",
-                "курс",
-                "курс валют",
-                "цена",
-                "price",
-                "стоимость",
-                "расписание",
-                "schedule",
-                "сегодня",
-                "today",
-                "сейчас",
-                "now",
-                "актуальн",
-                "current",
-            ]
-            text_lower = text.lower()
-            needs_search = any(keyword in text_lower for keyword in search_keywords)
-            return needs_search, text if needs_search else ""
+            # Если JSON не найден, решаем по локальной оценке без порога
+            _, _, search_query = classify_search_need(text, threshold=0.5)
+            return bool(search_query), search_query
     except Exception as e:
         logger.error(f"Ошибка при определении необходимости поиска: {e}")
         return False, ""
@@ -161,3 +160,36 @@ async def process_web_search_results(search_query: str, original_question: str)
     except Exception as e:
         logger.error(f"Error processing web search results: {e}")
         return "Sorry, an error occurred while retrieving information. Please try again later."
+
+
+async def answer_with_optional_search(
+    text: str, answer_plain, on_search=None
+) -> tuple[str, bool, str]:
+    """
+    Отвечает на вопрос, при необходимости через веб-поиск.
+    В спекулятивном режиме обычный ответ (answer_plain) генерируется параллельно
+    с решением needs_web_search; если поиск нужен, обычный ответ отменяется.
+    on_search(search_query) вызывается перед поиском (проверка лимита,
+    сообщение клиенту) и может бросить исключение, чтобы прервать поиск.
+    Возвращает (ответ, использован_ли_поиск, поисковый_запрос).
+    """
+    plain_task = None
+    if SPECULATIVE_WEB_SEARCH:
+        plain_task = asyncio.create_task(answer_plain(text))
+
+    try:
+        needs_search, search_query = await needs_web_search(text)
+        if needs_search and search_query:
+            if plain_task:
+                plain_task.cancel()
+            if on_search:
+                await on_search(search_query)
+            answer = await process_web_search_results(search_query, text)
+            return answer, True, search_query
+
+        if plain_task:
+            return await plain_task, False, ""
+        return await answer_plain(text), False, ""
+    finally:
+        if plain_task and not plain_task.done():
+            plain_task.cancel()
@@ -1,173 +1,552 @@
 from fastapi import HTTPException
-from datetime import date
+from datetime import date, datetime, time, timedelta
 
 from app.core.config import settings
+from app.core import quota_ledger
 
 import logging
+import time as pytime
+import uuid
+
 
 AI_TOKEN_LIMIT = settings.ai_token_limit
 TRANSLATE_SYMBOLS_LIMIT = settings.translate_symbols_limit
 VOICE_SYMBOLS_LIMIT = settings.voice_symbols_limit
 SUMMARIZE_SYMBOLS_LIMIT = settings.summarize_symbols_limit
+QUOTA_RESERVATION_TTL = settings.quota_reservation_ttl
+ANSWER_TOKENS_ESTIMATE = settings.answer_tokens_estimate
+INTENT_TOKENS_ESTIMATE = settings.intent_tokens_estimate
+QUOTA_WRITE_BEHIND = settings.quota_write_behind
+QUOTA_KEY_GRACE = settings.quota_key_grace_seconds
+QUOTA_LOCAL_MAX_AGE = settings.quota_local_max_age_ms / 1000
 
 logger = logging.getLogger(__name__)
 
+# Виды квот: префикс ключа счётчика, дневной лимит и текст ошибки 429
+QUOTAS = {
+    "tokens": {
+        "prefix": "tokens",
+        "limit": AI_TOKEN_LIMIT,
+        "detail": "Token limit exceeded",
+    },
+    "translate": {
+        "prefix": "translate_symbols",
+        "limit": TRANSLATE_SYMBOLS_LIMIT,
+        "detail": "Symbols limit exceeded",
+    },
+    "voice": {
+        "prefix": "voice_symbols",
+        "limit": VOICE_SYMBOLS_LIMIT,
+        "detail": "Symbols limit exceeded",
+    },
+    "summarize": {
+        "prefix": "summarize_symbols",
+        "limit": SUMMARIZE_SYMBOLS_LIMIT,
+        "detail": "Symbols limit exceeded",
+    },
+}
+
+# Все ключи квот пользователя содержат hash tag {user_id}: счётчики,
+# список резервов и сами резервы лежат в одном слоте Redis Cluster, и
+# каждый скрипт получает все свои ключи через KEYS.
+#
+# KEYS[1] — список резервов пользователя, KEYS[2] — ключ нового резерва,
+# KEYS[3..] — счётчики.
+# ARGV: expireat, 1 (резервировать) / 0 (только проверка), now,
+# id резерва ("" — списать без резерва), дедлайн резерва,
+# затем пары (amount, limit) для каждого счётчика.
+# Возвращает {1, 0, total...} или {0, номер превышенного счётчика, total...}.
+# Если у пользователя есть просроченные резервы, скрипт ничего не делает и
+# возвращает {-1, 0, id...}: их снимает RELEASE_EXPIRED_SCRIPT, после чего
+# проверка повторяется.
+CHECK_AND_RESERVE_SCRIPT = """
+local reservations = KEYS[1]
+local expired = redis.call("ZRANGEBYSCORE", reservations, "-inf", ARGV[3], "LIMIT", 0, 100)
+if #expired > 0 then
+    return {-1, 0, unpack(expired)}
+end
+
+local totals = {}
+local exceeded = 0
+for i = 3, #KEYS do
+    local current = tonumber(redis.call("GET", KEYS[i]) or "0")
+    totals[i - 2] = current
+    if exceeded == 0 and current + tonumber(ARGV[i * 2]) > tonumber(ARGV[i * 2 + 1]) then
+        exceeded = i - 2
+    end
+end
+if exceeded > 0 then
+    return {0, exceeded, unpack(totals)}
+end
+if ARGV[2] == "1" then
+    for i = 3, #KEYS do
+        totals[i - 2] = redis.call("INCRBY", KEYS[i], ARGV[i * 2])
+        redis.call("EXPIREAT", KEYS[i], ARGV[1])
+        if ARGV[4] ~= "" then
+            redis.call("HSET", KEYS[2], KEYS[i], ARGV[i * 2])
+        end
+    end
+    if ARGV[4] ~= "" then
+        redis.call("EXPIREAT", KEYS[2], tonumber(ARGV[5]) + 86400)
+        redis.call("ZADD", reservations, ARGV[5], ARGV[4])
+        redis.call("EXPIRE", reservations, 172800)
+    end
+end
+return {1, 0, unpack(totals)}
+"""
+
+# Возвращает в квоту резервы, которые не закрыли вовремя (воркер упал).
+# KEYS[1] — список резервов; затем для каждого резерва: его ключ и ключи
+# счётчиков из него. ARGV: now, затем пары (id резерва, число счётчиков).
+# Резерв, который уже закрыли или продлили, пропускается.
+RELEASE_EXPIRED_SCRIPT = """
+local k = 2
+for i = 2, #ARGV, 2 do
+    local hold = KEYS[k]
+    local count = tonumber(ARGV[i + 1])
+    local deadline = redis.call("ZSCORE", KEYS[1], ARGV[i])
+    if deadline and tonumber(deadline) <= tonumber(ARGV[1]) then
+        for j = k + 1, k + count do
+            local amount = redis.call("HGET", hold, KEYS[j])
+            if amount and redis.call("EXISTS", KEYS[j]) == 1 then
+                if redis.call("DECRBY", KEYS[j], amount) < 0 then
+                    redis.call("SET", KEYS[j], 0, "KEEPTTL")
+                end
+            end
+        end
+        redis.call("DEL", hold)
+        redis.call("ZREM", KEYS[1], ARGV[i])
+    end
+    k = k + count + 1
+end
+return 1
+"""
+
+# KEYS — счётчики; ARGV: expireat, затем поправка для каждого ключа
+# (отрицательная возвращает неиспользованный резерв). Возвращает новые значения.
+SETTLE_SCRIPT = """
+local totals = {}
+for i, key in ipairs(KEYS) do
+    local total = redis.call("INCRBY", key, ARGV[i + 1])
+    if total < 0 then
+        redis.call("SET", key, 0)
+        total = 0
+    end
+    redis.call("EXPIREAT", key, ARGV[1])
+    totals[i] = total
+end
+return totals
+"""
+
+# KEYS[1] — список резервов пользователя, KEYS[2] — сам резерв, KEYS[3..] —
+# счётчики резерва. ARGV: expireat, id резерва, затем фактический расход по
+# каждому счётчику. Если резерв уже снят по таймауту, списывается весь расход.
+SETTLE_RESERVATION_SCRIPT = """
+local active = redis.call("EXISTS", KEYS[2]) == 1
+local totals = {}
+for i = 3, #KEYS do
+    local delta = tonumber(ARGV[i])
+    if active then
+        delta = delta - tonumber(redis.call("HGET", KEYS[2], KEYS[i]) or "0")
+    end
+    local total = redis.call("INCRBY", KEYS[i], delta)
+    if total < 0 then
+        redis.call("SET", KEYS[i], 0)
+        total = 0
+    end
+    redis.call("EXPIREAT", KEYS[i], ARGV[1])
+    totals[i - 2] = total
+end
+redis.call("DEL", KEYS[2])
+redis.call("ZREM", KEYS[1], ARGV[2])
+return totals
+"""
+
+_scripts = {}
+
+
+def quota_key(kind: str, user_id, day: date | None = None) -> str:
+    day = day or date.today()
+    return f"{QUOTAS[kind]['prefix']}:{{{user_id}}}:{day.isoformat()}"
+
+
+def _legacy_quota_key(kind: str, user_id, day: date) -> str:
+    return f"{QUOTAS[kind]['prefix']}:{user_id}:{day.isoformat()}"
+
+
+def quota_key_user_id(key: str) -> str:
+    """user_id из ключа счётчика: "tokens:{42}:2025-01-01" -> "42"."""
+    return key.split(":")[1].strip("{}")
+
+
+def _reservations_key(user_id) -> str:
+    return f"quota_reservations:{{{user_id}}}"
+
+
+def _reservation_id(user_id) -> str:
+    # id входит в имя ключа резерва, поэтому тоже несёт hash tag пользователя
+    return f"{{{user_id}}}:{uuid.uuid4().hex}"
+
+
+def _hold_key(reservation_id: str) -> str:
+    return f"quota_reservation:{reservation_id}"
+
+
+async def _release_expired(redis, user_id, reservation_ids: list, now: int):
+    """Снимает просроченные резервы: ключи счётчиков берутся из самих резервов."""
+    async with redis.pipeline(transaction=False) as pipe:
+        for reservation_id in reservation_ids:
+            pipe.hkeys(_hold_key(reservation_id))
+        counters = await pipe.execute()
+    keys, args = [_reservations_key(user_id)], [now]
+    for reservation_id, hold_counters in zip(reservation_ids, counters):
+        keys += [_hold_key(reservation_id)] + list(hold_counters)
+        args += [reservation_id, len(hold_counters)]
+    await _run_script(redis, "release_expired", RELEASE_EXPIRED_SCRIPT, keys, args)
+    logger.warning(
+        f"[Quota] released {len(reservation_ids)} expired reservations for user_id={user_id}"
+    )
 
-async def check_ai_limit_only(redis, user_id, tokens_needed: int):
-    if redis is None:
-        raise RuntimeError("Redis client is not initialized!")
-    today = date.today().isoformat()
-    key = f"tokens:{user_id}:{today}"
 
-    current = await redis.get(key)
-    current = int(current) if current else 0
+def _day_end(day: date) -> int:
+    """
+    Время истечения счётчика: конец его дня плюс небольшой запас, чтобы
+    сбор статистики (usage_rollup) успел прочитать итог за прошедший день.
+    На лимиты запас не влияет — ключ счётчика привязан к дате.
+    """
+    midnight = datetime.combine(day + timedelta(days=1), time.min)
+    return int(midnight.timestamp()) + QUOTA_KEY_GRACE
 
-    logger.info(
-        f"[TokenLimit] user_id={user_id} | today={today} | current={current} | needed={tokens_needed} | limit={AI_TOKEN_LIMIT}"
-    )
 
-    if current + tokens_needed > int(AI_TOKEN_LIMIT):
+async def _run_script(redis, name: str, source: str, keys: list, args: list):
+    if redis is None:
+        raise RuntimeError("Redis client is not initialized!")
+    script = _scripts.get(name)
+    if script is None:
+        script = _scripts[name] = redis.register_script(source)
+    # EVALSHA, при NOSCRIPT redis-py сам загрузит скрипт заново
+    return await script(keys=keys, args=args, client=redis)
+
+
+async def _check_and_reserve(
+    redis,
+    user_id,
+    amounts: dict[str, int],
+    reserve: bool,
+    reservation_id: str = "",
+    reservation_ttl: int | None = None,
+) -> dict:
+    kinds = list(amounts)
+    today = date.today()
+    keys = [quota_key(kind, user_id, today) for kind in kinds]
+
+    # Write-behind: по свежему локальному снимку проверка без резерва
+    # обходится без Redis, а резерв, которому снимок уже не оставляет места,
+    # отклоняется сразу. Разрешённый резерв всё равно идёт в Redis: не
+    # превысить лимит параллельными сессиями гарантирует только скрипт
+    if QUOTA_WRITE_BEHIND:
+        totals = {}
+        for kind, key in zip(kinds, keys):
+            total = quota_ledger.cached_total(key, QUOTA_LOCAL_MAX_AGE)
+            if total is None:
+                break
+            totals[kind] = total
+        else:
+            exceeded = next(
+                (
+                    i + 1
+                    for i, kind in enumerate(kinds)
+                    if totals[kind] + amounts[kind] > int(QUOTAS[kind]["limit"])
+                ),
+                0,
+            )
+            if exceeded or not reserve:
+                return _quota_status(user_id, amounts, totals, exceeded)
+
+    now = int(pytime.time())
+    args = [
+        _day_end(today),
+        1 if reserve else 0,
+        now,
+        reservation_id,
+        now + (reservation_ttl or QUOTA_RESERVATION_TTL),
+    ]
+    for kind, key in zip(kinds, keys):
+        # Локальный, ещё не сброшенный в Redis расход уменьшает доступный лимит
+        limit = int(QUOTAS[kind]["limit"]) - quota_ledger.pending(key)
+        args += [int(amounts[kind]), limit]
+
+    # Без резерва KEYS[2] не используется, но должен быть в слоте пользователя
+    hold = _hold_key(reservation_id or f"{{{user_id}}}")
+    script_keys = [_reservations_key(user_id), hold]
+    while True:
+        result = await _run_script(
+            redis,
+            "check_and_reserve",
+            CHECK_AND_RESERVE_SCRIPT,
+            script_keys + keys,
+            args,
+        )
+        if int(result[0]) != -1:
+            break
+        await _release_expired(redis, user_id, result[2:], now)
+    totals = {}
+    for kind, key, total in zip(kinds, keys, result[2:]):
+        if QUOTA_WRITE_BEHIND:
+            quota_ledger.remember(key, int(total))
+        totals[kind] = int(total) + quota_ledger.pending(key)
+
+    status = _quota_status(user_id, amounts, totals, result[1])
+    if status["allowed"] and reserve and reservation_id:
+        status["reservation"] = {
+            "id": reservation_id,
+            "user_id": user_id,
+            "keys": dict(zip(kinds, keys)),
+            "amounts": dict(amounts),
+        }
+        logger.info(
+            f"[Quota] reserved {amounts} for user_id={user_id} ({reservation_id})"
+        )
+    return status
+
+
+def _quota_status(
+    user_id, amounts: dict[str, int], totals: dict[str, int], exceeded: int
+) -> dict:
+    kinds = list(amounts)
+    allowed = not exceeded
+    status = {
+        "allowed": allowed,
+        "exceeded": kinds[exceeded - 1] if exceeded else None,
+        "totals": totals,
+        "remaining": {
+            kind: max(0, int(QUOTAS[kind]["limit"]) - totals[kind]) for kind in kinds
+        },
+        "reservation": None,
+    }
+    if not allowed:
+        kind = status["exceeded"]
         logger.warning(
-            f"[TokenLimit] LIMIT EXCEEDED: user_id={user_id} | attempted={current + tokens_needed} | limit={AI_TOKEN_LIMIT}"
+            f"[Quota] LIMIT EXCEEDED: user_id={user_id} | kind={kind} | current={totals[kind]} | needed={amounts[kind]} | limit={QUOTAS[kind]['limit']}"
         )
-        raise HTTPException(status_code=429, detail="Token limit exceeded")
+    return status
+
+
+def quota_exceeded_error(status: dict) -> HTTPException:
+    return HTTPException(status_code=429, detail=QUOTAS[status["exceeded"]]["detail"])
+
+
+async def check_quotas(
+    redis,
+    user_id,
+    amounts: dict[str, int],
+    reserve: bool = False,
+    ttl: int | None = None,
+) -> dict:
+    """
+    Единая проверка любого набора квот (tokens, translate, voice, summarize)
+    одним атомарным вызовом Redis; при reserve=True суммы сразу резервируются.
+    Не бросает исключений, а возвращает:
+    {
+        "allowed": bool,
+        "exceeded": первая превышенная квота или None,
+        "totals": {вид: значение счётчика},
+        "remaining": {вид: сколько осталось до лимита},
+        "reservation": резерв для settle_usage/release_usage или None,
+    }
+    Сумма 0 позволяет просто узнать остаток.
+    """
+    reservation_id = _reservation_id(user_id) if reserve else ""
+    return await _check_and_reserve(
+        redis, user_id, amounts, reserve, reservation_id, ttl
+    )
 
 
-async def increment_ai_limit(redis, user_id: str, tokens_needed: int):
-    if redis is None:
-        raise RuntimeError("Redis client is not initialized!")
-    today = date.today().isoformat()
-    key = f"tokens:{user_id}:{today}"
+async def check_quota(
+    redis, user_id, amounts: dict[str, int], reserve: bool = False
+) -> dict[str, int]:
+    """
+    Атомарно проверяет несколько квот за один вызов Redis и при reserve=True
+    сразу списывает amounts. Бросает 429 по первой превышенной квоте.
+    Возвращает текущие значения счётчиков по видам квот.
+    """
+    status = await _check_and_reserve(redis, user_id, amounts, reserve)
+    if not status["allowed"]:
+        raise quota_exceeded_error(status)
+    return status["totals"]
+
+
+async def reserve_quota(redis, user_id, amounts: dict[str, int]) -> dict[str, int]:
+    """Проверка и списание одним атомарным вызовом: параллельные запросы не
+    могут вместе превысить лимит."""
+    return await check_quota(redis, user_id, amounts, reserve=True)
+
+
+async def settle_quota(redis, user_id, amounts: dict[str, int]) -> dict[str, int]:
+    """
+    Досписывает (или возвращает, если значение отрицательное) использованный
+    объём без проверки лимита: работа уже выполнена.
+    """
+    kinds = list(amounts)
+    today = date.today()
+    if QUOTA_WRITE_BEHIND:
+        # Копим локально, в Redis уйдёт пачкой фоновым flush
+        totals = {}
+        for kind in kinds:
+            key = quota_key(kind, user_id, today)
+            quota_ledger.record(key, int(amounts[kind]), _day_end(today))
+            cached = quota_ledger.cached_total(key, QUOTA_LOCAL_MAX_AGE)
+            totals[kind] = cached if cached is not None else quota_ledger.pending(key)
+        return totals
+
+    totals = await _run_script(
+        redis,
+        "settle",
+        SETTLE_SCRIPT,
+        [quota_key(kind, user_id, today) for kind in kinds],
+        [_day_end(today)] + [int(amounts[kind]) for kind in kinds],
+    )
+    return dict(zip(kinds, (int(total) for total in totals)))
+
+
+async def reserve_usage(
+    redis, user_id, amounts: dict[str, int], ttl: int | None = None
+) -> dict:
+    """
+    Резервирует оценку расхода до долгого вызова (LLM, TTS): сумма сразу
+    атомарно списывается, поэтому параллельные сессии не превысят лимит.
+    Резерв нужно закрыть через settle_usage/release_usage; если воркер упал,
+    резерв вернётся в квоту сам после ttl секунд.
+    """
+    status = await check_quotas(redis, user_id, amounts, reserve=True, ttl=ttl)
+    if not status["allowed"]:
+        raise quota_exceeded_error(status)
+    return status["reservation"]
+
+
+async def settle_usage(redis, reservation: dict, actual: dict[str, int]) -> dict:
+    """
+    Закрывает резерв фактическим расходом: разница с оценкой досписывается
+    или возвращается. Счётчики берутся из резерва, поэтому запрос,
+    начатый до полуночи, закрывается в своём дне.
+    Write-behind сюда не распространяется: поправка зависит от того, жив ли
+    ещё резерв в Redis, и применяется одним скриптом вместе с его снятием.
+    """
+    kinds = list(reservation["keys"])
+    day = date.fromisoformat(reservation["keys"][kinds[0]].rsplit(":", 1)[1])
+    totals = await _run_script(
+        redis,
+        "settle_reservation",
+        SETTLE_RESERVATION_SCRIPT,
+        [
+            _reservations_key(reservation["user_id"]),
+            _hold_key(reservation["id"]),
+        ]
+        + [reservation["keys"][kind] for kind in kinds],
+        [_day_end(day), reservation["id"]]
+        + [int(actual.get(kind, 0)) for kind in kinds],
+    )
+    if QUOTA_WRITE_BEHIND:
+        for kind, total in zip(kinds, totals):
+            quota_ledger.remember(reservation["keys"][kind], int(total))
+    logger.info(
+        f"[Quota] settled {reservation['id']} for user_id={reservation['user_id']}: reserved={reservation['amounts']} actual={actual}"
+    )
+    return dict(zip(kinds, (int(total) for total in totals)))
+
+
+async def release_usage(redis, reservation: dict) -> dict:
+    """Отменяет резерв целиком (ответ не был получен)."""
+    return await settle_usage(redis, reservation, {})
+
+
+async def migrate_legacy_quota_keys(redis, day: date | None = None) -> int:
+    """
+    Переносит сегодняшние счётчики из старого формата ключей (без hash tag)
+    в новый, чтобы смена формата не обнулила дневной расход. GETDEL
+    гарантирует, что значение перенесёт только один воркер. SCAN делает
+    только первый стартовавший за день воркер (флаг SET NX), остальные
+    сразу возвращают 0.
+    """
+    day = day or date.today()
+    flag = f"quota_legacy_migration:{day.isoformat()}"
+    if not await redis.set(flag, 1, nx=True, ex=2 * 86400):
+        return 0
+    migrated = 0
+    try:
+        for kind, quota in QUOTAS.items():
+            pattern = f"{quota['prefix']}:*:{day.isoformat()}"
+            async for key in redis.scan_iter(match=pattern, count=1000):
+                user_id = key.split(":")[1]
+                if not user_id.isdigit():
+                    continue
+                value = await redis.getdel(_legacy_quota_key(kind, user_id, day))
+                if not value:
+                    continue
+                new_key = quota_key(kind, user_id, day)
+                await redis.incrby(new_key, int(value))
+                await redis.expireat(new_key, _day_end(day))
+                migrated += 1
+    except Exception:
+        # Следующий старт воркера повторит перенос
+        await redis.delete(flag)
+        raise
+    if migrated:
+        logger.info(f"[Quota] migrated {migrated} legacy quota counters")
+    return migrated
 
-    current = await redis.get(key)
-    current = int(current) if current else 0
 
-    await redis.incrby(key, tokens_needed)
+async def check_ai_limit_only(redis, user_id, tokens_needed: int):
+    totals = await check_quota(redis, user_id, {"tokens": tokens_needed})
     logger.info(
-        f"[TokenLimit] user_id={user_id} | new_total={current + tokens_needed} (added {tokens_needed})"
+        f"[TokenLimit] user_id={user_id} | current={totals['tokens']} | needed={tokens_needed} | limit={AI_TOKEN_LIMIT}"
     )
-    if current == 0:
-        await redis.expire(key, 86400)
-        logger.info(
-            f"[TokenLimit] user_id={user_id} | key set to expire in 86400s (1 day)"
-        )
 
 
-async def check_translate_limit_only(redis, user_id: str, symbols_needed: int):
-    if redis is None:
-        raise RuntimeError("Redis client is not initialized!")
-    today = date.today().isoformat()
-    key = f"translate_symbols:{user_id}:{today}"
+async def increment_ai_limit(redis, user_id: str, tokens_needed: int):
+    totals = await settle_quota(redis, user_id, {"tokens": tokens_needed})
+    logger.info(
+        f"[TokenLimit] user_id={user_id} | new_total={totals['tokens']} (added {tokens_needed})"
+    )
 
-    current = await redis.get(key)
-    current = int(current) if current else 0
 
+async def check_translate_limit_only(redis, user_id: str, symbols_needed: int):
+    totals = await check_quota(redis, user_id, {"translate": symbols_needed})
     logger.info(
-        f"[TranslateSymbolsLimitCheck] user_id={user_id} | today={today} | current={current} | needed={symbols_needed} | limit={TRANSLATE_SYMBOLS_LIMIT}"
+        f"[TranslateSymbolsLimitCheck] user_id={user_id} | current={totals['translate']} | needed={symbols_needed} | limit={TRANSLATE_SYMBOLS_LIMIT}"
     )
 
-    if current + symbols_needed > int(TRANSLATE_SYMBOLS_LIMIT):
-        logger.warning(
-            f"[TranslateSymbolsLimitCheck] LIMIT EXCEEDED: user_id={user_id} | attempted={current + symbols_needed} | limit={TRANSLATE_SYMBOLS_LIMIT}"
-        )
-        raise HTTPException(status_code=429, detail="Symbols limit exceeded")
-
 
 async def increment_translate_limit(redis, user_id: str, symbols_needed: int):
-    if redis is None:
-        raise RuntimeError("Redis client is not initialized!")
-    today = date.today().isoformat()
-    key = f"translate_symbols:{user_id}:{today}"
-
-    current = await redis.get(key)
-    current = int(current) if current else 0
-
-    await redis.incrby(key, symbols_needed)
+    totals = await settle_quota(redis, user_id, {"translate": symbols_needed})
     logger.info(
-        f"[TranslateSymbolsLimit] user_id={user_id} | new_total={current + symbols_needed} (added {symbols_needed})"
+        f"[TranslateSymbolsLimit] user_id={user_id} | new_total={totals['translate']} (added {symbols_needed})"
     )
-    if current == 0:
-        await redis.expire(key, 86400)
-        logger.info(
-            f"[TranslateSymbolsLimit] user_id={user_id} | key set to expire in 86400s (1 day)"
-        )
 
 
 async def check_voice_limit_only(redis, user_id: str, symbols_needed: int):
-    if redis is None:
-        raise RuntimeError("Redis client is not initialized!")
-    today = date.today().isoformat()
-    key = f"voice_symbols:{user_id}:{today}"
-
-    current = await redis.get(key)
-    current = int(current) if current else 0
-
+    totals = await check_quota(redis, user_id, {"voice": symbols_needed})
     logger.info(
-        f"[VoiceSymbolsLimitCheck] user_id={user_id} | today={today} | current={current} | needed={symbols_needed} | limit={VOICE_SYMBOLS_LIMIT}"
+        f"[VoiceSymbolsLimitCheck] user_id={user_id} | current={totals['voice']} | needed={symbols_needed} | limit={VOICE_SYMBOLS_LIMIT}"
     )
 
-    if current + symbols_needed > int(VOICE_SYMBOLS_LIMIT):
-        logger.warning(
-            f"[VoiceSymbolsLimitCheck] LIMIT EXCEEDED: user_id={user_id} | attempted={current + symbols_needed} | limit={VOICE_SYMBOLS_LIMIT}"
-        )
-        raise HTTPException(status_code=429, detail="Symbols limit exceeded")
-
 
 async def increment_voice_limit(redis, user_id: str, symbols_needed: int):
-    if redis is None:
-        raise RuntimeError("Redis client is not initialized!")
-    today = date.today().isoformat()
-    key = f"voice_symbols:{user_id}:{today}"
-
-    current = await redis.get(key)
-    current = int(current) if current else 0
-
-    await redis.incrby(key, symbols_needed)
+    totals = await settle_quota(redis, user_id, {"voice": symbols_needed})
     logger.info(
-        f"[VoiceSymbolsLimit] user_id={user_id} | new_total={current + symbols_needed} (added {symbols_needed})"
+        f"[VoiceSymbolsLimit] user_id={user_id} | new_total={totals['voice']} (added {symbols_needed})"
     )
-    if current == 0:
-        await redis.expire(key, 86400)
-        logger.info(
-            f"[VoiceSymbolsLimit] user_id={user_id} | key set to expire in 86400s (1 day)"
-        )
 
 
 async def check_summarize_limit_only(redis, user_id: str, symbols_needed: int):
-    if redis is None:
-        raise RuntimeError("Redis client is not initialized!")
-    today = date.today().isoformat()
-    key = f"summarize_symbols:{user_id}:{today}"
-
-    current = await redis.get(key)
-    current = int(current) if current else 0
-
+    totals = await check_quota(redis, user_id, {"summarize": symbols_needed})
     logger.info(
-        f"[SummarizeSymbolsLimitCheck] user_id={user_id} | today={today} | current={current} | needed={symbols_needed} | limit={SUMMARIZE_SYMBOLS_LIMIT}"
+        f"[SummarizeSymbolsLimitCheck] user_id={user_id} | current={totals['summarize']} | needed={symbols_needed} | limit={SUMMARIZE_SYMBOLS_LIMIT}"
     )
 
-    if current + symbols_needed > int(SUMMARIZE_SYMBOLS_LIMIT):
-        logger.warning(
-            f"[SummarizeSymbolsLimitCheck] LIMIT EXCEEDED: user_id={user_id} | attempted={current + symbols_needed} | limit={SUMMARIZE_SYMBOLS_LIMIT}"
-        )
-        raise HTTPException(status_code=429, detail="Symbols limit exceeded")
-
 
 async def increment_summarize_limit(redis, user_id: str, symbols_needed: int):
-    if redis is None:
-        raise RuntimeError("Redis client is not initialized!")
-    today = date.today().isoformat()
-    key = f"summarize_symbols:{user_id}:{today}"
-
-    current = await redis.get(key)
-    current = int(current) if current else 0
-
-    await redis.incrby(key, symbols_needed)
+    totals = await settle_quota(redis, user_id, {"summarize": symbols_needed})
     logger.info(
-        f"[SummarizeSymbolsLimit] user_id={user_id} | new_total={current + symbols_needed} (added {symbols_needed})"
+        f"[SummarizeSymbolsLimit] user_id={user_id} | new_total={totals['summarize']} (added {symbols_needed})"
     )
-    if current == 0:
-        await redis.expire(key, 86400)
-        logger.info(
-            f"[SummarizeSymbolsLimit] user_id={user_id} | key set to expire in 86400s (1 day)"
-        )
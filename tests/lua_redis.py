@@ -0,0 +1,191 @@
+"""
+Минимальный Redis в памяти для тестов Lua-скриптов (нужен lupa).
+Скрипты выполняются настоящим интерпретатором Lua; redis.call
+поддерживает только команды, которые используют скрипты приложения,
+и, как Redis Cluster, запрещает обращаться к ключам не из KEYS.
+"""
+
+import fnmatch
+
+import lupa
+
+
+class UndeclaredKeyError(Exception):
+    pass
+
+
+class _Script:
+    def __init__(self, redis, source: str):
+        self.redis = redis
+        self.source = source
+
+    async def __call__(self, keys=(), args=(), client=None):
+        return self.redis.eval(self.source, list(keys), list(args))
+
+
+class _Pipeline:
+    def __init__(self, redis):
+        self.redis = redis
+        self.commands = []
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    def hkeys(self, key):
+        self.commands.append(lambda: list(self.redis.hashes.get(key, {})))
+
+    async def execute(self):
+        return [command() for command in self.commands]
+
+
+class LuaRedis:
+    def __init__(self):
+        self.strings = {}
+        self.hashes = {}
+        self.zsets = {}
+        self.ttl = {}
+        self.lua = lupa.LuaRuntime()
+        self.lua.execute("unpack = unpack or table.unpack")
+        self.lua.globals().redis = self.lua.table_from({"call": self._call})
+        self._declared = None
+
+    # --- скрипты ---
+
+    def register_script(self, source: str) -> _Script:
+        return _Script(self, source)
+
+    def eval(self, source: str, keys: list, args: list):
+        g = self.lua.globals()
+        g.KEYS = self.lua.table_from([str(key) for key in keys])
+        g.ARGV = self.lua.table_from([str(arg) for arg in args])
+        self._declared = set(map(str, keys))
+        try:
+            return self._reply(self.lua.execute(source))
+        finally:
+            self._declared = None
+
+    def _reply(self, value):
+        # Как Redis: числа Lua -> целые, таблицы -> списки, false -> None
+        if lupa.lua_type(value) == "table":
+            return [self._reply(item) for item in value.values()]
+        if value is False:
+            return None
+        if isinstance(value, float):
+            return int(value)
+        return value
+
+    def _call(self, command, *args):
+        command = command.upper()
+        key = args[0]
+        if key not in self._declared:
+            raise UndeclaredKeyError(f"{command} {key}: key is not in KEYS")
+        result = getattr(self, "_" + command.lower())(key, *args[1:])
+        if isinstance(result, list):
+            return self.lua.table_from(result)
+        return False if result is None else result
+
+    def _get(self, key):
+        value = self.strings.get(key)
+        return None if value is None else str(value)
+
+    def _set(self, key, value, *options):
+        self.strings[key] = value
+        if "KEEPTTL" not in options:
+            self.ttl.pop(key, None)
+        if "PX" in options:
+            self.ttl[key] = ("px", int(options[options.index("PX") + 1]))
+        return "OK"
+
+    def _incrby(self, key, amount):
+        self.strings[key] = int(self.strings.get(key, 0)) + int(amount)
+        return self.strings[key]
+
+    def _decrby(self, key, amount):
+        return self._incrby(key, -int(amount))
+
+    def _expireat(self, key, when):
+        self.ttl[key] = ("at", int(when))
+        return 1
+
+    def _expire(self, key, seconds):
+        self.ttl[key] = ("ex", int(seconds))
+        return 1
+
+    def _exists(self, key):
+        return int(key in self.strings or key in self.hashes or key in self.zsets)
+
+    def _del(self, key):
+        found = self._exists(key)
+        for store in (self.strings, self.hashes, self.zsets, self.ttl):
+            store.pop(key, None)
+        return found
+
+    def _hset(self, key, field, value):
+        self.hashes.setdefault(key, {})[field] = value
+        return 1
+
+    def _hget(self, key, field):
+        return self.hashes.get(key, {}).get(field)
+
+    def _zadd(self, key, score, member):
+        self.zsets.setdefault(key, {})[member] = float(score)
+        return 1
+
+    def _zrem(self, key, member):
+        return int(self.zsets.get(key, {}).pop(member, None) is not None)
+
+    def _zscore(self, key, member):
+        score = self.zsets.get(key, {}).get(member)
+        return None if score is None else repr(score)
+
+    def _zrangebyscore(self, key, low, high, *options):
+        low = float("-inf") if low == "-inf" else float(low)
+        high = float("inf") if high == "+inf" else float(high)
+        members = sorted(
+            (score, member)
+            for member, score in self.zsets.get(key, {}).items()
+            if low <= score <= high
+        )
+        members = [member for _, member in members]
+        if "LIMIT" in options:
+            offset, count = map(int, options[options.index("LIMIT") + 1 :][:2])
+            members = members[offset : offset + count]
+        return members
+
+    # --- команды клиента вне скриптов ---
+
+    async def set(self, key, value, nx=False, ex=None):
+        if nx and self._exists(key):
+            return None
+        self.strings[key] = value
+        if ex is not None:
+            self.ttl[key] = ("ex", int(ex))
+        return True
+
+    async def get(self, key):
+        return self._get(key)
+
+    async def getdel(self, key):
+        value = self._get(key)
+        self.strings.pop(key, None)
+        return value
+
+    async def incrby(self, key, amount):
+        return self._incrby(key, amount)
+
+    async def expireat(self, key, when):
+        return self._expireat(key, when)
+
+    async def delete(self, *keys):
+        return sum(self._del(key) for key in keys)
+
+    async def scan_iter(self, match="*", count=None):
+        for key in list(self.strings):
+            if fnmatch.fnmatchcase(key, match):
+                yield key
+
+    def pipeline(self, transaction=True):
+        return _Pipeline(self)
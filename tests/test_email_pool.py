@@ -0,0 +1,55 @@
+import asyncio
+import socket
+
+import pytest
+
+pytest.importorskip("aiosmtplib")
+
+from app.core.config import settings
+from app.services import email_queue
+
+
+def _refused_port() -> int:
+    """Порт на localhost, на котором никто не слушает: соединение отклоняется."""
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+@pytest.fixture
+def refusing_relay(monkeypatch):
+    monkeypatch.setattr(settings, "smtp_host", "127.0.0.1")
+    monkeypatch.setattr(settings, "smtp_port", _refused_port())
+    monkeypatch.setattr(settings, "smtp_user", "")
+    monkeypatch.setattr(settings, "smtp_pass", "")
+    monkeypatch.setattr(email_queue, "EMAIL_BACKEND", "smtp")
+    monkeypatch.setattr(email_queue, "EMAIL_SMTP_TLS", False)
+
+
+def test_refused_connections_do_not_block_waiters(refusing_relay):
+    job = {"to": "user@example.com", "subject": "Hi", "body": "Text", "attempt": 0}
+
+    async def send_all():
+        pool = email_queue.SMTPPool(1)
+        # Писем больше, чем соединений: остальные ждут слот пула
+        return await asyncio.wait_for(
+            asyncio.gather(
+                *[email_queue._send(pool, dict(job)) for _ in range(5)],
+                return_exceptions=True,
+            ),
+            timeout=10,
+        )
+
+    results = asyncio.run(send_all())
+    assert len(results) == 5
+    assert all(isinstance(result, Exception) for result in results)
+
+
+def test_pool_slot_is_reused_after_refused_connection(refusing_relay):
+    async def acquire_twice():
+        pool = email_queue.SMTPPool(1)
+        for _ in range(2):
+            with pytest.raises(Exception):
+                await asyncio.wait_for(pool.acquire(), timeout=10)
+
+    asyncio.run(acquire_twice())
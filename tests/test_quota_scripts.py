@@ -0,0 +1,124 @@
+import asyncio
+from datetime import date
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("lupa")
+
+from app import token_limit
+from lua_redis import LuaRedis
+
+USER_ID = 42
+NOW = 1_700_000_000
+
+
+@pytest.fixture
+def redis(monkeypatch):
+    monkeypatch.setattr(token_limit, "QUOTA_WRITE_BEHIND", False)
+    monkeypatch.setitem(token_limit.QUOTAS["tokens"], "limit", 100)
+    monkeypatch.setitem(token_limit.QUOTAS["voice"], "limit", 100)
+    monkeypatch.setattr(token_limit, "_scripts", {})
+    at(monkeypatch, NOW)
+    return LuaRedis()
+
+
+def at(monkeypatch, now: int):
+    monkeypatch.setattr(token_limit, "pytime", SimpleNamespace(time=lambda: now))
+
+
+def counter(redis, kind: str) -> int:
+    return int(redis.strings.get(token_limit.quota_key(kind, USER_ID), 0))
+
+
+def test_reservation_is_settled_to_actual_usage(redis):
+    async def scenario():
+        reservation = await token_limit.reserve_usage(
+            redis, USER_ID, {"tokens": 80, "voice": 10}
+        )
+        assert counter(redis, "tokens") == 80
+        assert counter(redis, "voice") == 10
+        return await token_limit.settle_usage(
+            redis, reservation, {"tokens": 30, "voice": 10}
+        )
+
+    assert asyncio.run(scenario()) == {"tokens": 30, "voice": 10}
+    assert not redis.hashes
+    assert not redis.zsets[token_limit._reservations_key(USER_ID)]
+
+
+def test_reservations_cannot_exceed_limit_together(redis):
+    async def scenario():
+        await token_limit.reserve_usage(redis, USER_ID, {"tokens": 80})
+        return await token_limit.check_quotas(
+            redis, USER_ID, {"tokens": 30}, reserve=True
+        )
+
+    status = asyncio.run(scenario())
+    assert not status["allowed"]
+    assert status["exceeded"] == "tokens"
+    assert status["remaining"] == {"tokens": 20}
+    assert counter(redis, "tokens") == 80
+
+
+def test_expired_reservation_returns_to_quota(redis, monkeypatch):
+    async def scenario():
+        stale = await token_limit.reserve_usage(
+            redis, USER_ID, {"tokens": 80, "voice": 50}, ttl=60
+        )
+        # Воркер «упал»: резерв не закрыт, а срок уже прошёл
+        at(monkeypatch, NOW + 61)
+        status = await token_limit.check_quotas(
+            redis, USER_ID, {"tokens": 50}, reserve=True
+        )
+        return stale, status
+
+    stale, status = asyncio.run(scenario())
+    assert status["allowed"]
+    assert counter(redis, "tokens") == 50
+    assert counter(redis, "voice") == 0
+    assert token_limit._hold_key(stale["id"]) not in redis.hashes
+
+    # Опоздавший settle списывает весь фактический расход
+    totals = asyncio.run(token_limit.settle_usage(redis, stale, {"tokens": 20}))
+    assert totals == {"tokens": 70, "voice": 0}
+
+
+def test_live_reservation_is_not_released(redis, monkeypatch):
+    async def scenario():
+        await token_limit.reserve_usage(redis, USER_ID, {"tokens": 80}, ttl=60)
+        at(monkeypatch, NOW + 30)
+        return await token_limit.check_quotas(redis, USER_ID, {"tokens": 30})
+
+    status = asyncio.run(scenario())
+    assert not status["allowed"]
+    assert counter(redis, "tokens") == 80
+
+
+def test_legacy_keys_are_migrated_once(redis):
+    day = date(2025, 1, 1)
+    redis.strings[token_limit._legacy_quota_key("tokens", USER_ID, day)] = 7
+
+    async def scenario():
+        first = await token_limit.migrate_legacy_quota_keys(redis, day)
+        redis.strings[token_limit._legacy_quota_key("voice", USER_ID, day)] = 3
+        second = await token_limit.migrate_legacy_quota_keys(redis, day)
+        return first, second
+
+    assert asyncio.run(scenario()) == (1, 0)
+    assert redis.strings[token_limit.quota_key("tokens", USER_ID, day)] == 7
+    # Второй старт воркера уже не сканирует ключи
+    assert token_limit._legacy_quota_key("voice", USER_ID, day) in redis.strings
+
+
+def test_user_keys_share_hash_tag():
+    day = date(2025, 1, 1)
+    key = token_limit.quota_key("tokens", USER_ID, day)
+    assert key == "tokens:{42}:2025-01-01"
+    assert token_limit.quota_key_user_id(key) == "42"
+    assert token_limit.quota_key_user_id("tokens:42:2025-01-01") == "42"
+
+    # Счётчики, список резервов и резерв — в одном слоте Redis Cluster
+    hold = token_limit._hold_key(token_limit._reservation_id(USER_ID))
+    for name in (key, token_limit._reservations_key(USER_ID), hold):
+        assert name[name.index("{") : name.index("}") + 1] == "{42}"
@@ -0,0 +1,93 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("lupa")
+
+import app.redis_client
+from app.core import rate_limit
+from app.core.config import settings
+from lua_redis import LuaRedis
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = SimpleNamespace(now=1_700_000_000.0)
+    monkeypatch.setattr(rate_limit, "time", SimpleNamespace(time=lambda: clock.now))
+    return clock
+
+
+@pytest.fixture
+def redis(monkeypatch, clock):
+    redis = LuaRedis()
+    monkeypatch.setattr(app.redis_client, "redis", redis)
+    monkeypatch.setattr(rate_limit, "_script", None)
+    monkeypatch.setattr(settings, "rate_limits", {"chat": "3/minute"})
+    monkeypatch.setattr(settings, "rate_limit_overrides", {})
+    return redis
+
+
+def test_parse_rate():
+    assert rate_limit.parse_rate("10/minute") == (10, 60)
+    assert rate_limit.parse_rate("5/ hours") == (5, 3600)
+
+
+def test_get_rate_prefers_user_override(monkeypatch):
+    monkeypatch.setattr(settings, "rate_limits", {"chat": "5/minute"})
+    monkeypatch.setattr(settings, "rate_limit_overrides", {"7": {"chat": "1/second"}})
+    assert rate_limit.get_rate("chat", "7") == (1, 1)
+    assert rate_limit.get_rate("chat", "8") == (5, 60)
+    assert rate_limit.get_rate("unknown", "8") == (60, 60)
+
+
+def test_burst_then_steady_rate(redis, clock):
+    async def hits(n):
+        return [await rate_limit.hit("chat", "1") for _ in range(n)]
+
+    # Всплеск до count запросов разрешён сразу
+    assert asyncio.run(hits(3)) == [0, 0, 0]
+    assert asyncio.run(rate_limit.hit("chat", "1")) == 20
+
+    # Дальше — один запрос на интервал (60 / 3 = 20 с)
+    clock.now += 20
+    assert asyncio.run(hits(2)) == [0, 20]
+    clock.now += 5
+    assert asyncio.run(rate_limit.hit("chat", "1")) == 15
+
+
+def test_rejected_request_is_not_counted(redis, clock):
+    async def hits(n):
+        return [await rate_limit.hit("chat", "1") for _ in range(n)]
+
+    asyncio.run(hits(3))
+    # Отказы не сдвигают TAT: повтор через Retry-After проходит
+    assert asyncio.run(hits(5)) == [20] * 5
+    clock.now += 20
+    assert asyncio.run(rate_limit.hit("chat", "1")) == 0
+
+
+def test_users_and_scopes_are_limited_separately(redis):
+    async def hits():
+        for _ in range(3):
+            await rate_limit.hit("chat", "1")
+        return await rate_limit.hit("chat", "2"), await rate_limit.hit("voice", "1")
+
+    assert asyncio.run(hits()) == (0, 0)
+
+
+def test_key_expires_at_its_tat(redis):
+    asyncio.run(rate_limit.hit("chat", "1"))
+    # Один запрос занимает интервал: ключ живёт, пока TAT в будущем
+    assert redis.ttl["rate:chat:1"] == ("px", 20000)
+
+
+def test_redis_failure_allows_request(redis, monkeypatch):
+    def broken(source):
+        async def script(**kwargs):
+            raise ConnectionError("redis is down")
+
+        return script
+
+    monkeypatch.setattr(redis, "register_script", broken)
+    assert asyncio.run(rate_limit.hit("chat", "1")) == 0
@@ -0,0 +1,168 @@
+from app.services.voice.search_classifier import (
+    DEFAULT_THRESHOLD,
+    classify_search_need,
+)
+
+# Веса классификатора подбирались на TUNING_EXAMPLES и DEV_EXAMPLES.
+# HELD_OUT_EXAMPLES при подборе не использовались: только они показывают
+# реальную долю запросов, решённых без LLM.
+TUNING_EXAMPLES = [
+    ("Какая погода в Москве?", True),
+    ("Кто такой Пушкин?", False),
+    ("Какие новости в Казахстане?", True),
+    ("Как приготовить борщ?", False),
+    ("Курс доллара к рублю", True),
+    ("Какая погода завтра в Алматы?", True),
+    ("What's the weather in London today?", True),
+    ("Latest news about Tesla", True),
+    ("Сколько стоит iPhone 16 сейчас?", True),
+    ("Курс тенге к евро сегодня", True),
+    ("Bitcoin price now", True),
+    ("Кто выиграл матч Реал Барселона вчера?", True),
+    ("Расписание поездов Астана Алматы", True),
+    ("Когда концерт Imagine Dragons в Алматы?", True),
+    ("What is the current exchange rate of USD to EUR?", True),
+    ("Последние новости технологий", True),
+    ("Прогноз погоды на выходные", True),
+    ("Бүгін ауа райы қандай?", True),
+    ("Что такое фотосинтез?", False),
+    ("Explain quantum entanglement", False),
+    ("Объясни, как работает TCP", False),
+    ("Напиши письмо коллеге о переносе встречи", False),
+    ("Переведи на английский: добрый вечер", False),
+    ("How to reverse a list in Python?", False),
+    ("Сколько будет 15 * 24?", False),
+    ("Почему небо голубое?", False),
+    ("Посоветуй книгу по психологии", False),
+    ("Привет, как дела?", False),
+    ("Recipe for pancakes", False),
+    ("Кто такой Наполеон?", False),
+    ("Who was Albert Einstein?", False),
+    ("В каком году началась Вторая мировая война?", False),
+    ("Придумай название для кофейни", False),
+    ("Формула площади круга", False),
+    ("Спасибо за помощь", False),
+    ("Расскажи про историю Рима", False),
+    ("Что такое инфляция простыми словами?", False),
+    ("What are the benefits of meditation?", False),
+]
+
+DEV_EXAMPLES = [
+    ("Who is the president of the USA?", True),
+    ("Кто сейчас президент США?", True),
+    ("What time is it in Tokyo?", True),
+    ("Сколько стоит хлеб?", True),
+    ("Кто выиграл выборы в США 2024?", True),
+    ("Какая температура в Астане?", True),
+    ("Will it rain tomorrow in Berlin?", True),
+    ("Курс евро на сегодня", True),
+    ("Who won the Champions League final?", True),
+    ("Когда выйдет новый iPhone?", True),
+    ("Сколько стоит билет в Дубай?", True),
+    ("Ethereum price", True),
+    ("Какие фильмы идут в кино на этой неделе?", True),
+    ("What's the score of the Lakers game?", True),
+    ("Последние новости про OpenAI", True),
+    ("Is Kaspi bank working right now?", True),
+    ("Кто тренер сборной Казахстана по футболу?", True),
+    ("Population of Almaty in 2025", True),
+    ("Open restaurants near me", True),
+    ("Погода в Караганде", True),
+    ("Что такое черная дыра?", False),
+    ("How do I sort a dictionary by value in Python?", False),
+    ("Напиши стих про осень", False),
+    ("Translate 'good morning' to Spanish", False),
+    ("Сколько будет 256 / 16?", False),
+    ("Why do cats purr?", False),
+    ("Объясни теорию относительности простыми словами", False),
+    ("Кто написал Войну и мир?", False),
+    ("Give me a recipe for lasagna", False),
+    ("Как похудеть без диет?", False),
+    ("What is the capital of France?", False),
+    ("Придумай шутку про программистов", False),
+    ("Как работает двигатель внутреннего сгорания?", False),
+    ("Summarize the plot of Hamlet", False),
+    ("Что означает слово 'эмпатия'?", False),
+    ("Help me write a cover letter", False),
+    ("Когда родился Пушкин?", False),
+    ("Как выучить английский быстрее?", False),
+    ("What is 15% of 80?", False),
+    ("Спасибо, ты очень помог", False),
+]
+
+HELD_OUT_EXAMPLES = [
+    ("What's the weather like in Paris this weekend?", True),
+    ("Сколько стоит Tesla Model 3?", True),
+    ("Who is the current CEO of Twitter?", True),
+    ("Курс рубля к тенге", True),
+    ("Кто победил в матче Барселона Реал?", True),
+    ("Когда следующий матч сборной Казахстана?", True),
+    ("What time is it in New York?", True),
+    ("Какая сейчас погода в Шымкенте?", True),
+    ("Latest iPhone release date", True),
+    ("Цена золота сегодня", True),
+    ("Кто премьер-министр Великобритании?", True),
+    ("Bitcoin news today", True),
+    ("Is it going to snow in Almaty tomorrow?", True),
+    ("Расписание автобусов Алматы", True),
+    ("Кто сейчас мэр Алматы?", True),
+    ("Как написать цикл for на Python?", False),
+    ("What is photosynthesis?", False),
+    ("Напиши поздравление с днем рождения маме", False),
+    ("Почему вода мокрая?", False),
+    ("Переведи 'спасибо' на казахский", False),
+    ("Explain recursion with an example", False),
+    ("Кто такой Чингисхан?", False),
+    ("Сколько будет 7 * 8?", False),
+    ("Recipe for borscht", False),
+    ("What is the difference between TCP and UDP?", False),
+    ("Посоветуй фильм на вечер", False),
+    ("Who wrote Crime and Punishment?", False),
+    ("Как приготовить плов?", False),
+    ("What are prime numbers?", False),
+    ("Привет!", False),
+]
+
+
+def benchmark(examples, threshold=DEFAULT_THRESHOLD) -> dict:
+    """Доля примеров, решённых без LLM (coverage), и точность на них (accuracy)."""
+    decided = correct = 0
+    errors = []
+    for text, expected in examples:
+        decision, confidence, _ = classify_search_need(text, threshold)
+        if decision is None:
+            continue
+        decided += 1
+        if decision == expected:
+            correct += 1
+        else:
+            errors.append((text, expected, round(confidence, 3)))
+    return {
+        "coverage": decided / len(examples),
+        "accuracy": correct / decided if decided else 0.0,
+        "errors": errors,
+    }
+
+
+def test_held_out_accuracy_and_coverage():
+    report = benchmark(HELD_OUT_EXAMPLES)
+    # На момент подбора весов: 28/30 решено локально, все верно
+    assert report["accuracy"] >= 0.95, report["errors"]
+    assert report["coverage"] >= 0.8
+
+
+def test_tuning_sets_have_no_errors():
+    for examples in (TUNING_EXAMPLES, DEV_EXAMPLES):
+        assert benchmark(examples)["errors"] == []
+
+
+def test_undecided_messages_are_left_to_llm():
+    # Сомнительные случаи не должны решаться локально неверно
+    decision, _, _ = classify_search_need("Who is the president of the USA?")
+    assert decision in (True, None)
+
+
+def test_search_query_gets_time_hint():
+    decision, _, query = classify_search_need("Какая погода в Москве?")
+    assert decision is True
+    assert "сегодня" in query
@@ -0,0 +1,123 @@
+import asyncio
+
+import pytest
+
+pytest.importorskip("faster_whisper")
+
+from app.services.voice import speech
+
+
+def test_negotiate_audio_format_rounds_bitrate_down():
+    audio_format = speech.negotiate_audio_format("opus", 40)
+    assert audio_format["codec"] == "opus"
+    assert audio_format["bitrate"] == 32
+    assert audio_format["key"] == "opus_32"
+    assert audio_format["suffix"] == ".ogg"
+
+
+def test_negotiate_audio_format_clamps_to_lowest_bitrate():
+    assert speech.negotiate_audio_format("mp3", 8)["bitrate"] == 32
+
+
+def test_negotiate_audio_format_falls_back_to_mp3():
+    audio_format = speech.negotiate_audio_format(" FLAC ", None)
+    assert audio_format["codec"] == "mp3"
+    assert audio_format["bitrate"] == speech.AUDIO_FORMATS["mp3"]["default_bitrate"]
+    assert audio_format["mime"] == "audio/mpeg"
+
+
+def test_split_text_keeps_chunks_under_limit():
+    text = "Первое предложение. Второе предложение! Третье?\n\nНовый абзац."
+    chunks = speech.split_text_for_speech(text, max_chars=30)
+    assert all(len(chunk) <= 30 for chunk in chunks)
+    assert " ".join(chunks).split() == text.split()
+
+
+def test_split_text_merges_short_paragraphs():
+    assert speech.split_text_for_speech("Да.\nНет.\n\n", max_chars=100) == ["Да. Нет."]
+
+
+def test_split_text_cuts_long_words():
+    chunks = speech.split_text_for_speech("a" * 25, max_chars=10)
+    assert chunks == ["a" * 10, "a" * 10, "a" * 5]
+
+
+def test_split_empty_text():
+    assert speech.split_text_for_speech("  \n ") == []
+
+
+@pytest.fixture
+def fake_provider(monkeypatch):
+    """ElevenLabs без сети: первые куски синтезируются дольше последних."""
+    calls = {"active": 0, "max_active": 0, "texts": []}
+
+    async def synthesize(
+        session, text, voice_id, output_format, previous_text=None, next_text=None
+    ):
+        calls["active"] += 1
+        calls["max_active"] = max(calls["max_active"], calls["active"])
+        calls["texts"].append(text)
+        await asyncio.sleep(0.05 / len(calls["texts"]))
+        calls["active"] -= 1
+        return f"<{text}>".encode()
+
+    monkeypatch.setattr(speech, "_synthesize_bytes", synthesize)
+    return calls
+
+
+def test_iter_speech_chunks_keeps_order(fake_provider):
+    text = "\n".join(f"Sentence number {i}." for i in range(8))
+
+    async def collect():
+        return [
+            audio
+            async for audio in speech.iter_speech_chunks(
+                text, "voice", max_concurrency=3
+            )
+        ]
+
+    chunks = speech.split_text_for_speech(text)
+    assert asyncio.run(collect()) == [f"<{chunk}>".encode() for chunk in chunks]
+    assert fake_provider["max_active"] <= 3
+
+
+def test_iter_speech_chunks_limits_concurrency(fake_provider, monkeypatch):
+    split = speech.split_text_for_speech
+    monkeypatch.setattr(
+        speech, "split_text_for_speech", lambda text: split(text, max_chars=20)
+    )
+    text = "\n".join(f"Sentence number {i}." for i in range(8))
+
+    async def collect():
+        return [
+            audio
+            async for audio in speech.iter_speech_chunks(
+                text, "voice", max_concurrency=2
+            )
+        ]
+
+    assert len(asyncio.run(collect())) == 8
+    assert fake_provider["max_active"] == 2
+
+
+def test_long_opus_speech_is_transcoded_once(fake_provider, monkeypatch, tmp_path):
+    transcoded = []
+
+    async def transcode(audio, audio_format):
+        transcoded.append(audio)
+        return b"ogg:" + audio
+
+    monkeypatch.setattr(speech, "transcode_audio", transcode)
+    text = "\n".join(["Слово " * 300] * 3)
+    audio_format = speech.negotiate_audio_format("opus", 32)
+    output = tmp_path / "answer.ogg"
+
+    asyncio.run(
+        speech.synthesize_long_speech_async(text, "voice", str(output), audio_format)
+    )
+
+    chunks = speech.split_text_for_speech(text)
+    assert len(chunks) > 1
+    joined = b"".join(f"<{chunk}>".encode() for chunk in chunks)
+    assert transcoded == [joined]
+    assert output.read_bytes() == b"ogg:" + joined